@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Las vistas de tasks/async_views.py (bajo /tasks/async/) están pensadas para
+este punto de entrada, en especial el stream SSE de /tasks/async/api/files/events/:
+    uvicorn django_crud_api.asgi:application
 """
 
 import os
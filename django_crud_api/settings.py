@@ -81,12 +81,18 @@ CLOUDINARY_STORAGE = {
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",  # Debe ir lo más arriba posible
+    # Server-Timing y /metrics (tasks/metrics.py): mide todo lo que viene después
+    'tasks.middleware.ServerTimingMiddleware',
+    # Lecturas de las vistas de tasks desde la réplica (tasks/replicas.py)
+    'tasks.middleware.ReplicaRoutingMiddleware',
     "django.middleware.security.SecurityMiddleware",
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Perfilado a pedido (tasks/profiling.py); se desactiva solo si PROFILING_ENABLED = False
+    'tasks.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     
@@ -120,10 +126,24 @@ WSGI_APPLICATION = 'django_crud_api.wsgi.application'
 
 DATABASES = {
     'default': dj_database_url.config(
+        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
         conn_max_age=600,
         conn_health_checks=True,
-    )
+    ),
 }
+# Réplica de lectura (tasks/replicas.py), solo si se configura. En los tests es
+# un espejo de 'default': lo que se escribe se lee de la misma base
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = {
+        **dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=600, conn_health_checks=True),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['tasks.replicas.ReplicaRouter']
+READ_REPLICA_ALIAS = 'replica' if DATABASE_REPLICA_URL else None
+READ_REPLICA_PIN_COOKIE = 'db_pin'
+READ_REPLICA_PIN_SECONDS = int(os.environ.get('READ_REPLICA_PIN_SECONDS', 10))  # lecturas del primario tras escribir
+READ_REPLICA_LAG_SECONDS = int(os.environ.get('READ_REPLICA_LAG_SECONDS', 5))  # atraso tolerado de la réplica
 
 
 # Password validation
@@ -168,6 +188,45 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Backend de los archivos de profesores (ver tasks/storage.py).
+# 'tasks.storage.LocalFileStorage' guarda en disco, útil sin conexión a Cloudinary.
+FILE_STORAGE_BACKEND = os.environ.get('FILE_STORAGE_BACKEND', 'tasks.storage.CloudinaryFileStorage')
+LOCAL_STORAGE_ROOT = BASE_DIR / 'media'
+LOCAL_STORAGE_URL = os.environ.get('LOCAL_STORAGE_URL', 'http://localhost:8000/media/')
+UPLOAD_TICKET_MAX_AGE = 600  # segundos que dura un ticket de subida directa
+
+# Sustituto de Cloudinary con demora y fallos inyectados, para perfilar sin red:
+# FILE_STORAGE_BACKEND=tasks.storage.SimulatedCloudinaryStorage
+SIMULATED_STORAGE = {
+    'BASE_URL': 'https://res.cloudinary.com/',
+    'CLOUD_NAME': 'local',
+    # Segundos por llamada (± JITTER, como fracción) y bytes/s al subir
+    'LATENCY': {'upload': 0.25, 'verify_upload': 0.08, 'delete_many': 0.12},
+    'JITTER': 0.3,
+    'BANDWIDTH': 20 * 1024 * 1024,
+    'FAILURE_RATE': float(os.environ.get('SIMULATED_STORAGE_FAILURE_RATE', 0)),
+    'SEED': None,
+}
+
+# Subidas por el worker (POST /tasks/api/files/): el cuerpo se lee por bloques de
+# FILE_UPLOAD_CHUNK_SIZE y solo FILE_UPLOAD_MEMORY_CAP bytes por request quedan en
+# memoria; el resto va a un temporal. Al almacenamiento se envía en bloques de
+# STORAGE_UPLOAD_CHUNK_SIZE (Cloudinary exige al menos 5 MB por parte).
+FILE_UPLOAD_HANDLERS = ['tasks.uploads.StreamingUploadHandler']
+FILE_UPLOAD_CHUNK_SIZE = int(os.environ.get('FILE_UPLOAD_CHUNK_SIZE', 64 * 1024))
+FILE_UPLOAD_MEMORY_CAP = int(os.environ.get('FILE_UPLOAD_MEMORY_CAP', 2621440))
+STORAGE_UPLOAD_CHUNK_SIZE = int(os.environ.get('STORAGE_UPLOAD_CHUNK_SIZE', 6 * 1024 * 1024))
+
+# Subida por lotes (/tasks/api/files/batch/): hilos para enviar al almacenamiento en paralelo
+BATCH_UPLOAD_MAX_FILES = int(os.environ.get('BATCH_UPLOAD_MAX_FILES', 50))
+BATCH_UPLOAD_WORKERS = int(os.environ.get('BATCH_UPLOAD_WORKERS', 4))
+
+# Subidas reanudables (/tasks/api/files/uploads/)
+RESUMABLE_UPLOAD_DIR = Path(os.environ.get('RESUMABLE_UPLOAD_DIR', BASE_DIR / 'tmp_uploads'))
+RESUMABLE_UPLOAD_EXPIRY = int(os.environ.get('RESUMABLE_UPLOAD_EXPIRY', 24 * 60 * 60))
+RESUMABLE_UPLOAD_MAX_SIZE = int(os.environ.get('RESUMABLE_UPLOAD_MAX_SIZE', 2 * 1024 ** 3))
+RESUMABLE_UPLOAD_LEASE_SECONDS = int(os.environ.get('RESUMABLE_UPLOAD_LEASE_SECONDS', 60))  # se renueva mientras llegan bytes
+
 STORAGES = {
     "default": {
         "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
@@ -194,13 +253,77 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOWED_ORIGINS = [ "https://ittaceducation.com"]
 CSRF_TRUSTED_ORIGINS = ["https://ittaceducation.com"]
 CORS_ALLOW_CREDENTIALS = True
+# Tamaño de página del listado de archivos (/tasks/api/files/?page_size=)
+FILES_PAGE_SIZE = int(os.environ.get('FILES_PAGE_SIZE', 50))
+FILES_MAX_PAGE_SIZE = int(os.environ.get('FILES_MAX_PAGE_SIZE', 200))
+
+# Caché. locmem es por proceso: con varios workers usar un backend compartido
+# (ej. CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache)
+# Con locmem la invalidación de un worker no llega a los demás, así que lo que
+# tiene que invalidarse (el usuario cacheado de la autenticación, las páginas y
+# los ETag del listado de archivos) no se cachea, salvo con
+# CACHE_SINGLE_PROCESS=True (un solo proceso; por defecto con DEBUG)
+CACHE_SINGLE_PROCESS = os.environ.get('CACHE_SINGLE_PROCESS', str(DEBUG)) == 'True'
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'ittac-cache'),
+    }
+}
+FILES_CACHE_ALIAS = 'default'
+FILES_CACHE_TIMEOUT = int(os.environ.get('FILES_CACHE_TIMEOUT', 300))
+# purge_deleted_files espera esto desde el borrado lógico: una subida deduplicada
+# en curso puede estar por reutilizar el asset
+FILES_PURGE_GRACE_SECONDS = int(os.environ.get('FILES_PURGE_GRACE_SECONDS', 300))
+
+# Sincronización incremental del listado (tasks/sync.py)
+FILES_SYNC_MAX_CHANGES = int(os.environ.get('FILES_SYNC_MAX_CHANGES', 500))  # cambios por respuesta
+FILES_SYNC_RETENTION_DAYS = int(os.environ.get('FILES_SYNC_RETENTION_DAYS', 30))  # vida del token y del registro
+FILES_SYNC_SETTLE_SECONDS = int(os.environ.get('FILES_SYNC_SETTLE_SECONDS', 5))  # margen para transacciones en vuelo
+
+# Eventos en vivo por SSE (tasks/events.py). El broker en memoria solo reparte
+# dentro del proceso: con varios workers usar uno compartido con la misma interfaz
+FILE_EVENTS_BROKER = os.environ.get('FILE_EVENTS_BROKER', 'tasks.events.InProcessEventBroker')
+FILE_EVENTS_HEARTBEAT = int(os.environ.get('FILE_EVENTS_HEARTBEAT', 15))  # segundos entre comentarios keep-alive
+FILE_EVENTS_QUEUE_SIZE = int(os.environ.get('FILE_EVENTS_QUEUE_SIZE', 100))  # eventos pendientes por cliente
+FILE_EVENTS_RETRY_MS = 3000  # espera que EventSource usa para reconectar
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS' : 'rest_framework.schemas.coreapi.AutoSchema',
     
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',),
+        # JWTAuthentication con el usuario cacheado (ver tasks/authentication.py)
+        'tasks.authentication.CachedJWTAuthentication',),
+    # JSONRenderer que suma su tiempo a "serialize" en Server-Timing
+    'DEFAULT_RENDERER_CLASSES': (
+        'tasks.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Proxies de confianza delante de la app: la IP del throttling se toma de
+    # X-Forwarded-For a esa distancia. Con 0 se usa REMOTE_ADDR y el header,
+    # que el cliente puede inventar, se ignora
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    # Token bucket por IP y por correo en login y reset (tasks/throttling.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('THROTTLE_LOGIN_IP', '30/min'),
+        'login_email': os.environ.get('THROTTLE_LOGIN_EMAIL', '10/min'),
+        'password_reset_ip': os.environ.get('THROTTLE_PASSWORD_RESET_IP', '10/min'),
+        'password_reset_email': os.environ.get('THROTTLE_PASSWORD_RESET_EMAIL', '3/min'),
+    },
 }
 
+# Caché compartido entre workers para las cubetas del throttling
+THROTTLE_CACHE_ALIAS = 'default'
+
+# Verificación de contraseñas (tasks/hashing.py). 0 = en el mismo proceso;
+# N > 0 = pool de N procesos que responde 429 con más de LOGIN_HASH_MAX_PENDING en espera
+AUTHENTICATION_BACKENDS = ['tasks.backends.PooledPasswordBackend']
+LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', 0))
+LOGIN_HASH_MAX_PENDING = int(os.environ.get('LOGIN_HASH_MAX_PENDING', 32))
+
+AUTH_USER_CACHE_ALIAS = 'default'
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 60))
+
 
 
 SIMPLE_JWT = {
@@ -211,6 +334,12 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Refresh de alto volumen (tasks/tokens.py): lista negra en caché y escrituras por lotes.
+# Con varios workers este caché debe ser compartido.
+JWT_BLACKLIST_CACHE_ALIAS = 'default'
+JWT_BOOKKEEPING_BATCH_SIZE = int(os.environ.get('JWT_BOOKKEEPING_BATCH_SIZE', 200))
+JWT_BOOKKEEPING_FLUSH_INTERVAL = int(os.environ.get('JWT_BOOKKEEPING_FLUSH_INTERVAL', 5))
+
  
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -219,4 +348,30 @@ EMAIL_USE_TLS = False           # Desactivar TLS para usar SSL directo
 EMAIL_USE_SSL = True            # Activar SSL
 EMAIL_HOST_USER = os.environ.get('EMAIL_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_PASS').replace(" ", "")
-EMAIL_TIMEOUT = 20           # Tiempo corto para que NO congele el server si falla
\ No newline at end of file
+EMAIL_TIMEOUT = 20           # Tiempo corto para que NO congele el server si falla
+
+# Bandeja de salida de correos (tasks/outbox.py, manage.py send_outbox)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 50))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_BACKOFF = int(os.environ.get('EMAIL_OUTBOX_BACKOFF', 30))  # segundos, se duplica en cada intento
+# Tiempo que un worker se reserva un lote; vencido, otro lo puede volver a tomar
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.environ.get('EMAIL_OUTBOX_LEASE_SECONDS', 300))
+
+# Hilos máximos por tipo de trabajo bloqueante en las vistas async (tasks/executors.py)
+ASYNC_EXECUTOR_WORKERS = {
+    'storage': int(os.environ.get('ASYNC_STORAGE_WORKERS', 8)),
+    'hashing': int(os.environ.get('ASYNC_HASHING_WORKERS', os.cpu_count() or 2)),
+    'cache': int(os.environ.get('ASYNC_CACHE_WORKERS', 8)),
+}
+
+# Header Server-Timing para todos (por defecto solo con DEBUG; el staff lo recibe
+# siempre). Los histogramas de /metrics se llenan igual
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', str(DEBUG)) == 'True'
+
+# Perfilado a pedido (tasks/profiling.py): un staff manda el header, o se
+# perfila una fracción de los requests. Apagado no agrega costo.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_HEADER = os.environ.get('PROFILING_HEADER', 'X-Profile')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles')
+PROFILING_MAX_ENTRIES = int(os.environ.get('PROFILING_MAX_ENTRIES', 50))
@@ -18,9 +18,19 @@ from django.contrib import admin
 from django.urls import path , include
 from django.conf.urls.static import static
 from django.conf import settings
+from tasks.views import MetricsView
+from tasks.admin import profile_download_view, profile_list_view
 urlpatterns = [
+    # Antes de admin.site.urls para que el catch-all del admin no las tape
+    path('admin/profiles/', admin.site.admin_view(profile_list_view), name='admin_profiles'),
+    path(
+        'admin/profiles/<str:profile_id>.<str:extension>',
+        admin.site.admin_view(profile_download_view),
+        name='admin_profile_download'
+    ),
     path('admin/', admin.site.urls),
-    path('tasks/' , include ('tasks.urls'))
+    path('tasks/' , include ('tasks.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
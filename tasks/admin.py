@@ -5,7 +5,10 @@ from django.contrib import admin
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin # <--- CORRECT LOCATION
-from .models import CustomUser, ProfessorFile
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from .models import Course, CustomUser, Enrollment, ProfessorFile, OutboundEmail
+from .profiling import list_profiles, profile_path
 
 # Define the custom admin class
 class CustomUserAdmin(UserAdmin):
@@ -21,5 +24,47 @@ admin.site.register(CustomUser, CustomUserAdmin)
 
 @admin.register(ProfessorFile)
 class ProfessorFileAdmin(admin.ModelAdmin):
-    list_display = ('title', 'uploaded_by', 'uploaded_at') 
-    list_filter = ('uploaded_by',) # Filtrar por el usuario directamente
\ No newline at end of file
+    list_display = ('title', 'uploaded_by', 'course', 'uploaded_at', 'content_type', 'size')
+    readonly_fields = ('download_url', 'content_hash', 'size', 'content_type', 'resource_type')
+    list_filter = ('uploaded_by', 'course') # Filtrar por el usuario directamente
+    list_select_related = ('uploaded_by',) # __str__ y la columna usan uploaded_by.email
+
+
+# Las inscripciones se editan desde el curso: el inline borra con delete() de
+# cada fila, que es lo que invalida los cursos cacheados del usuario
+class EnrollmentInline(admin.TabularInline):
+    model = Enrollment
+    extra = 0
+    raw_id_fields = ('user',)
+
+
+@admin.register(Course)
+class CourseAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'created_at')
+    search_fields = ('code', 'name')
+    inlines = [EnrollmentInline]
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
+
+# --- Perfiles guardados por ProfilingMiddleware (tasks/profiling.py) ---
+# Se enrutan en django_crud_api/urls.py envueltas con admin.site.admin_view (solo staff)
+
+def profile_list_view(request):
+    context = dict(admin.site.each_context(request), title='Perfiles de requests', profiles=list_profiles())
+    return TemplateResponse(request, 'admin/profiles.html', context)
+
+
+def profile_download_view(request, profile_id, extension):
+    try:
+        path = profile_path(profile_id, extension)
+        handle = open(path, 'rb')
+    except (ValueError, FileNotFoundError):
+        raise Http404("Perfil no encontrado.")
+    content_type = 'application/json' if extension == 'json' else 'application/octet-stream'
+    return FileResponse(handle, as_attachment=True, filename=f"{profile_id}.{extension}", content_type=content_type)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        # Antes de que se abra cualquier conexión, en cualquier hilo (Server-Timing cuenta las consultas)
+        from .metrics import install_query_tracking
+        install_query_tracking()
+        from . import checks  # noqa: F401 (registra los chequeos)
@@ -0,0 +1,331 @@
+"""
+Versiones async (ASGI) de los endpoints con más tráfico: listado, subida y
+borrado de archivos, login y pedido de reset de contraseña; y el stream de
+eventos (SSE) de los archivos, que solo tiene sentido bajo ASGI.
+
+Bajo uvicorn un solo proceso atiende muchos clientes lentos a la vez: la BD se
+consulta con el ORM async y lo bloqueante (subir al almacenamiento, verificar
+el hash de la contraseña) corre en los pools acotados de tasks/executors.py.
+Las respuestas son las mismas que las de las vistas síncronas de views.py.
+"""
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, NotAuthenticated, ParseError, PermissionDenied, Throttled,
+    ValidationError as APIValidationError,
+)
+from rest_framework_simplejwt.serializers import TokenObtainSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import cache as files_cache
+from .authentication import CachedJWTAuthentication
+from .backends import password_needs_update
+from .events import SubscriptionOverflow, format_event, get_event_broker, replay_events
+from .executors import run_blocking, run_cache_call
+from .hashing import averify_password
+from .metrics import TimedJSONRenderer, track
+from .models import CustomUser, ProfessorFile
+from .outbox import aenqueue_email
+from .pagination import FileCursorPagination, FileSearchPagination
+from .permissions import IsCourseMember, aget_course_ids, can_access_course, listing_scopes, visible_files_filter
+from .replicas import avoid_replica_lag
+from .search import apply_filters
+from .serializers import FileSearchSerializer, ProfessorFileSerializer
+from .storage import StorageError, afind_stored_files, upload_new_file
+from .throttling import CREDENTIAL_THROTTLES
+from .uploads import file_digest
+from .views import IsProfessorOrReadOnly, add_list_validators, parse_file_ids, password_reset_email
+
+
+class AsyncAPIView(View):
+    """
+    Lo mínimo de APIView para handlers async: autenticación JWT (sin hilo
+    cuando el usuario está en caché), permisos de DRF y respuestas JSON.
+    """
+    permission_classes = []
+    throttle_classes = []
+    # Lee los cursos del usuario antes de los permisos (que son síncronos)
+    course_scoped = False
+    authentication = CachedJWTAuthentication()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            await self.initial(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(request, exc)
+
+    async def initial(self, request):
+        request.user, request.auth = AnonymousUser(), None
+        result = await self.authentication.aauthenticate(request)
+        if result is not None:
+            request.user, request.auth = result
+        if self.course_scoped:
+            await aget_course_ids(request.user)
+        for permission_class in self.permission_classes:
+            if not permission_class().has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise NotAuthenticated()
+                raise PermissionDenied()
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not await run_cache_call(throttle.cache, throttle.allow_request, request, self):
+                raise Throttled(throttle.wait())
+
+    def handle_exception(self, request, exc):
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.respond(detail, exc.status_code)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = self.authentication.authenticate_header(request)
+        if getattr(exc, 'wait', None) is not None:
+            response['Retry-After'] = str(math.ceil(exc.wait))
+        return response
+
+    def get_data(self, request):
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError as exc:
+                raise ParseError(f"JSON parse error - {exc}")
+            # Como los serializers de DRF: una lista o un número no es un cuerpo válido
+            if not isinstance(data, dict):
+                raise APIValidationError({'non_field_errors': [
+                    f"Invalid data. Expected a dictionary, but got {type(data).__name__}."
+                ]})
+            return data
+        return request.POST
+
+    def respond(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(TimedJSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+class AsyncFileManagementView(AsyncAPIView):
+    permission_classes = [IsProfessorOrReadOnly, IsCourseMember]
+    course_scoped = True
+
+    async def get(self, request):
+        search = FileSearchSerializer(data=request.GET)
+        if not search.is_valid():
+            return self.respond(search.errors, status.HTTP_400_BAD_REQUEST)
+        filters = search.validated_data
+        paginator = FileSearchPagination(filters['q']) if filters['q'] else FileCursorPagination()
+
+        cursor = request.GET.get(paginator.cursor_query_param)
+        page_size = paginator.get_page_size(request)
+        cache = files_cache.get_cache()
+        version, last_modified = await run_cache_call(
+            cache, files_cache.get_files_state, listing_scopes(request.user, filters.get('course'))
+        )
+        # Recién cambiado: la réplica puede no tenerlo y la página quedaría cacheada así
+        avoid_replica_lag(last_modified)
+
+        etag = files_cache.page_etag(version, cursor, page_size, filters)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return add_list_validators(not_modified, etag)
+
+        cache_key, payload = await run_cache_call(
+            cache, files_cache.get_cached_page, version, cursor, page_size, filters
+        )
+        if payload is not None:
+            response = self.respond(payload)
+            response['X-Cache'] = 'HIT'
+            return add_list_validators(response, etag)
+
+        files = apply_filters(ProfessorFile.objects.select_related('uploaded_by'), filters)
+        visible = visible_files_filter(request.user)
+        if visible is not None and not filters.get('course'):
+            files = files.filter(visible)
+        page = await paginator.apaginate_queryset(files, request)
+        with track('serialize'):
+            data = ProfessorFileSerializer(page, many=True).data
+        payload = {
+            "message": "Lista de archivos cargada correctamente",
+            "page_count": len(page),
+            "next": paginator.get_next_cursor(),
+            "data": data
+        }
+        await run_cache_call(cache, files_cache.set_cached_page, cache_key, payload)
+
+        response = self.respond(payload)
+        response['X-Cache'] = 'MISS'
+        return add_list_validators(response, etag)
+
+    async def post(self, request):
+        # Parsear el multipart escribe a disco cuando el archivo es grande
+        files = await run_blocking('storage', lambda: request.FILES)
+        data = request.POST.copy()
+        data.update(files)
+        serializer = ProfessorFileSerializer(data=data, context={'request': request})
+        # Con curso, el staff confirma en la BD que existe
+        valid = await sync_to_async(serializer.is_valid)() if data.get('course') else serializer.is_valid()
+        if not valid:
+            return self.respond(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        upload = serializer.validated_data['file']
+        try:
+            digest = await run_blocking('storage', file_digest, upload)
+            stored = await afind_stored_files([digest])
+            fields = stored.get(digest) or await run_blocking('storage', upload_new_file, upload, digest)
+        except StorageError as exc:
+            return self.respond({"file": [str(exc)]}, status.HTTP_400_BAD_REQUEST)
+        finally:
+            upload.close()
+
+        file_obj = await ProfessorFile.objects.acreate(
+            uploaded_by=request.user, title=serializer.validated_data.get('title', ''),
+            course_id=serializer.validated_data.get('course_id'), **fields
+        )
+        return self.respond(ProfessorFileSerializer(file_obj).data, status.HTTP_201_CREATED)
+
+    async def delete(self, request):
+        try:
+            file_ids = parse_file_ids(request.GET, self.get_data(request))
+        except ValueError as exc:
+            return self.respond({"error": str(exc)}, status.HTTP_400_BAD_REQUEST)
+
+        owned = ProfessorFile.objects.filter(id__in=file_ids, uploaded_by=request.user)
+        deleted = set(await owned.asoft_delete())
+        if not deleted:
+            return self.respond(
+                {"error": "Archivo no encontrado o no tienes permiso para borrarlo."},
+                status.HTTP_404_NOT_FOUND
+            )
+
+        not_found = sorted(file_ids - deleted)
+        if not_found:
+            return self.respond({
+                "message": "Algunos archivos no se pudieron eliminar.",
+                "deleted": sorted(deleted),
+                "not_found": not_found
+            })
+        return self.respond({"message": "Archivo eliminado correctamente."}, status.HTTP_204_NO_CONTENT)
+
+
+class AsyncLoginView(AsyncAPIView):
+    throttle_classes = CREDENTIAL_THROTTLES
+    throttle_scope = 'login'
+
+    async def post(self, request):
+        data = self.get_data(request)
+        errors = {}
+        for field in ('email', 'password'):
+            if field not in data:
+                errors[field] = ["This field is required."]
+            elif not isinstance(data[field], str):
+                errors[field] = ["Not a valid string."]
+            elif not data[field]:
+                errors[field] = ["This field may not be blank."]
+        if errors:
+            return self.respond(errors, status.HTTP_400_BAD_REQUEST)
+
+        user = await CustomUser.objects.filter(email=data['email']).afirst()
+        # Sin usuario igual se hashea, para no revelar qué correos existen
+        valid = await averify_password(data['password'], user.password if user else None)
+        if not valid or not user.is_active:
+            raise AuthenticationFailed(
+                TokenObtainSerializer.default_error_messages['no_active_account'], 'no_active_account'
+            )
+
+        if password_needs_update(user.password):
+            await sync_to_async(user.set_password)(data['password'])
+            await user.asave(update_fields=['password'])
+
+        refresh = await sync_to_async(RefreshToken.for_user)(user)
+        return self.respond({
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'user_id': user.id,
+            'email': user.email,
+            'username': user.username,
+            'role': user.role,
+        })
+
+
+class AsyncPasswordResetRequestView(AsyncAPIView):
+    throttle_classes = CREDENTIAL_THROTTLES
+    throttle_scope = 'password_reset'
+
+    async def post(self, request):
+        email = self.get_data(request).get('email', '')
+        if not isinstance(email, str):
+            return self.respond({"email": ["Not a valid string."]}, status.HTTP_400_BAD_REQUEST)
+        try:
+            validate_email(email)
+        except ValidationError:
+            return self.respond({"email": ["Enter a valid email address."]}, status.HTTP_400_BAD_REQUEST)
+
+        user = await CustomUser.objects.filter(email=email).afirst()
+        if user is None:
+            return self.respond(
+                {"email": ["No existe un usuario con este correo electrónico."]}, status.HTTP_400_BAD_REQUEST
+            )
+
+        # El SMTP queda fuera del request: lo envía el worker de la bandeja de salida
+        await aenqueue_email([email], **password_reset_email(user))
+        return self.respond({"message": "Correo enviado."})
+
+
+class AsyncFileEventsView(AsyncAPIView):
+    """
+    Server-Sent Events con las altas y bajas de archivos (tasks/events.py).
+    Reemplaza el polling del listado por una conexión ociosa por cliente: un
+    comentario cada FILE_EVENTS_HEARTBEAT segundos la mantiene viva a través de
+    proxies, y al reconectar con Last-Event-ID se reenvía lo que se perdió.
+    Bajo WSGI cada conexión ocuparía un hilo entero: servir con uvicorn.
+    """
+    permission_classes = [IsProfessorOrReadOnly]
+    course_scoped = True
+
+    async def get(self, request):
+        # EventSource manda Last-Event-ID al reconectar; ?last_event_id= sirve para la primera conexión
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        if last_event_id is not None:
+            try:
+                last_event_id = int(last_event_id)
+            except ValueError:
+                return self.respond({"error": "Last-Event-ID inválido."}, status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(self.stream(request.user, last_event_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # que nginx no junte los eventos
+        return response
+
+    async def stream(self, user, last_event_id):
+        # Los cursos se leyeron al conectar: una inscripción nueva se ve al reconectar
+        # Suscribirse antes de leer el registro: lo que llegue entre medio queda en la cola
+        subscription = get_event_broker().subscribe()
+        heartbeat = getattr(settings, 'FILE_EVENTS_HEARTBEAT', 15)
+        try:
+            yield f"retry: {getattr(settings, 'FILE_EVENTS_RETRY_MS', 3000)}\n\n"
+            if last_event_id is not None:
+                limit = getattr(settings, 'FILES_SYNC_MAX_CHANGES', 500)
+                for event in await sync_to_async(replay_events)(last_event_id, limit, user):
+                    yield format_event(event)
+            while True:
+                try:
+                    event = await subscription.next_event(heartbeat)
+                except SubscriptionOverflow:
+                    # Cliente demasiado lento: cerramos y reconecta con Last-Event-ID
+                    return
+                if event is None:
+                    yield ': ping\n\n'
+                elif can_access_course(user, event.get('course')):
+                    yield format_event(event)
+        finally:
+            subscription.close()
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import is_process_local
+
+
+# Sin caché compartido cada request lee de la BD: un usuario desactivado en un
+# worker seguiría entrando por los demás hasta que venza su entrada
+_no_cache = DummyCache('auth-users', {})
+
+
+def get_user_cache():
+    cache = caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')]
+    return _no_cache if is_process_local(cache) else cache
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    get_user_cache().delete(user_cache_key(user_id))
+
+
+def invalidate_cached_user_on_commit(user_id):
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
+
+
+def course_ids_cache_key(user_id):
+    """Cursos del usuario (tasks.permissions.get_course_ids)."""
+    return f"auth:courses:{user_id}"
+
+
+def invalidate_course_ids_on_commit(user_id):
+    transaction.on_commit(lambda: get_user_cache().delete(course_ids_cache_key(user_id)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Igual que JWTAuthentication pero guarda el usuario en caché unos segundos
+    (AUTH_USER_CACHE_TIMEOUT), así la mayoría de los requests autenticados no
+    hacen el SELECT de users. CustomUser.save() borra la entrada, de modo que
+    un cambio de rol, contraseña o is_active se nota en el siguiente request
+    (por eso se vuelve a leer siempre del primario, nunca de la réplica).
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        cache = get_user_cache()
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Del primario: leído de la réplica podría cachear un rol o un
+            # is_active que ya cambió (tasks/replicas.py)
+            User = get_user_model()
+            try:
+                user = User.objects.using(DEFAULT_DB_ALIAS).get(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            cache.set(key, user, timeout=getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() para vistas async: validar el token es solo CPU y el
+        usuario sale del caché o del ORM async, sin ocupar un hilo.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        cache = get_user_cache()
+        key = user_cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            User = get_user_model()
+            try:
+                user = await User.objects.using(DEFAULT_DB_ALIAS).aget(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            await cache.aset(key, user, timeout=getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
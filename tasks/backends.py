@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import get_hasher, identify_hasher
+
+from .hashing import verify_password
+
+
+def password_needs_update(encoded):
+    hasher = identify_hasher(encoded)
+    return hasher.algorithm != get_hasher().algorithm or hasher.must_update(encoded)
+
+
+class PooledPasswordBackend(ModelBackend):
+    """
+    ModelBackend que verifica la contraseña con tasks.hashing (en el pool de
+    procesos si LOGIN_HASH_WORKERS > 0). Sin pool se comporta igual que
+    ModelBackend.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            verify_password(password, None)
+            return None
+
+        if not verify_password(password, user.password) or not self.user_can_authenticate(user):
+            return None
+        if password_needs_update(user.password):
+            # Lo mismo que hace check_password() al cambiar de hasher o de iteraciones
+            user.set_password(password)
+            user.save(update_fields=['password'])
+        return user
@@ -0,0 +1,326 @@
+"""
+Utilidades para los comandos de benchmark (manage.py bench_*).
+
+Los benchmarks corren en el mismo proceso con los clientes de pruebas de
+Django (Client pasa por el WSGIHandler, AsyncClient por el ASGIHandler): miden
+el costo de la app (vistas, ORM, caché, hashing), no el de la red.
+"""
+import asyncio
+import math
+import platform
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .cache import bump_files_version
+from .models import CustomUser, ProfessorFile, build_download_url
+from .storage import get_file_storage
+from .tokens import bookkeeping
+
+
+def percentile(samples, fraction):
+    """Percentil por el método nearest-rank; samples no necesita venir ordenado."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(latencies, elapsed=None):
+    """Resumen en milisegundos de una lista de latencias en segundos."""
+    summary = {
+        'requests': len(latencies),
+        'p50_ms': None,
+        'p95_ms': None,
+        'p99_ms': None,
+        'mean_ms': None,
+        'max_ms': None,
+    }
+    if latencies:
+        summary.update({
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2),
+        })
+    if elapsed:
+        summary['throughput_rps'] = round(len(latencies) / elapsed, 2)
+    return summary
+
+
+def timed(func, *args, **kwargs):
+    """(resultado, segundos) de una llamada."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class QueryCounter:
+    """
+    Cuenta las consultas SQL de todas las conexiones, de cualquier hilo,
+    mientras está activo. Las conexiones nuevas se enganchan con la señal
+    connection_created; reset() devuelve la cuenta y vuelve a cero.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.active = False
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.active:
+            with self._lock:
+                self.count += 1
+        return execute(sql, params, many, context)
+
+    def attach(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def reset(self):
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
+
+    def __enter__(self):
+        connection_created.connect(self.attach)
+        for connection in connections.all():
+            self.attach(connection)
+        self.active = True
+        return self
+
+    def __exit__(self, *exc_info):
+        self.active = False
+        connection_created.disconnect(self.attach)
+
+
+# --- Benchmark de la API (manage.py bench_api) ---
+
+BENCH_PASSWORD = 'Bench-Api-123'
+
+SCENARIOS = ['list', 'list_uncached', 'upload', 'delete', 'login', 'refresh', 'password_reset']
+
+# Nombre de la URL por escenario; ASGI usa las vistas async donde existen
+URL_NAMES = {
+    'wsgi': {
+        'list': 'files_manager',
+        'list_uncached': 'files_manager',
+        'upload': 'files_manager',
+        'delete': 'files_manager',
+        'login': 'token_obtain_pair',
+        'refresh': 'token_refresh',
+        'password_reset': 'password_reset',
+    },
+    'asgi': {
+        'list': 'async_files_manager',
+        'list_uncached': 'async_files_manager',
+        'upload': 'async_files_manager',
+        'delete': 'async_files_manager',
+        'login': 'async_token_obtain_pair',
+        'refresh': 'token_refresh',
+        'password_reset': 'async_password_reset',
+    },
+}
+
+EXPECTED_STATUS = {
+    'list': 200,
+    'list_uncached': 200,
+    'upload': 201,
+    'delete': 204,
+    'login': 200,
+    'refresh': 200,
+    'password_reset': 200,
+}
+
+
+def seed(users, files):
+    """
+    Crea `users` usuarios (uno de cada diez es profesor, al menos uno) y
+    `files` archivos repartidos entre los profesores. Todos comparten el mismo
+    hash de contraseña para no pagar PBKDF2 por cada uno.
+    """
+    password = make_password(BENCH_PASSWORD)
+    CustomUser.objects.bulk_create([
+        CustomUser(
+            username=f"bench{index}",
+            email=f"bench{index}@example.invalid",
+            password=password,
+            role='PROFESSOR' if index % 10 == 0 else 'STUDENT',
+        )
+        for index in range(max(users, 2))
+    ])
+    professors = list(CustomUser.objects.filter(role='PROFESSOR', email__endswith='@example.invalid'))
+    students = list(CustomUser.objects.filter(role='STUDENT', email__endswith='@example.invalid'))
+    ProfessorFile.objects.bulk_create([
+        bench_file(professors[index % len(professors)], index) for index in range(files)
+    ], batch_size=500)
+    return professors, students
+
+
+def bench_file(user, index):
+    url = f"https://res.cloudinary.com/bench/raw/upload/v1/professor_uploads/bench-{index}.pdf"
+    return ProfessorFile(
+        uploaded_by=user,
+        title=f"Bench {index}",
+        file=f"raw/upload/v1/professor_uploads/bench-{index}.pdf",
+        download_url=build_download_url(url),
+        content_type='application/pdf',
+        resource_type='raw',
+        size=1024,
+    )
+
+
+def build_requests(scenario, app, professor, students, count):
+    """Lista de (método, path, kwargs, antes) para `count` requests del escenario."""
+    path = reverse(URL_NAMES[app][scenario])
+    professor_auth = {'Authorization': f"Bearer {AccessToken.for_user(professor)}"}
+    student_auth = {'Authorization': f"Bearer {AccessToken.for_user(students[0])}"}
+    requests = []
+
+    if scenario in ('list', 'list_uncached'):
+        before = bump_files_version if scenario == 'list_uncached' else None
+        for _ in range(count):
+            requests.append(('get', path, {'data': {'page_size': 50}, 'headers': student_auth}, before))
+    elif scenario == 'upload':
+        for index in range(count):
+            upload = SimpleUploadedFile(
+                f"bench-{app}-{index}.pdf", f"%PDF-1.4 {uuid.uuid4().hex}".encode(), 'application/pdf'
+            )
+            data = {'title': f"Subida {index}", 'file': upload}
+            requests.append(('post', path, {'data': data, 'headers': professor_auth}, None))
+    elif scenario == 'delete':
+        created = ProfessorFile.objects.bulk_create([bench_file(professor, f"d{index}") for index in range(count)])
+        for file_obj in created:
+            requests.append(('delete', f"{path}?id={file_obj.id}", {'headers': professor_auth}, None))
+    elif scenario == 'login':
+        for index in range(count):
+            body = {'email': students[index % len(students)].email, 'password': BENCH_PASSWORD}
+            requests.append(('post', path, {'data': body, 'content_type': 'application/json'}, None))
+    elif scenario == 'refresh':
+        for index in range(count):
+            body = {'refresh': str(RefreshToken.for_user(students[index % len(students)]))}
+            requests.append(('post', path, {'data': body, 'content_type': 'application/json'}, None))
+    elif scenario == 'password_reset':
+        for index in range(count):
+            body = {'email': students[index % len(students)].email}
+            requests.append(('post', path, {'data': body, 'content_type': 'application/json'}, None))
+    return requests
+
+
+def run_wsgi(requests, concurrency):
+    """Reparte los requests entre `concurrency` hilos, cada uno con su Client (WSGIHandler)."""
+    pending = iter(requests)
+    lock = threading.Lock()
+    samples = []
+
+    def worker():
+        client = Client(raise_request_exception=False)
+        try:
+            while True:
+                with lock:
+                    item = next(pending, None)
+                if item is None:
+                    return
+                method, path, kwargs, before = item
+                if before:
+                    before()
+                response, elapsed = timed(getattr(client, method), path, **kwargs)
+                with lock:
+                    samples.append((response.status_code, elapsed))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+async def _run_asgi(requests, concurrency):
+    pending = iter(requests)
+    samples = []
+
+    async def worker():
+        client = AsyncClient(raise_request_exception=False)
+        for method, path, kwargs, before in pending:
+            if before:
+                before()
+            start = time.perf_counter()
+            response = await getattr(client, method)(path, **kwargs)
+            samples.append((response.status_code, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def run_asgi(requests, concurrency):
+    """Los mismos requests sobre el ASGIHandler, con `concurrency` corrutinas en un event loop."""
+    return asyncio.run(_run_asgi(requests, concurrency))
+
+
+def run_benchmark(users=50, files=500, requests=100, concurrency=8, scenarios=None, apps=('wsgi', 'asgi')):
+    """
+    Siembra la base de datos (ya debe estar migrada y vacía) y corre cada
+    escenario en cada app. Devuelve el reporte como diccionario.
+    """
+    professors, students = seed(users, files)
+    results = []
+    with QueryCounter() as counter:
+        for app in apps:
+            runner = run_asgi if app == 'asgi' else run_wsgi
+            for scenario in scenarios or SCENARIOS:
+                batch = build_requests(scenario, app, professors[0], students, requests)
+                caches[getattr(settings, 'FILES_CACHE_ALIAS', 'default')].clear()
+                storage = get_file_storage()
+                if hasattr(storage, 'reset_stats'):
+                    storage.reset_stats()
+                counter.reset()
+                samples, elapsed = runner(batch, concurrency)
+                queries = counter.reset()
+
+                statuses = Counter(status for status, _ in samples)
+                expected = EXPECTED_STATUS[scenario]
+                results.append({
+                    'app': app,
+                    'scenario': scenario,
+                    'path': batch[0][1] if batch else None,
+                    **summarize([elapsed for _, elapsed in samples], elapsed),
+                    'errors': sum(count for status, count in statuses.items() if status != expected),
+                    'statuses': {str(status): count for status, count in statuses.items()},
+                    'queries_per_request': round(queries / len(samples), 2) if samples else None,
+                    'storage': storage.stats() if hasattr(storage, 'stats') else None,
+                })
+    bookkeeping.flush()
+    return {
+        'meta': {
+            'users': users,
+            'files': files,
+            'requests': requests,
+            'concurrency': concurrency,
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'started_at': timezone.now().isoformat(),
+        },
+        'results': results,
+    }
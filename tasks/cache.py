@@ -0,0 +1,189 @@
+"""
+Caché del listado de archivos.
+
+Cada página se guarda bajo una llave que incluye un número de versión. Subir o
+borrar un archivo incrementa la versión, así que las páginas viejas dejan de
+leerse (y expiran solas) sin tener que buscarlas para borrarlas.
+
+Las versiones van por ámbito: una por curso ('course:<id>'), 'general' para
+los archivos sin curso y 'all' para el listado completo del staff. Un cambio
+en un curso solo invalida las páginas de quienes lo ven; la versión global
+(bump_files_version() sin ámbitos) sigue invalidando todo.
+
+Funciona con cualquier backend de django.core.cache. Con locmem cada worker de
+gunicorn tiene su propia copia; para varios workers usar uno compartido
+(FileBasedCache, Redis, Memcached) en CACHES.
+"""
+import hashlib
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+VERSION_KEY = 'files:version'
+LAST_MODIFIED_KEY = 'files:last_modified'
+HITS_KEY = 'files:stats:hits'
+MISSES_KEY = 'files:stats:misses'
+GENERAL_SCOPE = 'general'
+ALL_SCOPE = 'all'
+
+
+def get_cache():
+    return caches[getattr(settings, 'FILES_CACHE_ALIAS', 'default')]
+
+
+def is_process_local(cache):
+    """
+    True si lo que se escribe en este caché no lo ven los otros workers
+    (locmem) y no se declaró CACHE_SINGLE_PROCESS: una invalidación no llegaría
+    al resto de los procesos.
+    """
+    return isinstance(cache, LocMemCache) and not getattr(settings, 'CACHE_SINGLE_PROCESS', False)
+
+
+def get_timeout():
+    return getattr(settings, 'FILES_CACHE_TIMEOUT', 300)
+
+
+def _incr(cache, key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # La llave no existe (primer uso o el backend la desalojó)
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def _init_version(cache):
+    # Arrancamos en un número al azar: si la llave se pierde (reinicio o
+    # desalojo) no reutilizamos versiones viejas ni ETags ya entregados.
+    cache.add(VERSION_KEY, secrets.randbelow(2 ** 31), timeout=None)
+    cache.add(LAST_MODIFIED_KEY, time.time(), timeout=None)
+
+
+def course_scope(course_id):
+    return f"course:{course_id}" if course_id is not None else GENERAL_SCOPE
+
+
+def _scope_keys(scope):
+    return f"{VERSION_KEY}:{scope}", f"{LAST_MODIFIED_KEY}:{scope}"
+
+
+def _init_scope(cache, scope):
+    version_key, last_modified_key = _scope_keys(scope)
+    cache.add(version_key, secrets.randbelow(2 ** 31), timeout=None)
+    cache.add(last_modified_key, time.time(), timeout=None)
+
+
+def get_files_state(scopes=()):
+    """
+    Devuelve (versión, timestamp del último cambio) en una sola lectura. Con
+    ámbitos, la versión resume la global y la de cada ámbito. El timestamp es
+    la hora de la invalidación, no la de los datos: sirve para decidir si la
+    réplica puede estar atrasada, no como Last-Modified.
+
+    Devuelve (None, None) si el caché es del proceso (is_process_local): esta
+    versión no vería las subidas hechas en otros workers, así que no hay
+    páginas cacheadas ni ETag.
+    """
+    cache = get_cache()
+    if is_process_local(cache):
+        return None, None
+    keys = [VERSION_KEY, LAST_MODIFIED_KEY]
+    for scope in scopes:
+        keys += _scope_keys(scope)
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        _init_version(cache)
+        for scope in scopes:
+            _init_scope(cache, scope)
+        values = cache.get_many(keys)
+
+    if not scopes:
+        return values.get(VERSION_KEY), values.get(LAST_MODIFIED_KEY)
+    raw = '|'.join(f"{key}={values.get(key)}" for key in keys[::2])
+    version = hashlib.sha1(raw.encode()).hexdigest()[:16]
+    last_modified = max((values[key] for key in keys[1::2] if values.get(key) is not None), default=None)
+    return version, last_modified
+
+
+def bump_files_version(scopes=None):
+    """
+    Invalida las páginas cacheadas de esos ámbitos (y el listado 'all' del
+    staff). Sin ámbitos invalida todas.
+    """
+    cache = get_cache()
+    now = time.time()
+    if scopes is None:
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            _init_version(cache)
+            version = cache.incr(VERSION_KEY)
+        cache.set(LAST_MODIFIED_KEY, now, timeout=None)
+        return version
+
+    for scope in {*scopes, ALL_SCOPE}:
+        version_key, last_modified_key = _scope_keys(scope)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            _init_scope(cache, scope)
+            cache.incr(version_key)
+        cache.set(last_modified_key, now, timeout=None)
+
+
+def bump_files_version_on_commit(scopes=None):
+    # Si estamos dentro de una transacción, esperamos a que se confirme para
+    # que nadie cachee una página con datos que todavía no son visibles.
+    scopes = None if scopes is None else set(scopes)
+    transaction.on_commit(lambda: bump_files_version(scopes))
+
+
+def filters_key(filters):
+    """Resumen corto de los filtros/búsqueda, para que cada combinación tenga su página."""
+    if not filters:
+        return '-'
+    raw = '&'.join(f"{name}={filters[name]}" for name in sorted(filters) if filters[name] not in (None, ''))
+    return hashlib.sha1(raw.encode()).hexdigest()[:16] if raw else '-'
+
+
+def page_key(version, cursor, page_size, filters=None):
+    return f"files:v{version}:page:{cursor or '-'}:{page_size}:{filters_key(filters)}"
+
+
+def page_etag(version, cursor, page_size, filters=None):
+    """ETag fuerte: misma versión y misma página implican el mismo contenido (None sin versión)."""
+    if version is None:
+        return None
+    digest = hashlib.sha1(page_key(version, cursor, page_size, filters).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def get_cached_page(version, cursor, page_size, filters=None):
+    """Devuelve (llave, payload) donde payload es None si no estaba en caché (o no hay versión)."""
+    if version is None:
+        return None, None
+    cache = get_cache()
+    key = page_key(version, cursor, page_size, filters)
+    payload = cache.get(key)
+    _incr(cache, MISSES_KEY if payload is None else HITS_KEY)
+    return key, payload
+
+
+def set_cached_page(key, payload):
+    if key is not None:
+        get_cache().set(key, payload, timeout=get_timeout())
+
+
+def get_stats():
+    cache = get_cache()
+    values = cache.get_many([VERSION_KEY, HITS_KEY, MISSES_KEY])
+    return {
+        'version': values.get(VERSION_KEY),
+        'hits': values.get(HITS_KEY, 0),
+        'misses': values.get(MISSES_KEY, 0),
+    }
@@ -0,0 +1,31 @@
+"""
+Chequeos de `manage.py check` (se registran en TasksConfig.ready).
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Warning, register
+
+from .cache import is_process_local
+
+
+@register('caches')
+def check_shared_caches(app_configs, **kwargs):
+    """Avisa qué cachés se apagan por ser locmem (ver CACHE_SINGLE_PROCESS en settings)."""
+    hint = "Usar un backend compartido (Redis, Memcached, FileBasedCache) o, con un solo proceso, " \
+           "CACHE_SINGLE_PROCESS=True."
+    warnings = []
+    alias = getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')
+    if is_process_local(caches[alias]):
+        warnings.append(Warning(
+            f"El caché '{alias}' es locmem: la autenticación lee el usuario de la BD en cada request.",
+            hint=hint,
+            id='tasks.W001',
+        ))
+    alias = getattr(settings, 'FILES_CACHE_ALIAS', 'default')
+    if is_process_local(caches[alias]):
+        warnings.append(Warning(
+            f"El caché '{alias}' es locmem: el listado de archivos no cachea páginas ni responde 304.",
+            hint=hint,
+            id='tasks.W002',
+        ))
+    return warnings
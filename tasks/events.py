@@ -0,0 +1,192 @@
+"""
+Eventos en vivo de los archivos (Server-Sent Events).
+
+Cuando se confirma un alta, edición o borrado de ProfessorFile (FileChange.record)
+el evento se publica en el broker configurado en FILE_EVENTS_BROKER, y cada
+conexión abierta a /tasks/async/api/files/events/ lo recibe. El id de cada
+evento es el id del FileChange, así que al reconectar con Last-Event-ID lo que
+se perdió se reconstruye desde el registro de cambios (tasks/sync.py), no desde
+la memoria del broker.
+
+InProcessEventBroker reparte en memoria del proceso: alcanza con un solo
+worker de uvicorn que además reciba las escrituras. Con varios procesos (o con
+las subidas por WSGI) hace falta un broker compartido que implemente la misma
+interfaz (por ejemplo sobre Redis pub/sub o LISTEN/NOTIFY de PostgreSQL).
+
+Cada evento lleva el curso del archivo y cada conexión solo recibe los de sus
+cursos (más los generales).
+
+La entrega es "al menos una vez": un evento puede llegar repetido, y aplicarlo
+dos veces no cambia nada.
+"""
+import asyncio
+import json
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+UPSERTED = 'file.upserted'
+DELETED = 'file.deleted'
+RESYNC = 'files.resync'
+
+_brokers = {}
+
+
+class SubscriptionOverflow(Exception):
+    """El cliente no leyó a tiempo; debe reconectar con Last-Event-ID."""
+
+
+class BaseEventBroker:
+    def wants_events(self):
+        """False si nadie escucha: publicar se salta la consulta y la serialización."""
+        return True
+
+    def publish(self, events):
+        """Lista de eventos {'id', 'event', 'data'}. Se llama desde cualquier hilo."""
+        raise NotImplementedError
+
+    def subscribe(self):
+        """Devuelve una suscripción con 'await next_event(timeout)' y 'close()'."""
+        raise NotImplementedError
+
+
+class InProcessSubscription:
+    def __init__(self, broker, maxsize):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, events):
+        # Corre en el event loop de la suscripción
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.overflowed = True
+                return
+
+    async def next_event(self, timeout):
+        """El próximo evento, o None si pasaron 'timeout' segundos sin ninguno."""
+        if self.overflowed and self.queue.empty():
+            raise SubscriptionOverflow()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessEventBroker(BaseEventBroker):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def wants_events(self):
+        return bool(self._subscriptions)
+
+    def subscribe(self):
+        subscription = InProcessSubscription(self, getattr(settings, 'FILE_EVENTS_QUEUE_SIZE', 100))
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, events):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, events)
+            except RuntimeError:
+                # Su event loop ya cerró
+                self.unsubscribe(subscription)
+
+
+def get_event_broker():
+    path = getattr(settings, 'FILE_EVENTS_BROKER', 'tasks.events.InProcessEventBroker')
+    if path not in _brokers:
+        _brokers[path] = import_string(path)()
+    return _brokers[path]
+
+
+# models.py publica a través de este módulo: lo que necesita de la app se
+# importa dentro de las funciones para no crear un ciclo
+
+def build_events(changes):
+    """Eventos SSE para una lista de FileChange (una consulta para los archivos vivos)."""
+    from .models import FileChange, ProfessorFile
+    from .serializers import ProfessorFileSerializer
+
+    upserted = [change.file_id for change in changes if change.action == FileChange.UPSERT]
+    files = {}
+    if upserted:
+        files = {
+            file_obj.id: ProfessorFileSerializer(file_obj).data
+            for file_obj in ProfessorFile.objects.select_related('uploaded_by').filter(id__in=upserted)
+        }
+
+    # 'course' no se manda al cliente: sirve para filtrar por suscriptor
+    events = []
+    for change in changes:
+        if change.action == FileChange.UPSERT and change.file_id in files:
+            events.append({'id': change.id, 'event': UPSERTED, 'data': files[change.file_id], 'course': change.course_id})
+        else:
+            # Un alta que ya se borró también se anuncia como borrado
+            events.append({'id': change.id, 'event': DELETED, 'data': {'id': change.file_id}, 'course': change.course_id})
+    return events
+
+
+def publish_changes(changes):
+    broker = get_event_broker()
+    if changes and broker.wants_events():
+        broker.publish(build_events(changes))
+
+
+def format_event(event):
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'], separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def replay_events(last_event_id, limit, user=None):
+    """
+    Eventos posteriores a Last-Event-ID, desde el registro de cambios. También
+    se repiten los de los últimos FILES_SYNC_SETTLE_SECONDS, por si una
+    transacción con un id menor se confirmó después de la que vio el cliente.
+
+    Si hay más de 'limit' cambios, o el registro ya se podó hasta ese punto,
+    se manda un solo evento files.resync: con sync_token el cliente sigue por
+    /tasks/api/files/changes/; sin él vuelve a bajar el listado completo.
+    Con 'user', solo los cambios de sus cursos y de los archivos generales.
+    """
+    from .models import FileChange
+    from .sync import encode_sync_token, visible_changes_filter
+
+    if last_event_id and not FileChange.objects.filter(id__lte=last_event_id).exists():
+        return [{'event': RESYNC, 'data': {'sync_token': None}}]
+
+    settled_before = timezone.now() - timedelta(seconds=getattr(settings, 'FILES_SYNC_SETTLE_SECONDS', 5))
+    changes = FileChange.objects.filter(Q(id__gt=last_event_id) | Q(changed_at__gte=settled_before))
+    visible = visible_changes_filter(user)
+    if visible is not None:
+        changes = changes.filter(visible)
+    rows = list(changes.order_by('id')[:limit + 1])
+    if len(rows) > limit:
+        return [{'event': RESYNC, 'data': {'sync_token': encode_sync_token(last_event_id, user)}}]
+
+    # Solo el último cambio de cada archivo, en orden
+    latest = {change.file_id: change for change in rows}
+    return build_events(sorted(latest.values(), key=lambda change: change.id))
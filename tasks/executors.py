@@ -0,0 +1,54 @@
+"""
+Pools acotados para el trabajo bloqueante de las vistas async.
+
+Subir al almacenamiento o verificar un hash de contraseña no debe correr en el
+event loop, pero tampoco queremos un hilo por request: cada tipo de trabajo
+tiene su propio pool con un máximo de hilos (ASYNC_EXECUTOR_WORKERS), así una
+ráfaga de logins no deja sin hilos a las subidas y viceversa.
+
+Lo que corre aquí no debe usar el ORM: las conexiones son por hilo y estos
+hilos no las cierran. Para la BD usar el ORM async o sync_to_async.
+
+El caché también bloquea si es de red (Redis, Memcached): run_cache_call lo
+manda al pool 'cache' y solo llama directo a locmem, que no hace I/O.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+
+DEFAULT_WORKERS = {
+    'storage': 8,
+    'hashing': os.cpu_count() or 2,
+    'cache': 8,
+}
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name):
+    with _lock:
+        if name not in _executors:
+            workers = getattr(settings, 'ASYNC_EXECUTOR_WORKERS', {}).get(name, DEFAULT_WORKERS[name])
+            _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"async-{name}")
+        return _executors[name]
+
+
+async def run_blocking(name, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Con el contexto del request, para que las métricas (tasks/metrics.py) lo sigan
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(name), call)
+
+
+async def run_cache_call(cache, func, *args, **kwargs):
+    """Llama a func (que usa 'cache') sin bloquear el event loop si el caché hace I/O."""
+    if isinstance(cache, LocMemCache):
+        return func(*args, **kwargs)
+    return await run_blocking('cache', func, *args, **kwargs)
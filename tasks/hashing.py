@@ -0,0 +1,90 @@
+"""
+Verificación de contraseñas fuera del worker web.
+
+Con LOGIN_HASH_WORKERS > 0 el PBKDF2 del login corre en un pool de procesos
+de ese tamaño, así una ráfaga de logins no se come la CPU que atiende el resto
+de la API. Si ya hay LOGIN_HASH_MAX_PENDING verificaciones esperando turno, el
+login responde 429 de inmediato en vez de encolar sin límite.
+
+Con LOGIN_HASH_WORKERS = 0 (por defecto) se verifica en el mismo proceso.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework.exceptions import Throttled
+
+from .executors import run_blocking
+
+_pools = {}
+_lock = threading.Lock()
+
+
+class HashQueueFull(Throttled):
+    default_detail = 'Demasiados inicios de sesión en curso, intenta de nuevo en unos segundos.'
+
+    def __init__(self):
+        super().__init__(wait=1)
+
+
+def _init_worker(settings_module):
+    # Con el método "spawn" el proceso hijo arranca sin Django configurado
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def _verify(password, encoded):
+    if encoded is None:
+        # Usuario inexistente: gastamos lo mismo que con uno real (como ModelBackend)
+        make_password(password)
+        return False
+    return check_password(password, encoded)
+
+
+def get_pool():
+    """(pool, semáforo de lugares) o None si la verificación es en proceso."""
+    workers = getattr(settings, 'LOGIN_HASH_WORKERS', 0)
+    if workers <= 0:
+        return None
+    max_pending = getattr(settings, 'LOGIN_HASH_MAX_PENDING', 32)
+    key = (workers, max_pending)
+    with _lock:
+        if key not in _pools:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'django_crud_api.settings'),),
+            )
+            _pools[key] = (pool, threading.BoundedSemaphore(workers + max_pending))
+        return _pools[key]
+
+
+def submit(password, encoded):
+    """Future de la verificación en el pool, None si no hay pool. Lanza HashQueueFull."""
+    pool = get_pool()
+    if pool is None:
+        return None
+    executor, slots = pool
+    if not slots.acquire(blocking=False):
+        raise HashQueueFull()
+    future = executor.submit(_verify, password, encoded)
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def verify_password(password, encoded):
+    future = submit(password, encoded)
+    if future is None:
+        return _verify(password, encoded)
+    return future.result()
+
+
+async def averify_password(password, encoded):
+    future = submit(password, encoded)
+    if future is None:
+        return await run_blocking('hashing', _verify, password, encoded)
+    return await asyncio.wrap_future(future)
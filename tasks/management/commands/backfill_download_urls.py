@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from tasks.cache import bump_files_version
+from tasks.models import ProfessorFile
+
+
+class Command(BaseCommand):
+    help = "Calcula download_url para los archivos que todavía no la tienen guardada."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Cantidad de filas a leer y actualizar por lote (default: 500).',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = (
+            ProfessorFile.objects
+            .filter(download_url__isnull=True)
+            .exclude(file='')
+            .order_by('id')
+            .only('id', 'file', 'download_url')
+        )
+
+        last_id = 0
+        updated = 0
+        while True:
+            # Avanzamos por id para no depender de OFFSET en tablas grandes
+            batch = list(pending.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            for obj in batch:
+                obj.download_url = obj.compute_download_url()
+            ProfessorFile.objects.bulk_update(batch, ['download_url'])
+
+            last_id = batch[-1].id
+            updated += len(batch)
+            self.stdout.write(f"Actualizados {updated} archivos...")
+
+        if updated:
+            # bulk_update no pasa por save(), invalidamos el listado a mano
+            bump_files_version()
+        self.stdout.write(self.style.SUCCESS(f"Listo: {updated} archivos con download_url."))
@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tasks.benchmark import SCENARIOS, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de la API sobre WSGI y ASGI: siembra usuarios y archivos en una base de "
+        "datos de prueba temporal y reporta throughput, p50/p95/p99 y consultas por request "
+        "en JSON. No usa la red: almacenamiento local y correo en memoria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--files', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=100, help='Requests por escenario y app.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Entre: {', '.join(SCENARIOS)}.")
+        parser.add_argument('--apps', default='wsgi,asgi')
+        parser.add_argument('--storage-backend', default='tasks.storage.LocalFileStorage',
+                            help='tasks.storage.SimulatedCloudinaryStorage agrega la demora de la API remota.')
+        parser.add_argument('--fast-hasher', action='store_true',
+                            help='Usa MD5 en vez de PBKDF2 (login y refresh dejan de medir el hashing).')
+        parser.add_argument('--output', help='Archivo JSON para el resultado (por defecto, stdout).')
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        apps = [name for name in options['apps'].split(',') if name]
+        unknown = set(scenarios) - set(SCENARIOS) or set(apps) - {'wsgi', 'asgi'}
+        if unknown:
+            raise CommandError(f"Desconocido: {', '.join(sorted(unknown))}")
+
+        storage_root = tempfile.mkdtemp(prefix='bench-storage-')
+        rates = {scope: None for scope in settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {})}
+        overrides = {
+            'FILE_STORAGE_BACKEND': options['storage_backend'],
+            'LOCAL_STORAGE_ROOT': storage_root,
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            # Medimos el camino completo, no las cubetas del throttling
+            'REST_FRAMEWORK': {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates},
+        }
+        if options['fast_hasher']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+        if connection.vendor == 'sqlite':
+            # La base en memoria compartida bloquea tablas enteras con escrituras concurrentes
+            connection.settings_dict['TEST']['NAME'] = os.path.join(storage_root, 'bench.sqlite3')
+            connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                report = run_benchmark(
+                    users=options['users'],
+                    files=options['files'],
+                    requests=options['requests'],
+                    concurrency=options['concurrency'],
+                    scenarios=scenarios,
+                    apps=apps,
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(storage_root, ignore_errors=True)
+
+        report['meta']['storage_backend'] = options['storage_backend']
+        report['meta']['fast_hasher'] = options['fast_hasher']
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Resultado guardado en {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from tasks.benchmark import summarize, timed
+from tasks.models import CustomUser
+
+BENCH_PASSWORD = 'Bench-Login-123'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia del login de un usuario legítimo mientras varios hilos hacen "
+        "credential spray (muchos correos, contraseñas malas, pocas IPs). Corre sobre una "
+        "base de datos de prueba temporal, como bench_api: no toca la configurada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attackers', type=int, default=8, help='Hilos atacantes.')
+        parser.add_argument('--attempts', type=int, default=100, help='Intentos por atacante.')
+        parser.add_argument('--attacker-ips', type=int, default=4, help='IPs que rotan los atacantes.')
+        parser.add_argument('--legit', type=int, default=50, help='Logins del usuario legítimo.')
+        parser.add_argument('--legit-interval', type=float, default=0.05, help='Pausa entre logins legítimos.')
+        parser.add_argument('--no-throttle', action='store_true', help='Desactiva las cubetas de login.')
+        parser.add_argument('--hash-workers', type=int, default=None, help='Sobrescribe LOGIN_HASH_WORKERS.')
+        parser.add_argument('--output', help='Archivo JSON para el resultado (por defecto, stdout).')
+
+    def handle(self, *args, **options):
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        if options['no_throttle']:
+            rates = dict(settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {}))
+            rates.update({'login_ip': None, 'login_email': None})
+            overrides['REST_FRAMEWORK'] = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}
+        if options['hash_workers'] is not None:
+            overrides['LOGIN_HASH_WORKERS'] = options['hash_workers']
+
+        # El usuario y los OutstandingToken de cada login quedan en una base temporal
+        bench_dir = tempfile.mkdtemp(prefix='bench-login-')
+        if connection.vendor == 'sqlite':
+            # La base en memoria compartida bloquea tablas enteras con escrituras concurrentes
+            connection.settings_dict['TEST']['NAME'] = os.path.join(bench_dir, 'bench.sqlite3')
+            connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            run_id = uuid.uuid4().hex[:8]
+            email = f"bench-login-{run_id}@example.invalid"
+            CustomUser.objects.create_user(username=f"bench-login-{run_id}", email=email, password=BENCH_PASSWORD)
+            with override_settings(**overrides):
+                result = self.run_spray(email, run_id, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(bench_dir, ignore_errors=True)
+
+        result['config'] = {
+            key: options[key]
+            for key in ('attackers', 'attempts', 'attacker_ips', 'legit', 'no_throttle', 'hash_workers')
+        }
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Resultado guardado en {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run_spray(self, email, run_id, options):
+        url = reverse('token_obtain_pair')
+        attack_statuses = Counter()
+        legit_statuses = Counter()
+        legit_latencies = []
+        lock = threading.Lock()
+
+        def attacker(index):
+            client = Client()
+            for attempt in range(options['attempts']):
+                ip = f"10.66.{index % options['attacker_ips']}.1"
+                victim = f"victima-{run_id}-{attempt}-{index}@example.invalid"
+                response = client.post(url, {'email': victim, 'password': 'Primavera2024'}, REMOTE_ADDR=ip)
+                with lock:
+                    attack_statuses[response.status_code] += 1
+
+        def legitimate():
+            client = Client()
+            for _ in range(options['legit']):
+                response, elapsed = timed(
+                    client.post, url, {'email': email, 'password': BENCH_PASSWORD}, REMOTE_ADDR='192.0.2.10'
+                )
+                with lock:
+                    legit_statuses[response.status_code] += 1
+                    legit_latencies.append(elapsed)
+                time.sleep(options['legit_interval'])
+
+        threads = [threading.Thread(target=attacker, args=(index,)) for index in range(options['attackers'])]
+        threads.append(threading.Thread(target=legitimate))
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return {
+            'legit_login': {**summarize(legit_latencies), 'statuses': dict(legit_statuses)},
+            'attack': {'requests': sum(attack_statuses.values()), 'statuses': dict(attack_statuses)},
+            'elapsed_s': round(elapsed, 2),
+        }
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tasks.sync import prune_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra del registro de cambios (sincronización incremental) lo que es más viejo "
+        "que FILES_SYNC_RETENTION_DAYS. Los tokens de esa edad ya no se aceptan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = prune_changes(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Listo: {count} cambios eliminados."))
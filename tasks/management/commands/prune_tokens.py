@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from tasks.tokens import bookkeeping
+
+
+class Command(BaseCommand):
+    help = "Borra por partes los OutstandingToken/BlacklistedToken ya expirados."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Filas a borrar por transacción (default: 5000).')
+
+    def handle(self, *args, **options):
+        # Lo que quedó en memoria de este proceso primero
+        bookkeeping.flush()
+
+        chunk_size = options['chunk_size']
+        now = timezone.now()
+        total = 0
+        while True:
+            ids = list(
+                OutstandingToken.objects
+                .filter(expires_at__lt=now)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            # Cada parte en su propia transacción: cortas, y sin lista negra huérfana si falla a la mitad
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            total += len(ids)
+            self.stdout.write(f"Borrados {total} tokens expirados...")
+
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total} tokens expirados eliminados."))
@@ -0,0 +1,92 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from tasks.models import ProfessorFile
+from tasks.storage import DELETE_BATCH_SIZE, StorageError, get_file_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina del almacenamiento los assets de los archivos borrados (borrado lógico) "
+        "y luego quita las filas. Con --loop queda corriendo como worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DELETE_BATCH_SIZE,
+                            help=f'Archivos por lote (máximo {DELETE_BATCH_SIZE}, el límite de Cloudinary).')
+        parser.add_argument('--loop', action='store_true', help='Seguir corriendo y revisar cada --interval segundos.')
+        parser.add_argument('--interval', type=float, default=10.0)
+        parser.add_argument('--grace', type=float, default=None,
+                            help='Segundos desde el borrado antes de purgar (default: FILES_PURGE_GRACE_SECONDS).')
+
+    def handle(self, *args, **options):
+        batch_size = min(options['batch_size'], DELETE_BATCH_SIZE)
+        grace = options['grace']
+        if grace is None:
+            grace = getattr(settings, 'FILES_PURGE_GRACE_SECONDS', 300)
+        total = 0
+        while True:
+            purged = self.purge_batch(batch_size, timedelta(seconds=grace))
+            total += purged
+            if purged:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total} archivos purgados."))
+
+    def purge_batch(self, batch_size, grace):
+        # La deduplicación (tasks.storage.store_upload) busca un archivo vivo con el
+        # mismo hash y después inserta el suyo apuntando al mismo asset. Si en el
+        # medio se borra el último archivo vivo, el asset tiene que sobrevivir
+        # hasta que aparezca la fila nueva: por eso solo se purga lo borrado hace
+        # más de 'grace', y el asset cuenta como en uso mientras algún archivo con
+        # él esté vivo o se haya borrado hace menos que eso.
+        cutoff = timezone.now() - grace
+        rows = list(
+            ProfessorFile.all_objects
+            .filter(deleted_at__lte=cutoff)
+            .order_by('deleted_at', 'id')
+            .only('id', 'file')[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        groups = defaultdict(dict)
+        for row in rows:
+            if row.file:
+                groups[row.file.resource_type][row.file.get_prep_value()] = row.file.public_id
+
+        storage = get_file_storage()
+        failed_types = set()
+        for resource_type, assets in groups.items():
+            # Se revisa justo antes de cada delete_many, no una vez por lote
+            in_use = {
+                resource.get_prep_value()
+                for resource in ProfessorFile.all_objects
+                .filter(file__in=assets)
+                .filter(Q(deleted_at__isnull=True) | Q(deleted_at__gt=cutoff))
+                .values_list('file', flat=True)
+            }
+            public_ids = {public_id for value, public_id in assets.items() if value not in in_use}
+            if not public_ids:
+                continue
+            try:
+                storage.delete_many(sorted(public_ids), resource_type)
+            except StorageError as exc:
+                # Dejamos las filas para reintentar en la próxima vuelta
+                failed_types.add(resource_type)
+                self.stderr.write(f"No se pudieron borrar {len(public_ids)} assets '{resource_type}': {exc}")
+
+        done = [row.id for row in rows if not row.file or row.file.resource_type not in failed_types]
+        ProfessorFile.all_objects.filter(id__in=done).delete()
+        if failed_types and not done:
+            # Todo el lote falló: no insistir en un bucle apretado
+            return 0
+        return len(done)
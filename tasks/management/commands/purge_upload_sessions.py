@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = "Borra las sesiones de subida reanudable expiradas y sus archivos parciales."
+
+    def handle(self, *args, **options):
+        expired = UploadSession.objects.filter(expires_at__lte=timezone.now())
+        count = 0
+        for session in expired.iterator():
+            session.discard()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Listo: {count} sesiones expiradas eliminadas."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from tasks.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Vuelve a crear el índice de búsqueda de títulos (FTS5 y sus triggers en SQLite, "
+        "pg_trgm en PostgreSQL) y lo llena con los archivos actuales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        install_search_index(connection)
+        self.stdout.write(self.style.SUCCESS(f"Listo: índice de búsqueda reconstruido ({connection.vendor})."))
@@ -0,0 +1,244 @@
+"""
+Medición por request: cuánto tiempo se va en la BD, el almacenamiento, el SMTP
+y la serialización.
+
+ServerTimingMiddleware (tasks/middleware.py) abre un RequestTimings por
+request en un contextvar; el código instrumentado suma su tiempo con
+track('storage'), etc. El contextvar viaja con sync_to_async y con
+run_blocking(), así que también cuenta el trabajo de las vistas async.
+
+Los totales van al header Server-Timing y a histogramas por ruta que se
+exponen en formato Prometheus en /metrics. Los histogramas viven en memoria de
+cada proceso: con varios workers Prometheus debe scrapear cada uno.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.renderers import JSONRenderer
+
+COMPONENTS = ('db', 'storage', 'smtp', 'serialize')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+MAX_CAPTURED_SQL = 500
+
+_current = contextvars.ContextVar('tasks_request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.durations = dict.fromkeys(COMPONENTS, 0.0)
+        self.queries = 0
+        # Lista de (sql, segundos) cuando alguien (el profiler) pide capturarlas
+        self.captured_sql = None
+        self._lock = threading.Lock()
+        self._depth = {}
+
+    def add(self, component, seconds):
+        with self._lock:
+            self.durations[component] = self.durations.get(component, 0.0) + seconds
+
+    def add_query(self, seconds, sql=None):
+        with self._lock:
+            self.queries += 1
+            self.durations['db'] += seconds
+            if self.captured_sql is not None and len(self.captured_sql) < MAX_CAPTURED_SQL:
+                self.captured_sql.append((sql, seconds))
+
+    @contextmanager
+    def track(self, component):
+        # Solo mide la llamada más externa de cada hilo: un backend que llama
+        # a su super() no se cuenta dos veces
+        key = (component, threading.get_ident())
+        with self._lock:
+            depth = self._depth.get(key, 0)
+            self._depth[key] = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._depth[key] = depth
+                if depth == 0:
+                    self.durations[component] = self.durations.get(component, 0.0) + elapsed
+
+
+def current_timings():
+    return _current.get()
+
+
+def start_request():
+    """Empieza a medir; devuelve (timings, token para end_request)."""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def track(component):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.track(component):
+        yield
+
+
+def tracked(component):
+    """Decorador: suma el tiempo de la función al componente."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(component):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Consultas SQL ---
+
+def _query_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(time.perf_counter() - start, sql)
+
+
+def _attach(connection, **kwargs):
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def install_query_tracking():
+    """Engancha el contador a las conexiones actuales y a todas las que se abran después."""
+    connection_created.connect(_attach, dispatch_uid='tasks.metrics.query_tracking')
+    for connection in connections.all():
+        _attach(connection)
+
+
+# --- Serialización ---
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with track('serialize'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+# --- Header y histogramas ---
+
+def server_timing_header(timings, total):
+    parts = [f'db;dur={timings.durations["db"] * 1000:.2f};desc="{timings.queries} queries"']
+    for component in COMPONENTS[1:]:
+        parts.append(f"{component};dur={timings.durations[component] * 1000:.2f}")
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(parts)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.queries = {}
+        self.requests = {}
+
+    def observe(self, route, method, status, timings, total):
+        values = dict(timings.durations, total=total)
+        with self._lock:
+            for component, seconds in values.items():
+                key = (route, method, component)
+                self.durations.setdefault(key, Histogram(DURATION_BUCKETS)).observe(seconds)
+            self.queries.setdefault((route, method), Histogram(QUERY_BUCKETS)).observe(timings.queries)
+            key = (route, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.durations.clear()
+            self.queries.clear()
+            self.requests.clear()
+
+    def render(self):
+        """Formato de texto de Prometheus (0.0.4)."""
+        lines = []
+        with self._lock:
+            lines += [
+                '# HELP tasks_requests_total Requests atendidos.',
+                '# TYPE tasks_requests_total counter',
+            ]
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f"tasks_requests_total{_labels(route=route, method=method, status=status)} {count}")
+
+            lines += [
+                '# HELP tasks_request_duration_seconds Tiempo por request y por componente (total, db, storage, smtp, serialize).',
+                '# TYPE tasks_request_duration_seconds histogram',
+            ]
+            for (route, method, component), histogram in sorted(self.durations.items()):
+                lines += _histogram_lines(
+                    'tasks_request_duration_seconds', histogram, route=route, method=method, component=component
+                )
+
+            lines += [
+                '# HELP tasks_request_db_queries Consultas SQL por request.',
+                '# TYPE tasks_request_db_queries histogram',
+            ]
+            for (route, method), histogram in sorted(self.queries.items()):
+                lines += _histogram_lines('tasks_request_db_queries', histogram, route=route, method=method)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, histogram, **labels):
+    lines = [
+        f"{name}_bucket{_labels(**labels, le=bound)} {count}"
+        for bound, count in histogram.cumulative()
+    ]
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+    return lines
+
+
+registry = MetricsRegistry()
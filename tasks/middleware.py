@@ -0,0 +1,213 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedJWTAuthentication
+from .metrics import current_timings, end_request, install_query_tracking, registry, server_timing_header, start_request
+from .profiling import RequestProfiler
+from . import replicas
+
+
+def route_of(request):
+    """Patrón de la URL (no la URL en sí) para no crear una serie por ID."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return '/' + match.route if match.route else match.view_name or 'unknown'
+
+
+class ServerTimingMiddleware:
+    """
+    Mide cada request (BD, almacenamiento, SMTP, serialización y total), lo
+    devuelve en Server-Timing y lo acumula en los histogramas de /metrics.
+    Sirve tanto para WSGI como para ASGI sin forzar las vistas async a sync.
+    El header muestra cuántas consultas hace cada vista: solo va al staff,
+    salvo con SERVER_TIMING_HEADER (activo por defecto con DEBUG).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install_query_tracking()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        timings, token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        timings, token = start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    def finish(self, request, response, timings, total):
+        if getattr(settings, 'SERVER_TIMING_HEADER', False) or self.is_staff(request):
+            response['Server-Timing'] = server_timing_header(timings, total)
+        registry.observe(route_of(request), request.method, response.status_code, timings, total)
+        return response
+
+    @staticmethod
+    def is_staff(request):
+        # Las vistas de DRF y AsyncAPIView dejan en el request el usuario del JWT
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+class ProfilingMiddleware:
+    """
+    Corre el request bajo cProfile (tasks/profiling.py) si un staff manda el
+    header PROFILING_HEADER o si sale sorteado por PROFILING_SAMPLE_RATE.
+    Va después de AuthenticationMiddleware para ver al usuario de la sesión;
+    el JWT se valida solo cuando viene el header.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.authentication = CachedJWTAuthentication()
+
+    def sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def is_staff(self, request):
+        if request.user.is_authenticated:
+            return request.user.is_staff
+        try:
+            result = self.authentication.authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return result is not None and result[0].is_staff
+
+    async def ais_staff(self, request):
+        user = await request.auser()
+        if user.is_authenticated:
+            return user.is_staff
+        try:
+            result = await self.authentication.aauthenticate(request)
+        except AuthenticationFailed:
+            return False
+        return result is not None and result[0].is_staff
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if self.header in request.META:
+            trigger = 'header' if self.is_staff(request) else None
+        else:
+            trigger = 'sample' if self.sampled() else None
+        if trigger is None:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with RequestProfiler(current_timings()) as profiler:
+            response = self.get_response(request)
+        return self.finish(request, response, profiler, trigger, 'wsgi', time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if self.header in request.META:
+            trigger = 'header' if await self.ais_staff(request) else None
+        else:
+            trigger = 'sample' if self.sampled() else None
+        if trigger is None:
+            return await self.get_response(request)
+
+        # cProfile solo ve el hilo del event loop: lo que corre en
+        # sync_to_async/run_blocking aparece como la espera, y pueden colarse
+        # otros requests que el loop atienda en paralelo
+        start = time.perf_counter()
+        with RequestProfiler(current_timings()) as profiler:
+            response = await self.get_response(request)
+        return self.finish(request, response, profiler, trigger, 'asgi', time.perf_counter() - start)
+
+    def finish(self, request, response, profiler, trigger, mode, total):
+        response['X-Profile-Id'] = profiler.save({
+            'method': request.method,
+            'path': request.path,
+            'route': route_of(request),
+            'status': response.status_code,
+            'trigger': trigger,
+            'mode': mode,
+            'duration_ms': round(total * 1000, 3),
+        })
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Habilita las lecturas desde la réplica (tasks/replicas.py) en los requests
+    seguros a las vistas de tasks, salvo que el cliente tenga la cookie de
+    READ_REPLICA_PIN_COOKIE. Si el request escribió, deja esa cookie.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request._db_routing, token = replicas.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.end_request(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        request._db_routing, token = replicas.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.end_request(token)
+        return self.finish(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Corre ya resuelta la URL; en ASGI puede ser en otro hilo, por eso se
+        # modifica el estado en lugar de volver a setear el contextvar
+        alias = replicas.get_replica_alias()
+        if (
+            alias is not None
+            and request.method in ('GET', 'HEAD', 'OPTIONS')
+            and getattr(view_func, '__module__', None) in replicas.REPLICA_VIEW_MODULES
+            and settings.READ_REPLICA_PIN_COOKIE not in request.COOKIES
+        ):
+            request._db_routing.alias = alias
+        return None
+
+    def finish(self, request, response):
+        if request._db_routing.wrote and replicas.get_replica_alias() is not None:
+            response.set_cookie(
+                settings.READ_REPLICA_PIN_COOKIE, '1',
+                max_age=getattr(settings, 'READ_REPLICA_PIN_SECONDS', 10), httponly=True, samesite='Lax',
+            )
+        return response
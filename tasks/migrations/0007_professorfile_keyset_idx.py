@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_alter_professorfile_file'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='professorfile',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='professorfile_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_professorfile_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professorfile',
+            name='download_url',
+            field=models.URLField(blank=True, max_length=500, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professorfile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='professorfile',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='professorfile',
+            name='resource_type',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='professorfile',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_professorfile_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professorfile',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    prune_tokens filtra OutstandingToken por expires_at; la tabla es de
+    simplejwt y no trae índice en esa columna.
+    """
+
+    dependencies = [
+        ('tasks', '0012_outboundemail'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS tasks_outstandingtoken_expires_idx "
+            "ON token_blacklist_outstandingtoken (expires_at);",
+            reverse_sql="DROP INDEX IF EXISTS tasks_outstandingtoken_expires_idx;",
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+from tasks.search import drop_search_index, install_search_index
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 en SQLite, pg_trgm + GIN en PostgreSQL (ver tasks/search.py)
+    install_search_index(schema_editor.connection)
+
+
+def remove_search_index(apps, schema_editor):
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0014_filechange'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, remove_search_index),
+        migrations.AddIndex(
+            model_name='professorfile',
+            index=models.Index(fields=['uploaded_by', '-uploaded_at', '-id'], name='professorfile_owner_keyset_idx'),
+        ),
+    ]
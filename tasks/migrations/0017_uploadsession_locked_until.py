@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0016_courses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,8 +1,43 @@
-from django.db import models
+import os
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+from django.core.files.uploadedfile import UploadedFile
 from cloudinary.models import CloudinaryField
 
+from .authentication import invalidate_course_ids_on_commit, invalidate_cached_user_on_commit
+from .cache import bump_files_version_on_commit, course_scope
+from .events import publish_changes
+
+
+def build_download_url(url):
+    """
+    Normaliza la URL del archivo para descarga: fuerza HTTPS y, si es de
+    Cloudinary, inyecta fl_attachment justo después de /upload/.
+    """
+    if not url:
+        return None
+
+    # 1. Forzar HTTPS
+    if url.startswith("http://"):
+        url = url.replace("http://", "https://", 1)
+
+    # 2. Inyectar el flag de descarga (fl_attachment)
+    # Esto funciona para 'image', 'video' y 'raw' por igual
+    if ".cloudinary.com" in url and "/upload/" in url:
+        if "fl_attachment" not in url:
+            url = url.replace("/upload/", "/upload/fl_attachment/", 1)
+
+    return url
+
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True, blank=False)
@@ -25,6 +60,94 @@ class CustomUser(AbstractUser):
         verbose_name = 'User'
         verbose_name_plural = 'Users'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # El usuario cacheado por CachedJWTAuthentication puede haber cambiado
+        # de rol, contraseña o is_active
+        invalidate_cached_user_on_commit(self.pk)
+
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        invalidate_cached_user_on_commit(user_id)
+        return result
+
+
+class ProfessorFileQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """
+        Marca los archivos como borrados en un solo UPDATE y devuelve sus IDs.
+        El asset remoto lo elimina después el worker (manage.py purge_deleted_files).
+        """
+        # IDs y cursos hacen falta para las lápidas (tasks/sync.py) y para
+        # invalidar solo el caché de esos cursos
+        rows = list(self.filter(deleted_at__isnull=True).values_list('id', 'course_id'))
+        if not rows:
+            return []
+        file_ids = [file_id for file_id, _ in rows]
+        self.model.all_objects.filter(id__in=file_ids).update(deleted_at=timezone.now())
+        FileChange.record(rows, FileChange.DELETE)
+        bump_files_version_on_commit(course_scope(course_id) for _, course_id in rows)
+        return file_ids
+
+    async def asoft_delete(self):
+        return await sync_to_async(self.soft_delete)()
+
+
+class ActiveFileManager(models.Manager.from_queryset(ProfessorFileQuerySet)):
+    """Solo archivos no borrados: es lo que ve toda la app."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class Course(models.Model):
+    """Curso/aula. Los archivos con curso solo los ven sus inscriptos (y el staff)."""
+    name = models.CharField(max_length=255)
+    code = models.CharField(max_length=50, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    members = models.ManyToManyField(settings.AUTH_USER_MODEL, through='Enrollment', related_name='courses')
+
+    def __str__(self):
+        return f"{self.code} - {self.name}"
+
+
+class Enrollment(models.Model):
+    """Inscripción de un usuario (alumno o profesor) en un curso."""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='enrollments')
+    enrolled_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='enrollment_unique_user_course'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} en {self.course_id}"
+
+    # Los cursos de cada usuario se cachean (tasks.permissions.get_course_ids).
+    # Los borrados (también en lote, por members.remove()/clear() o al borrar
+    # el curso) los cubre post_delete; members.add() usa bulk_create y lo
+    # cubre m2m_changed (ver abajo)
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_course_ids_on_commit(self.user_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    invalidate_course_ids_on_commit(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Course.members.through)
+def course_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    # Desde el curso pk_set son usuarios; desde el usuario (user.courses.add) son cursos
+    for user_id in ({instance.pk} if reverse else pk_set):
+        invalidate_course_ids_on_commit(user_id)
+
 
 class ProfessorFile(models.Model):
     uploaded_by = models.ForeignKey(
@@ -32,6 +155,14 @@ class ProfessorFile(models.Model):
         on_delete=models.CASCADE,
         related_name='files'
     )
+    # Sin curso: material general, visible para cualquier usuario autenticado
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='files'
+    )
 
     
     file = CloudinaryField(
@@ -42,5 +173,202 @@ class ProfessorFile(models.Model):
     title = models.CharField(max_length=255, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    # URL de descarga ya normalizada, calculada una sola vez al subir el archivo
+    download_url = models.URLField(max_length=500, null=True, blank=True)
+
+    # Metadatos guardados al subir, para no preguntarle al almacenamiento
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # SHA-256
+    size = models.BigIntegerField(null=True, blank=True)  # bytes
+    content_type = models.CharField(max_length=100, blank=True)
+    resource_type = models.CharField(max_length=10, blank=True)  # image / video / raw
+
+    # Borrado lógico: la fila desaparece del listado al instante y el asset se purga en segundo plano
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = ActiveFileManager()
+    all_objects = ProfessorFileQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Índice compuesto para la paginación por cursor (uploaded_at, id)
+            models.Index(fields=['-uploaded_at', '-id'], name='professorfile_keyset_idx'),
+            # El mismo orden filtrando por profesor (?professor=)
+            models.Index(fields=['uploaded_by', '-uploaded_at', '-id'], name='professorfile_owner_keyset_idx'),
+            # Y por curso: el listado de un alumno solo recorre las filas de sus cursos
+            models.Index(fields=['course', '-uploaded_at', '-id'], name='professorfile_course_kset_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Si se mueve de curso hay que invalidar también el caché del curso anterior.
+        # Por __dict__: con only()/defer() leer el atributo haría una consulta
+        self._loaded_course_id = self.__dict__.get('course_id')
+
     def __str__(self):
         return f"{self.title} - {self.uploaded_by.email}"
+
+    def save(self, *args, **kwargs):
+        # Si llega un archivo nuevo, CloudinaryField lo sube dentro de save()
+        # y recién después conocemos su URL final.
+        pending_upload = isinstance(self.file, UploadedFile)
+        moved = not self._state.adding and self._loaded_course_id != self.course_id
+        if not pending_upload and self.download_url is None:
+            self.download_url = self.compute_download_url()
+
+        super().save(*args, **kwargs)
+
+        if pending_upload:
+            self.download_url = self.compute_download_url()
+            type(self).objects.filter(pk=self.pk).update(download_url=self.download_url)
+
+        # El listado cacheado ya no es válido. Si cambió de curso, para los
+        # inscriptos en el anterior es un borrado
+        if moved:
+            FileChange.record([(self.pk, self._loaded_course_id)], FileChange.DELETE)
+        FileChange.record([(self.pk, self.course_id)], FileChange.UPSERT)
+        bump_files_version_on_commit({course_scope(self.course_id), course_scope(self._loaded_course_id)})
+        self._loaded_course_id = self.course_id
+
+    def delete(self, *args, **kwargs):
+        file_id = self.pk
+        result = super().delete(*args, **kwargs)
+        if self.deleted_at is None:
+            FileChange.record([(file_id, self.course_id)], FileChange.DELETE)
+        bump_files_version_on_commit([course_scope(self.course_id)])
+        return result
+
+    def compute_download_url(self):
+        if not self.file:
+            return None
+        # to_python acepta tanto el recurso de Cloudinary como el texto guardado
+        resource = self._meta.get_field('file').to_python(self.file)
+        return build_download_url(resource.url)
+
+
+class FileChange(models.Model):
+    """
+    Registro de cambios de ProfessorFile para la sincronización incremental
+    (tasks/sync.py). El id autoincremental hace de número de secuencia; los
+    borrados quedan como lápidas aunque la fila del archivo ya se haya purgado.
+    """
+    UPSERT = 'UPSERT'
+    DELETE = 'DELETE'
+    ACTION_CHOICES = (
+        (UPSERT, 'Created or updated'),
+        (DELETE, 'Deleted'),
+    )
+
+    # Sin FK: la lápida sobrevive a la purga del archivo
+    file_id = models.BigIntegerField()
+    # Curso del archivo, para que cada usuario sincronice solo sus cursos
+    course_id = models.BigIntegerField(null=True, blank=True)
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.file_id}"
+
+    @classmethod
+    def record(cls, files, action):
+        """
+        Una fila por archivo ((file_id, course_id) en 'files'), en un solo
+        INSERT (sirve para bulk_create y soft_delete). Al confirmar la
+        transacción se publica por SSE (tasks/events.py).
+        """
+        now = timezone.now()
+        changes = cls.objects.bulk_create([
+            cls(file_id=file_id, course_id=course_id, action=action, changed_at=now) for file_id, course_id in files
+        ])
+        transaction.on_commit(partial(publish_changes, changes))
+        return changes
+
+
+def default_upload_expiry():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'RESUMABLE_UPLOAD_EXPIRY', 86400))
+
+
+class UploadSession(models.Model):
+    """
+    Subida reanudable (estilo tus). Los bytes se van agregando a un archivo
+    parcial en RESUMABLE_UPLOAD_DIR y 'offset' dice cuántos ya llegaron.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    title = models.CharField(max_length=255, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    # Curso del archivo que se va a crear; sin curso es material general
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='upload_sessions'
+    )
+    # Un PATCH a la vez: se toma con un UPDATE condicional, sin transacción abierta
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_upload_expiry, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.length})"
+
+    @property
+    def part_path(self):
+        return os.path.join(str(settings.RESUMABLE_UPLOAD_DIR), f"{self.id}.part")
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    @property
+    def is_complete(self):
+        return self.offset == self.length
+
+    def discard(self):
+        """Borra la sesión y su archivo parcial."""
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+        self.delete()
+
+
+class OutboundEmail(models.Model):
+    """
+    Bandeja de salida de correos. La vista solo inserta la fila; el worker
+    (manage.py send_outbox) los envía por lotes con una conexión SMTP reusada.
+    """
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('DEAD', 'Dead letter'),
+    )
+
+    to = models.JSONField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    # Plantilla HTML opcional, se renderiza al enviar con 'context'
+    template = models.CharField(max_length=255, blank=True)
+    context = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    # En SENDING es el fin del lease: si el worker muere, el correo se vuelve a tomar
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,120 @@
+"""
+Envío de correos a través de la bandeja de salida (OutboundEmail).
+
+Los requests solo llaman a enqueue_email(); el worker `manage.py send_outbox`
+usa send_due_emails() para mandar los pendientes por lotes sobre una misma
+conexión SMTP, con reintentos exponenciales y dead-letter.
+
+El SMTP nunca corre dentro de una transacción: el lote se reserva (SENDING,
+con un lease en next_attempt_at) en una transacción corta, se envía, y cada
+resultado se guarda con su propio UPDATE. Si el worker muere a mitad del lote,
+lo que quedó en SENDING se vuelve a tomar al vencer el lease (puede salir dos
+veces, nunca ninguna).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .metrics import track
+from .models import OutboundEmail
+
+
+def enqueue_email(to, subject, body, template='', context=None, from_email=None):
+    return OutboundEmail.objects.create(
+        to=list(to),
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.EMAIL_HOST_USER or '',
+        template=template,
+        context=context or {},
+    )
+
+
+async def aenqueue_email(to, subject, body, template='', context=None, from_email=None):
+    return await OutboundEmail.objects.acreate(
+        to=list(to),
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.EMAIL_HOST_USER or '',
+        template=template,
+        context=context or {},
+    )
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.to,
+        connection=connection,
+    )
+    if email.template:
+        message.attach_alternative(render_to_string(email.template, email.context), 'text/html')
+    return message
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def claim_due_emails(batch_size):
+    """Reserva un lote de correos vencidos (o con el lease vencido) y lo devuelve."""
+    now = timezone.now()
+    lease = now + timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LEASE_SECONDS', 300))
+    with transaction.atomic():
+        # skip_locked deja que varios workers trabajen sin pisarse (PostgreSQL)
+        ids = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status__in=['PENDING', 'SENDING'], next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return [], lease
+        # Condicional: sin row locks (SQLite) otro worker pudo tomarlos entre medio
+        OutboundEmail.objects.filter(
+            id__in=ids, status__in=['PENDING', 'SENDING'], next_attempt_at__lte=now
+        ).update(status='SENDING', next_attempt_at=lease)
+    batch = OutboundEmail.objects.filter(id__in=ids, status='SENDING', next_attempt_at=lease)
+    return list(batch.order_by('id')), lease
+
+
+def send_due_emails(connection, batch_size=None):
+    """
+    Envía un lote de correos vencidos. Devuelve (enviados, fallidos).
+    Si la conexión se cae, la excepción se registra en el correo y el worker
+    abre otra en la próxima vuelta.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    sent = failed = 0
+
+    batch, lease = claim_due_emails(batch_size)
+    for email in batch:
+        try:
+            # open() no hace nada si la conexión ya está abierta: una sola para todo el lote
+            with track('smtp'):
+                connection.open()
+                build_message(email, connection).send()
+        except Exception as exc:
+            failed += 1
+            attempts = email.attempts + 1
+            result = {'attempts': attempts, 'last_error': f"{type(exc).__name__}: {exc}"}
+            if attempts >= max_attempts:
+                result['status'] = 'DEAD'
+            else:
+                result.update(status='PENDING', next_attempt_at=timezone.now() + retry_delay(attempts))
+            connection.close()
+        else:
+            sent += 1
+            result = {'attempts': email.attempts + 1, 'status': 'SENT', 'sent_at': timezone.now()}
+        # Solo si el lease sigue siendo nuestro; si venció, el otro worker registra su resultado
+        OutboundEmail.objects.filter(pk=email.pk, status='SENDING', next_attempt_at=lease).update(**result)
+    return sent, failed
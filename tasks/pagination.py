@@ -0,0 +1,136 @@
+import base64
+import binascii
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+
+from .search import search_files
+
+
+class FileCursorPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre (uploaded_at, id).
+
+    En lugar de OFFSET filtramos por la última posición vista, así que la
+    página 100 cuesta lo mismo que la primera gracias al índice compuesto.
+    """
+    ordering = ('-uploaded_at', '-id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'FILES_PAGE_SIZE', 50)
+        self.max_page_size = getattr(settings, 'FILES_MAX_PAGE_SIZE', 200)
+        self.next_position = None
+
+    def get_query_params(self, request):
+        # Las vistas async reciben un HttpRequest de Django, sin query_params
+        return getattr(request, 'query_params', request.GET)
+
+    def get_page_size(self, request):
+        try:
+            size = int(self.get_query_params(request)[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        rows = list(self.page_queryset(queryset, request, page_size))
+        return self.finish_page(rows, page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        rows = [row async for row in self.page_queryset(queryset, request, page_size)]
+        return self.finish_page(rows, page_size)
+
+    def page_queryset(self, queryset, request, page_size):
+        position = self.decode_cursor(request)
+        if position is not None:
+            uploaded_at, pk = position
+            queryset = queryset.filter(
+                Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk)
+            )
+        # Pedimos una fila de más para saber si hay página siguiente sin hacer COUNT
+        return queryset.order_by(*self.ordering)[:page_size + 1]
+
+    def finish_page(self, rows, page_size):
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            self.next_position = (last.uploaded_at, last.id)
+        else:
+            self.next_position = None
+        return rows
+
+    def get_next_cursor(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    # --- Codificación del cursor ---
+
+    def encode_cursor(self, position):
+        uploaded_at, pk = position
+        raw = f"{uploaded_at.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = self.get_query_params(request).get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            timestamp, pk = raw.rsplit('|', 1)
+            uploaded_at = parse_datetime(timestamp)
+            pk = int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if uploaded_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return uploaded_at, pk
+
+
+class FileSearchPagination(FileCursorPagination):
+    """
+    Resultados de ?q= ordenados por relevancia. El ranking no es una columna,
+    así que aquí el cursor es la posición dentro de los resultados; el costo
+    depende de cuántos títulos coinciden, no del tamaño de la tabla.
+    """
+
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        offset = self.decode_cursor(request) or 0
+        rows = search_files(queryset, self.text, offset, page_size + 1)
+        self.next_position = offset + page_size if len(rows) > page_size else None
+        return rows[:page_size]
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(f"rank|{position}".encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = self.get_query_params(request).get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            prefix, offset = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            offset = int(offset)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if prefix != 'rank' or offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
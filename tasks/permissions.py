@@ -1,4 +1,66 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
 from rest_framework import permissions
+
+from .authentication import course_ids_cache_key, get_user_cache
+from .cache import ALL_SCOPE, GENERAL_SCOPE, course_scope
+
+
+# --- Cursos del usuario ---
+# Se leen una vez por usuario (y se guardan en el caché de usuarios y en el
+# propio objeto del request), así que chequear membresía nunca cuesta una
+# consulta por archivo ni por permiso. Enrollment.save()/delete() borra la entrada.
+
+def get_course_ids(user):
+    """frozenset con los IDs de los cursos en los que está inscripto el usuario."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+    course_ids = getattr(user, '_course_ids', None)
+    if course_ids is None:
+        cache = get_user_cache()
+        key = course_ids_cache_key(user.pk)
+        course_ids = cache.get(key)
+        if course_ids is None:
+            from .models import Enrollment
+            # Del primario: una baja leída tarde de la réplica quedaría cacheada
+            enrollments = Enrollment.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user.pk)
+            course_ids = frozenset(enrollments.values_list('course_id', flat=True))
+            cache.set(key, course_ids, timeout=getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+        user._course_ids = course_ids
+    return course_ids
+
+
+async def aget_course_ids(user):
+    if getattr(user, '_course_ids', None) is not None:
+        return user._course_ids
+    return await sync_to_async(get_course_ids)(user)
+
+
+def can_access_course(user, course_id):
+    """Archivos sin curso: cualquiera autenticado. Con curso: inscriptos y staff."""
+    if not user or not user.is_authenticated:
+        return False
+    return course_id is None or user.is_staff or course_id in get_course_ids(user)
+
+
+def visible_files_filter(user):
+    """Q para el queryset de archivos que el usuario puede ver (None = todo, para el staff)."""
+    if user.is_staff:
+        return None
+    return Q(course__isnull=True) | Q(course_id__in=get_course_ids(user))
+
+
+def listing_scopes(user, course_id=None):
+    """Ámbitos de caché (tasks/cache.py) de lo que el usuario ve en el listado."""
+    if course_id is not None:
+        return [course_scope(course_id)]
+    if user.is_staff:
+        return [ALL_SCOPE]
+    return [GENERAL_SCOPE, *(course_scope(pk) for pk in sorted(get_course_ids(user)))]
+
+
 class IsStudent(permissions.BasePermission):
     """
     Permite el acceso solo si el usuario autenticado tiene el rol 'STUDENT'.
@@ -6,6 +68,12 @@ class IsStudent(permissions.BasePermission):
     def has_permission(self, request, view):
         # Verifica si el usuario está autenticado y tiene el rol 'STUDENT'
         return request.user and request.user.is_authenticated and request.user.role == 'STUDENT'
+class IsProfessor(permissions.BasePermission):
+    """
+    Permite el acceso solo si el usuario autenticado tiene el rol 'PROFESSOR'.
+    """
+    def has_permission(self, request, view):
+        return request.user and request.user.is_authenticated and request.user.role == 'PROFESSOR'
 class IsStudentOrProfessor(permissions.BasePermission):
     def has_permission(self, request, view):
         user = request.user
@@ -42,4 +110,36 @@ class IsProfessorOrReadOnly(permissions.BasePermission):
             return True
 
         # 3. Si quiere escribir (POST, DELETE), DEBE ser PROFESSOR
-        return request.user.role == 'PROFESSOR'
\ No newline at end of file
+        return request.user.role == 'PROFESSOR'
+
+
+class IsCourseMember(permissions.BasePermission):
+    """
+    Si el request nombra un curso (?course= al listar, 'course' al subir), el
+    usuario tiene que estar inscripto; a nivel objeto, el archivo tiene que ser
+    de uno de sus cursos. Los cursos salen de get_course_ids: sin consultas
+    extra por chequeo.
+    """
+    message = 'No estás inscripto en este curso.'
+
+    def has_permission(self, request, view):
+        course_id = requested_course_id(request)
+        if course_id is None:
+            return True
+        return can_access_course(request.user, course_id)
+
+    def has_object_permission(self, request, view, obj):
+        return can_access_course(request.user, obj.course_id)
+
+
+def requested_course_id(request):
+    """Curso pedido en la URL o en el cuerpo; None si no hay o no es un número (lo rechaza el serializer)."""
+    params = getattr(request, 'query_params', request.GET)
+    value = params.get('course')
+    if value in (None, '') and request.method not in permissions.SAFE_METHODS:
+        data = getattr(request, 'data', None)
+        value = data.get('course') if hasattr(data, 'get') else None
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
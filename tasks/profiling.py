@@ -0,0 +1,181 @@
+"""
+Perfilado a pedido de requests individuales.
+
+ProfilingMiddleware (tasks/middleware.py) corre el request bajo cProfile
+cuando un staff manda el header PROFILING_HEADER o cuando toca por
+PROFILING_SAMPLE_RATE. El resultado (árbol de llamadas, funciones más
+costosas y el SQL del request) queda en PROFILING_DIR como un buffer circular
+de PROFILING_MAX_ENTRIES perfiles: al guardar uno nuevo se borra el más viejo.
+El staff los ve y descarga desde /admin/profiles/.
+
+Con PROFILING_ENABLED = False el middleware se quita de la cadena al arrancar
+(MiddlewareNotUsed), así que no cuesta nada.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+
+HOT_FUNCTIONS = 30
+TREE_MAX_DEPTH = 12
+TREE_MIN_SHARE = 0.01
+PROFILE_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+_lock = threading.Lock()
+
+
+def get_profile_dir():
+    return str(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def new_profile_id():
+    # Ordenable por nombre: el más viejo es el primero
+    return f"{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def profile_path(profile_id, extension):
+    if not PROFILE_ID_RE.match(profile_id):
+        raise ValueError("ID de perfil inválido.")
+    return os.path.join(get_profile_dir(), f"{profile_id}.{extension}")
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name  # funciones built-in: '<built-in method ...>'
+    return f"{filename}:{line}({name})"
+
+
+def hot_functions(stats, limit=HOT_FUNCTIONS):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [
+        {
+            'function': _label(func),
+            'calls': nc,
+            'own_ms': round(tt * 1000, 3),
+            'cumulative_ms': round(ct * 1000, 3),
+        }
+        for func, (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+def call_tree(stats, total):
+    """
+    Árbol de llamadas armado con los pares llamador→llamado de cProfile. El
+    tiempo de cada nodo es el acumulado de esa arista; se poda lo que pesa
+    menos de TREE_MIN_SHARE del total.
+    """
+    children = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, (_, edge_calls, _, edge_cumulative) in callers.items():
+            children.setdefault(caller, []).append((func, edge_calls, edge_cumulative))
+    # Raíz: alguna llamada no vino de otra función perfilada. No alcanza con
+    # "sin llamadores": el inner() de cada middleware se llama a sí mismo más abajo
+    roots = {
+        func: nc - sum(edge[1] for edge in callers.values())
+        for func, (cc, nc, tt, ct, callers) in stats.stats.items()
+        if nc > sum(edge[1] for edge in callers.values())
+    }
+    threshold = total * TREE_MIN_SHARE
+
+    def build(func, calls, cumulative, path, depth):
+        node = {'function': _label(func), 'calls': calls, 'cumulative_ms': round(cumulative * 1000, 3)}
+        if depth < TREE_MAX_DEPTH:
+            branch = sorted(children.get(func, []), key=lambda child: child[2], reverse=True)
+            node['children'] = [
+                build(child, child_calls, child_cumulative, path | {child}, depth + 1)
+                for child, child_calls, child_cumulative in branch
+                if child_cumulative >= threshold and child not in path
+            ]
+        return node
+
+    return [
+        build(func, calls, stats.stats[func][3], {func}, 0)
+        for func, calls in sorted(roots.items(), key=lambda root: stats.stats[root[0]][3], reverse=True)
+        if stats.stats[func][3] >= threshold
+    ]
+
+
+def save_profile(profiler, meta, captured_sql):
+    """Guarda el perfil (JSON con el reporte + .prof de pstats) y recorta el buffer."""
+    profile_id = new_profile_id()
+    stats = pstats.Stats(profiler)
+    report = {
+        'id': profile_id,
+        **meta,
+        'hot_functions': hot_functions(stats),
+        'call_tree': call_tree(stats, stats.total_tt),
+        'sql': [{'sql': sql, 'ms': round(seconds * 1000, 3)} for sql, seconds in captured_sql or []],
+    }
+
+    os.makedirs(get_profile_dir(), exist_ok=True)
+    stats.dump_stats(profile_path(profile_id, 'prof'))
+    with open(profile_path(profile_id, 'json'), 'w') as handle:
+        json.dump(report, handle)
+    prune_profiles()
+    return profile_id
+
+
+def prune_profiles():
+    keep = getattr(settings, 'PROFILING_MAX_ENTRIES', 50)
+    with _lock:
+        for profile_id in list_profile_ids()[:-keep or None]:
+            for extension in ('json', 'prof'):
+                try:
+                    os.remove(profile_path(profile_id, extension))
+                except FileNotFoundError:
+                    pass
+
+
+def list_profile_ids():
+    try:
+        names = os.listdir(get_profile_dir())
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-5] for name in names if name.endswith('.json') and PROFILE_ID_RE.match(name[:-5]))
+
+
+def list_profiles():
+    """Metadatos de los perfiles guardados, del más nuevo al más viejo."""
+    profiles = []
+    for profile_id in reversed(list_profile_ids()):
+        try:
+            with open(profile_path(profile_id, 'json')) as handle:
+                report = json.load(handle)
+        except (FileNotFoundError, ValueError):
+            continue  # lo borró otro proceso mientras listábamos
+        report.pop('hot_functions', None)
+        report.pop('call_tree', None)
+        report['sql_count'] = len(report.pop('sql', []))
+        profiles.append(report)
+    return profiles
+
+
+class RequestProfiler:
+    """cProfile + captura del SQL del request (vía el RequestTimings de tasks.metrics)."""
+
+    def __init__(self, timings):
+        self.profiler = cProfile.Profile()
+        self.timings = timings
+        if timings is not None:
+            timings.captured_sql = []
+
+    def __enter__(self):
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+
+    def save(self, meta):
+        captured = self.timings.captured_sql if self.timings is not None else None
+        meta = dict(meta, created_at=timezone.now().isoformat())
+        if self.timings is not None:
+            meta['queries'] = self.timings.queries
+        return save_profile(self.profiler, meta, captured)
@@ -0,0 +1,97 @@
+"""
+Lecturas desde una réplica de la base de datos.
+
+ReplicaRoutingMiddleware (tasks/middleware.py) marca los requests GET/HEAD/
+OPTIONS a las vistas de tasks y ReplicaRouter manda sus SELECT a
+READ_REPLICA_ALIAS. Todo lo demás (escrituras, otros métodos, el admin, los
+comandos de manage.py) sigue en 'default'.
+
+La réplica va atrasada unos instantes, así que:
+
+- Si un request escribe (o pide select_for_update), el resto de sus lecturas
+  van al primario, y la respuesta deja la cookie READ_REPLICA_PIN_COOKIE:
+  durante READ_REPLICA_PIN_SECONDS ese cliente lee del primario y ve lo que
+  acaba de escribir.
+- Si el listado cambió hace menos de READ_REPLICA_LAG_SECONDS la página se arma
+  desde el primario (avoid_replica_lag): si no, quedaría cacheada sin el cambio.
+
+Sin DATABASE_REPLICA_URL (READ_REPLICA_ALIAS = None) no se enruta nada. Para
+probar en local alcanza con dos SQLite:
+DATABASE_REPLICA_URL=sqlite:///db-replica.sqlite3 (copiando db.sqlite3: las
+migraciones solo corren sobre 'default').
+"""
+import contextvars
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Vistas cuyas lecturas pueden ir a la réplica (por el módulo de la vista)
+REPLICA_VIEW_MODULES = ('tasks.views', 'tasks.async_views')
+
+_current = contextvars.ContextVar('tasks_db_routing', default=None)
+
+
+class RoutingState:
+    """Estado de un request. Se modifica en el lugar: así llega a los hilos de sync_to_async."""
+
+    def __init__(self):
+        self.alias = None  # réplica para las lecturas, o None
+        self.wrote = False
+
+
+def get_replica_alias():
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+    return alias if alias and alias in connections else None
+
+
+def start_request():
+    """Empieza a enrutar; devuelve (estado, token para end_request)."""
+    state = RoutingState()
+    return state, _current.set(state)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def use_primary():
+    """El resto del request lee del primario."""
+    state = _current.get()
+    if state is not None:
+        state.alias = None
+
+
+def avoid_replica_lag(last_modified):
+    """Lee del primario si el último cambio (timestamp) es más nuevo que el atraso tolerado."""
+    lag = getattr(settings, 'READ_REPLICA_LAG_SECONDS', 5)
+    if last_modified is not None and time.time() - last_modified < lag:
+        use_primary()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None:
+            return None
+        if state.alias is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        # Explícito: un objeto leído de la réplica se guarda igual en el primario
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Son los mismos datos: un archivo nuevo puede apuntar al usuario leído de la réplica
+        aliases = {DEFAULT_DB_ALIAS, get_replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación, nunca por migrate
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,133 @@
+"""
+Búsqueda y filtros del listado de archivos.
+
+Los filtros (curso, profesor, rango de fechas, tipo) se aplican sobre el mismo
+queryset del listado y siguen paginando por cursor. La búsqueda por título
+(?q=) ordena por relevancia y usa el índice de texto de cada motor:
+
+- SQLite: tabla virtual FTS5 (tasks_professorfile_fts) con contenido externo,
+  mantenida por triggers. Ranking bm25, coincidencia por prefijo y sin acentos.
+- PostgreSQL: índice GIN con gin_trgm_ops sobre UPPER(title), que es lo que
+  usa icontains; el ranking es TrigramWordSimilarity.
+- Otros motores: ILIKE sin índice, del más nuevo al más viejo.
+
+Los triggers de SQLite se pierden si una migración futura reconstruye la tabla
+tasks_professorfile; manage.py rebuild_search_index los vuelve a crear.
+"""
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+FTS_TABLE = 'tasks_professorfile_fts'
+FILE_TABLE = 'tasks_professorfile'
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, content='{FILE_TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {FILE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {FILE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title ON {FILE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # Django traduce icontains a UPPER(title) LIKE UPPER(%s): el índice va sobre esa expresión
+    f"CREATE INDEX IF NOT EXISTS professorfile_title_trgm_idx ON {FILE_TABLE} USING gin (UPPER(title) gin_trgm_ops)",
+]
+POSTGRES_DROP_SQL = ["DROP INDEX IF EXISTS professorfile_title_trgm_idx"]
+
+
+def install_search_index(connection):
+    """Crea (o completa) el índice de texto del motor. Es idempotente."""
+    statements = {'sqlite': SQLITE_FTS_SQL, 'postgresql': POSTGRES_INDEX_SQL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def drop_search_index(connection):
+    statements = {'sqlite': SQLITE_DROP_SQL, 'postgresql': POSTGRES_DROP_SQL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def apply_filters(queryset, filters):
+    """Filtros validados por FileSearchSerializer (sin 'q')."""
+    if filters.get('course'):
+        queryset = queryset.filter(course_id=filters['course'])
+    if filters.get('professor'):
+        queryset = queryset.filter(uploaded_by_id=filters['professor'])
+    if filters.get('uploaded_after'):
+        queryset = queryset.filter(uploaded_at__gte=filters['uploaded_after'])
+    if filters.get('uploaded_before'):
+        queryset = queryset.filter(uploaded_at__lt=filters['uploaded_before'])
+    file_type = filters.get('type')
+    if file_type:
+        if file_type.endswith('/'):
+            queryset = queryset.filter(content_type__startswith=file_type)  # 'image/'
+        elif '/' in file_type:
+            queryset = queryset.filter(content_type=file_type)  # 'application/pdf'
+        else:
+            queryset = queryset.filter(resource_type=file_type)  # 'raw', 'image', 'video'
+    return queryset
+
+
+def fts5_query(text):
+    """Texto libre a consulta FTS5: cada palabra como prefijo, todas obligatorias."""
+    words = re.findall(r'\w+', text)
+    return ' AND '.join(f'"{word}"*' for word in words)
+
+
+def search_files(queryset, text, offset, limit):
+    """Una página de resultados ordenados por relevancia (los mejores primero)."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(queryset, text, offset, limit)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        ranked = queryset.filter(title__icontains=text).annotate(rank=TrigramWordSimilarity(text, 'title'))
+        return list(ranked.order_by('-rank', '-id')[offset:offset + limit])
+    return list(queryset.filter(title__icontains=text).order_by('-uploaded_at', '-id')[offset:offset + limit])
+
+
+def _sqlite_search(queryset, text, offset, limit):
+    match = fts5_query(text)
+    if not match:
+        return []
+    # Los filtros del queryset van en el WHERE del JOIN: la consulta FTS5
+    # recorre solo los títulos que coinciden, nunca la tabla entera
+    compiler = queryset.query.get_compiler(queryset.db)
+    try:
+        where, params = compiler.compile(queryset.query.where)
+    except EmptyResultSet:
+        return []
+    sql = (
+        f'SELECT "{FILE_TABLE}"."id" FROM {FTS_TABLE} '
+        f'JOIN "{FILE_TABLE}" ON "{FILE_TABLE}"."id" = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND ({where or "1"}) '
+        f'ORDER BY {FTS_TABLE}.rank, "{FILE_TABLE}"."id" DESC LIMIT %s OFFSET %s'
+    )
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, [match, *params, limit, offset])
+        ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return []
+    rows = queryset.in_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
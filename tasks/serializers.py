@@ -1,14 +1,61 @@
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import CustomUser, ProfessorFile
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import TokenError
+from .models import Course, CustomUser, ProfessorFile
 from django.contrib.auth.forms import PasswordResetForm
 from cloudinary.utils import cloudinary_url
+from django.conf import settings
+from django.core import signing
+from .models import UploadSession
+from .authentication import CachedJWTAuthentication
+from .permissions import can_access_course
+from .tokens import CachedBlacklistRefreshToken, bookkeeping, claim_refresh_token
+from .storage import StorageError, asset_file_fields, get_file_storage, load_upload_ticket, store_upload
+
+
+def validate_course_choice(user, course_id):
+    """
+    Curso elegido al subir un archivo: hay que estar inscripto. Sale de los
+    cursos cacheados del usuario; solo el staff (que puede subir a cualquier
+    curso) paga una consulta para confirmar que existe.
+    """
+    if course_id is None:
+        return None
+    if not can_access_course(user, course_id):
+        raise serializers.ValidationError("No estás inscripto en este curso.")
+    if user.is_staff and not Course.objects.filter(pk=course_id).exists():
+        raise serializers.ValidationError("El curso no existe.")
+    return course_id
+
+
+# --- FILTROS DEL LISTADO ---
+class FileSearchSerializer(serializers.Serializer):
+    """Parámetros de búsqueda de GET /tasks/api/files/ (ver tasks/search.py)."""
+    DATE_FORMATS = ['iso-8601', '%Y-%m-%d']
+
+    q = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    professor = serializers.IntegerField(required=False, min_value=1)
+    uploaded_after = serializers.DateTimeField(required=False, input_formats=DATE_FORMATS)
+    uploaded_before = serializers.DateTimeField(required=False, input_formats=DATE_FORMATS)  # exclusivo
+    # 'raw' / 'image' / 'video', un content type ('application/pdf') o un prefijo ('image/')
+    type = serializers.CharField(required=False, max_length=100)
+    course = serializers.IntegerField(required=False, min_value=1)  # la membresía la revisa IsCourseMember
+
+    def validate(self, attrs):
+        after, before = attrs.get('uploaded_after'), attrs.get('uploaded_before')
+        if after and before and after >= before:
+            raise serializers.ValidationError({'uploaded_before': ["Debe ser posterior a uploaded_after."]})
+        attrs['q'] = attrs.get('q', '').strip()
+        return attrs
+
+
 # --- LOGIN SERIALIZER PERSONALIZADO ---
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = 'email'
 
     def validate(self, attrs):
-        # 1. Genera los tokens (access y refresh) usando la lógica original
+        # 1. Genera los tokens (access y refresh) usando la lógica original.
         data = super().validate(attrs)
 
         # 2. Agregamos los datos del usuario a la respuesta
@@ -23,6 +70,37 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
         return data
 
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh con rotación: el token rotado va a la lista negra en el momento y
+    los registros de los tokens nuevos se escriben por lotes (ver tasks/tokens.py).
+    """
+    token_class = CachedBlacklistRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        # Mismo chequeo de usuario activo que simplejwt, pero con el usuario cacheado
+        if refresh.payload.get(api_settings.USER_ID_CLAIM):
+            CachedJWTAuthentication().get_user(refresh)
+
+        # Al rotar, el token usado va a la lista negra con la misma consulta que lo revisa
+        rotate = api_settings.ROTATE_REFRESH_TOKENS
+        if not claim_refresh_token(refresh, blacklist=rotate and api_settings.BLACKLIST_AFTER_ROTATION):
+            raise TokenError("Token is blacklisted")
+
+        data = {'access': str(refresh.access_token)}
+
+        if rotate:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            bookkeeping.record(refresh)
+
+            data['refresh'] = str(refresh)
+
+        return data
+
 # --- OTROS SERIALIZADORES ---
 
 import os
@@ -34,7 +112,12 @@ from .models import ProfessorFile
 
 class ProfessorFileSerializer(serializers.ModelSerializer):
     uploaded_by_email = serializers.ReadOnlyField(source='uploaded_by.email')
-    download_url = serializers.SerializerMethodField()
+    # Columna desnormalizada: se calcula al subir el archivo (ver ProfessorFile.save)
+    download_url = serializers.ReadOnlyField()
+    # El archivo solo se recibe al subir; create() lo manda al almacenamiento por partes
+    file = serializers.FileField(write_only=True)
+    # Sin curso el archivo es material general
+    course = serializers.IntegerField(source='course_id', required=False, allow_null=True)
 
     class Meta:
         model = ProfessorFile
@@ -44,30 +127,94 @@ class ProfessorFileSerializer(serializers.ModelSerializer):
             'uploaded_at', 
             'uploaded_by', 
             'uploaded_by_email', 
-            'download_url'
+            'download_url',
+            'size',
+            'content_type',
+            'resource_type',
+            'course',
+            'file'
         ]
-        read_only_fields = ['uploaded_by', 'uploaded_at']
-
-    def get_download_url(self, obj):
-        if not obj.file:
-            return None
-        
-        # Obtenemos la URL que Django/Cloudinary nos da por defecto
-        url = obj.file.url
-        
-        # 1. Forzar HTTPS
-        if url.startswith("http://"):
-            url = url.replace("http://", "https://", 1)
-
-        # 2. Inyectar el flag de descarga (fl_attachment)
-        # Solo lo hacemos si es una URL de Cloudinary y no lo tiene ya
-        if ".cloudinary.com" in url and "/upload/" in url:
-            if "fl_attachment" not in url:
-                # Insertamos fl_attachment justo después de /upload/
-                # Esto funciona para 'image', 'video' y 'raw' por igual
-                url = url.replace("/upload/", "/upload/fl_attachment/", 1)
-
-        return url
+        read_only_fields = ['uploaded_by', 'uploaded_at', 'size', 'content_type', 'resource_type']
+
+    def validate_course(self, value):
+        return validate_course_choice(self.context['request'].user, value)
+
+    def create(self, validated_data):
+        upload = validated_data.pop('file')
+        try:
+            validated_data.update(store_upload(upload))
+        except StorageError as exc:
+            raise serializers.ValidationError({"file": str(exc)})
+        finally:
+            upload.close()
+        return super().create(validated_data)
+
+class UploadCompleteSerializer(serializers.Serializer):
+    """
+    Segundo paso de la subida directa: el cliente ya subió el archivo al
+    almacenamiento con el ticket y nos manda lo que respondió el proveedor.
+    """
+    ticket = serializers.CharField()
+    title = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    public_id = serializers.CharField(max_length=255)
+    version = serializers.IntegerField()
+    signature = serializers.CharField()
+    resource_type = serializers.ChoiceField(choices=['image', 'video', 'raw'], default='raw')
+    course = serializers.IntegerField(required=False, allow_null=True, default=None)
+
+    def validate_course(self, value):
+        return validate_course_choice(self.context['request'].user, value)
+
+    def validate(self, attrs):
+        try:
+            ticket = load_upload_ticket(attrs['ticket'])
+        except signing.SignatureExpired:
+            raise serializers.ValidationError({"ticket": "El ticket de subida expiró."})
+        except signing.BadSignature:
+            raise serializers.ValidationError({"ticket": "Ticket de subida inválido."})
+
+        if ticket['user'] != self.context['request'].user.id:
+            raise serializers.ValidationError({"ticket": "El ticket pertenece a otro usuario."})
+        # Cloudinary puede agregar la extensión al public_id de archivos 'raw'
+        public_id = attrs['public_id']
+        if public_id != ticket['public_id'] and not public_id.startswith(ticket['public_id'] + '.'):
+            raise serializers.ValidationError({"public_id": "No coincide con el ticket."})
+
+        try:
+            attrs['asset'] = get_file_storage().verify_upload(
+                public_id, attrs['version'], attrs['signature'], attrs['resource_type']
+            )
+        except StorageError as exc:
+            raise serializers.ValidationError({"signature": str(exc)})
+        return attrs
+
+    def create(self, validated_data):
+        return ProfessorFile.objects.create(
+            uploaded_by=self.context['request'].user,
+            title=validated_data['title'],
+            course_id=validated_data['course'],
+            **asset_file_fields(validated_data['asset'])
+        )
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    # Se elige al crear la sesión, con la misma regla que la subida directa
+    course = serializers.IntegerField(source='course_id', required=False, allow_null=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'title', 'filename', 'length', 'offset', 'course', 'created_at', 'expires_at']
+        read_only_fields = ['id', 'offset', 'created_at', 'expires_at']
+
+    def validate_course(self, value):
+        return validate_course_choice(self.context['request'].user, value)
+
+    def validate_length(self, value):
+        max_size = settings.RESUMABLE_UPLOAD_MAX_SIZE
+        if value <= 0:
+            raise serializers.ValidationError("El tamaño debe ser mayor a cero.")
+        if value > max_size:
+            raise serializers.ValidationError(f"El archivo supera el máximo de {max_size} bytes.")
+        return value
 
 class PasswordResetRequestSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -75,8 +222,14 @@ class PasswordResetRequestSerializer(serializers.Serializer):
     class Meta:
         fields = ['email']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = None
+
     def validate_email(self, value):
-        if not CustomUser.objects.filter(email=value).exists():
+        # Guardamos el usuario para que la vista no lo vuelva a consultar
+        self.user = CustomUser.objects.filter(email=value).first()
+        if self.user is None:
             raise serializers.ValidationError("No existe un usuario con este correo electrónico.")
         return value
 
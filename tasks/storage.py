@@ -0,0 +1,433 @@
+"""
+Backends de almacenamiento para los archivos de los profesores.
+
+La app habla con el almacenamiento solo a través de estas clases, así que se
+puede cambiar Cloudinary por un sustituto local (tests, desarrollo, benchmarks)
+con el setting FILE_STORAGE_BACKEND.
+
+Los "assets" que devuelven los backends son diccionarios con la misma forma que
+la respuesta de Cloudinary: public_id, version, resource_type, format, bytes y
+secure_url.
+"""
+import hashlib
+import hmac
+import mimetypes
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .metrics import tracked
+from .models import ProfessorFile, build_download_url
+from .uploads import file_digest, get_storage_chunk_size, guess_content_type, iter_chunks
+
+UPLOAD_FOLDER = 'professor_uploads'
+DELETE_BATCH_SIZE = 100
+UPLOAD_TICKET_SALT = 'tasks.storage.upload-ticket'
+
+_backends = {}
+
+
+class StorageError(Exception):
+    """El backend rechazó la operación o el resultado no es confiable."""
+
+
+def get_file_storage():
+    path = getattr(settings, 'FILE_STORAGE_BACKEND', 'tasks.storage.CloudinaryFileStorage')
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def new_public_id():
+    return f"{UPLOAD_FOLDER}/{uuid.uuid4().hex}"
+
+
+def sign_upload_ticket(user_id, public_id):
+    """Ticket de subida de corta duración, atado al profesor y al public_id."""
+    return signing.dumps({'user': user_id, 'public_id': public_id}, salt=UPLOAD_TICKET_SALT)
+
+
+def load_upload_ticket(ticket):
+    """Devuelve el contenido del ticket o lanza signing.BadSignature (o SignatureExpired)."""
+    max_age = getattr(settings, 'UPLOAD_TICKET_MAX_AGE', 600)
+    return signing.loads(ticket, salt=UPLOAD_TICKET_SALT, max_age=max_age)
+
+
+def asset_field_value(asset):
+    """Texto que guarda CloudinaryField para el asset (resource_type/upload/vN/public_id.format)."""
+    value = f"{asset['resource_type']}/upload/v{asset['version']}/{asset['public_id']}"
+    if asset.get('format'):
+        value += f".{asset['format']}"
+    return value
+
+
+def asset_file_fields(asset, content_type='', content_hash=''):
+    """Campos de ProfessorFile que salen de un asset recién subido."""
+    if not content_type and asset.get('format'):
+        content_type = mimetypes.guess_type(f"x.{asset['format']}")[0] or ''
+    return {
+        'file': asset_field_value(asset),
+        'download_url': build_download_url(asset['secure_url']),
+        'content_hash': content_hash,
+        'size': asset.get('bytes'),
+        'content_type': content_type,
+        'resource_type': asset['resource_type'],
+    }
+
+
+def stored_files_queryset(digests):
+    return (
+        ProfessorFile.objects
+        .filter(content_hash__in=set(digests))
+        .exclude(file='')
+        .only('file', 'download_url', 'content_hash', 'size', 'content_type', 'resource_type')
+    )
+
+
+def stored_file_fields(obj):
+    return {
+        'file': obj.file,
+        'download_url': obj.download_url,
+        'content_hash': obj.content_hash,
+        'size': obj.size,
+        'content_type': obj.content_type,
+        'resource_type': obj.resource_type,
+    }
+
+
+def find_stored_files(digests):
+    """
+    {sha256: campos de ProfessorFile} para los hashes que ya tienen un asset
+    guardado. Una sola consulta sin importar cuántos hashes sean.
+    """
+    return {obj.content_hash: stored_file_fields(obj) for obj in stored_files_queryset(digests)}
+
+
+async def afind_stored_files(digests):
+    return {obj.content_hash: stored_file_fields(obj) async for obj in stored_files_queryset(digests)}
+
+
+def upload_new_file(fileobj, digest):
+    """Sube el archivo al backend configurado (sin tocar la base de datos)."""
+    content_type = guess_content_type(fileobj)
+    asset = get_file_storage().upload(fileobj, new_public_id())
+    return asset_file_fields(asset, content_type=content_type, content_hash=digest)
+
+
+def store_upload(fileobj):
+    """
+    Sube el archivo al backend configurado y devuelve los campos para
+    ProfessorFile. Si ya existe un archivo con el mismo SHA-256 reutilizamos su
+    asset y no se manda ni un byte al almacenamiento.
+    """
+    digest = file_digest(fileobj)
+    existing = find_stored_files([digest])
+    if digest in existing:
+        return existing[digest]
+    return upload_new_file(fileobj, digest)
+
+
+STORAGE_OPERATIONS = ('upload_ticket', 'verify_upload', 'upload', 'delete_many', 'accept_upload')
+
+
+class BaseFileStorage:
+    def __init_subclass__(cls, **kwargs):
+        # Todo backend queda medido en Server-Timing/metrics sin tener que acordarse
+        super().__init_subclass__(**kwargs)
+        for name in STORAGE_OPERATIONS:
+            if name in cls.__dict__:
+                setattr(cls, name, tracked('storage')(cls.__dict__[name]))
+
+    def upload_ticket(self, public_id):
+        """
+        Parámetros firmados para que el cliente suba el archivo directo al
+        almacenamiento: {'upload_url': ..., 'fields': {...}}.
+        """
+        raise NotImplementedError
+
+    def verify_upload(self, public_id, version, signature, resource_type):
+        """
+        Comprueba que el asset realmente se subió con ese public_id y devuelve
+        sus metadatos. Lanza StorageError si algo no cuadra.
+        """
+        raise NotImplementedError
+
+    def upload(self, fileobj, public_id, chunk_size=None):
+        """
+        Sube el archivo desde el servidor en bloques de chunk_size bytes
+        (STORAGE_UPLOAD_CHUNK_SIZE por defecto) y devuelve el asset.
+        """
+        raise NotImplementedError
+
+    def delete_many(self, public_ids, resource_type):
+        """
+        Borra varios assets del mismo resource_type en una sola llamada
+        (Cloudinary acepta hasta DELETE_BATCH_SIZE por request).
+        """
+        raise NotImplementedError
+
+
+class CloudinaryFileStorage(BaseFileStorage):
+    def upload_ticket(self, public_id):
+        import cloudinary
+        from cloudinary.utils import cloudinary_api_url, sign_request
+
+        fields = sign_request({'timestamp': int(time.time()), 'public_id': public_id}, {})
+        return {
+            'upload_url': cloudinary_api_url('upload', resource_type='auto'),
+            'fields': fields,
+            'cloud_name': cloudinary.config().cloud_name,
+        }
+
+    def verify_upload(self, public_id, version, signature, resource_type):
+        import cloudinary.api
+        from cloudinary.exceptions import Error as CloudinaryError
+        from cloudinary.utils import verify_api_response_signature
+
+        if not verify_api_response_signature(public_id, version, signature):
+            raise StorageError("La firma de la subida no es válida.")
+        try:
+            # Los metadatos los pedimos a Cloudinary: no confiamos en lo que mande el cliente
+            resource = cloudinary.api.resource(public_id, resource_type=resource_type)
+        except CloudinaryError as exc:
+            raise StorageError(str(exc))
+        return {
+            'public_id': resource['public_id'],
+            'version': resource['version'],
+            'resource_type': resource['resource_type'],
+            'format': resource.get('format', ''),
+            'bytes': resource.get('bytes'),
+            'secure_url': resource['secure_url'],
+        }
+
+
+    def upload(self, fileobj, public_id, chunk_size=None):
+        from cloudinary import uploader
+        from cloudinary.exceptions import Error as CloudinaryError
+
+        fileobj.seek(0)
+        try:
+            # upload_large manda el archivo por partes (Content-Range), nunca entero
+            result = uploader.upload_large(
+                fileobj,
+                public_id=public_id,
+                resource_type='auto',
+                chunk_size=chunk_size or get_storage_chunk_size(),
+                filename=getattr(fileobj, 'name', None) or 'stream',
+            )
+        except CloudinaryError as exc:
+            raise StorageError(str(exc))
+        return {
+            'public_id': result['public_id'],
+            'version': result['version'],
+            'resource_type': result['resource_type'],
+            'format': result.get('format', ''),
+            'bytes': result.get('bytes'),
+            'secure_url': result['secure_url'],
+        }
+
+
+    def delete_many(self, public_ids, resource_type):
+        import cloudinary.api
+        from cloudinary.exceptions import Error as CloudinaryError
+
+        try:
+            cloudinary.api.delete_resources(list(public_ids), resource_type=resource_type, type='upload')
+        except CloudinaryError as exc:
+            raise StorageError(str(exc))
+
+
+class LocalFileStorage(BaseFileStorage):
+    """
+    Sustituto local de Cloudinary: guarda los archivos en disco y firma con
+    SECRET_KEY. Sirve para tests y desarrollo sin red.
+    """
+
+    @property
+    def root(self):
+        return str(getattr(settings, 'LOCAL_STORAGE_ROOT', settings.BASE_DIR / 'media'))
+
+    @property
+    def base_url(self):
+        return getattr(settings, 'LOCAL_STORAGE_URL', 'http://localhost:8000/media/')
+
+    def _sign(self, *parts):
+        message = '&'.join(str(part) for part in parts).encode()
+        return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+    def _path(self, public_id):
+        path = os.path.normpath(os.path.join(self.root, public_id))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise StorageError("public_id inválido.")
+        return path
+
+    def _asset(self, public_id, version):
+        path = self._path(public_id)
+        if not os.path.exists(path):
+            raise StorageError("El archivo no existe en el almacenamiento.")
+        return {
+            'public_id': public_id,
+            'version': version,
+            'resource_type': 'raw',
+            'format': '',
+            'bytes': os.path.getsize(path),
+            'secure_url': f"{self.base_url}raw/upload/v{version}/{public_id}",
+        }
+
+    def upload_ticket(self, public_id):
+        timestamp = int(time.time())
+        return {
+            'upload_url': reverse('files_local_upload'),
+            'fields': {
+                'timestamp': timestamp,
+                'public_id': public_id,
+                'signature': self._sign(public_id, timestamp),
+            },
+        }
+
+    def accept_upload(self, fields, fileobj):
+        """Lo que haría el proveedor al recibir el POST directo del cliente."""
+        public_id = fields.get('public_id', '')
+        if not hmac.compare_digest(self._sign(public_id, fields.get('timestamp')), str(fields.get('signature', ''))):
+            raise StorageError("Firma de subida inválida.")
+        if time.time() - int(fields.get('timestamp')) > getattr(settings, 'UPLOAD_TICKET_MAX_AGE', 600):
+            raise StorageError("El ticket de subida expiró.")
+
+        response = self.upload(fileobj, public_id)
+        response['signature'] = self._sign(response['public_id'], response['version'])
+        return response
+
+    def upload(self, fileobj, public_id, chunk_size=None):
+        path = self._path(public_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as destination:
+            for chunk in iter_chunks(fileobj, chunk_size):
+                destination.write(chunk)
+        return self._asset(public_id, int(time.time()))
+
+    def verify_upload(self, public_id, version, signature, resource_type):
+        if not hmac.compare_digest(self._sign(public_id, version), str(signature)):
+            raise StorageError("La firma de la subida no es válida.")
+        return self._asset(public_id, version)
+
+    def delete_many(self, public_ids, resource_type):
+        for public_id in public_ids:
+            try:
+                os.remove(self._path(public_id))
+            except FileNotFoundError:
+                pass
+
+
+class SimulatedCloudinaryStorage(LocalFileStorage):
+    """
+    LocalFileStorage que se comporta como Cloudinary visto desde el servidor:
+    URLs con la misma forma (<cloud>/<resource_type>/upload/v<N>/<public_id>,
+    donde build_download_url mete fl_attachment), la demora de una API remota
+    y fallos inyectados. Sirve para perfilar y hacer benchmarks sin red.
+
+    Todo se configura con SIMULATED_STORAGE (ver settings.py). Las llamadas y
+    los fallos por operación quedan en stats().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = Counter()
+        self._failures = Counter()
+        self._forced_failures = Counter()
+        self._random = random.Random(self.config.get('SEED'))
+
+    @property
+    def config(self):
+        return getattr(settings, 'SIMULATED_STORAGE', {})
+
+    @property
+    def base_url(self):
+        # Mismo host que Cloudinary para que build_download_url lo trate igual;
+        # los archivos en sí quedan en LOCAL_STORAGE_ROOT
+        base_url = self.config.get('BASE_URL', 'https://res.cloudinary.com/')
+        return f"{base_url}{self.config.get('CLOUD_NAME', 'local')}/"
+
+    # --- Contadores y fallos ---
+
+    def stats(self):
+        with self._lock:
+            return {'calls': dict(self._calls), 'failures': dict(self._failures)}
+
+    def reset_stats(self):
+        with self._lock:
+            self._calls.clear()
+            self._failures.clear()
+
+    def fail_next(self, operation, times=1):
+        """Hace fallar las próximas `times` llamadas a `operation` (para tests)."""
+        with self._lock:
+            self._forced_failures[operation] += times
+
+    def _call(self, operation, size=0):
+        """Cuenta la llamada, espera lo que tardaría la red y falla si toca."""
+        config = self.config
+        with self._lock:
+            self._calls[operation] += 1
+            jitter = config.get('JITTER', 0)
+            delay = config.get('LATENCY', {}).get(operation, 0) * (1 + self._random.uniform(-jitter, jitter))
+            if self._forced_failures[operation]:
+                self._forced_failures[operation] -= 1
+                failed = True
+            else:
+                failed = self._random.random() < config.get('FAILURE_RATE', 0)
+            if failed:
+                self._failures[operation] += 1
+
+        bandwidth = config.get('BANDWIDTH')
+        if bandwidth and size:
+            delay += size / bandwidth
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise StorageError(f"Fallo simulado del almacenamiento ({operation}).")
+
+    # --- Operaciones ---
+
+    def _asset(self, public_id, version, resource_type='raw', format=''):
+        asset = super()._asset(public_id, version)
+        asset['resource_type'] = resource_type
+        asset['format'] = format
+        suffix = f".{format}" if format else ''
+        asset['secure_url'] = f"{self.base_url}{resource_type}/upload/v{version}/{public_id}{suffix}"
+        return asset
+
+    def upload(self, fileobj, public_id, chunk_size=None):
+        self._call('upload', getattr(fileobj, 'size', 0) or 0)
+
+        # Como Cloudinary: imágenes y videos guardan el formato aparte, los
+        # 'raw' conservan la extensión dentro del public_id
+        content_type = guess_content_type(fileobj)
+        extension = os.path.splitext(getattr(fileobj, 'name', '') or '')[1].lstrip('.').lower()
+        resource_type = content_type.split('/')[0] if content_type.startswith(('image/', 'video/')) else 'raw'
+        if resource_type == 'raw' and extension:
+            public_id, extension = f"{public_id}.{extension}", ''
+
+        path = self._path(public_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as destination:
+            for chunk in iter_chunks(fileobj, chunk_size):
+                destination.write(chunk)
+        return self._asset(public_id, int(time.time()), resource_type, extension)
+
+    def verify_upload(self, public_id, version, signature, resource_type):
+        self._call('verify_upload')
+        if not hmac.compare_digest(self._sign(public_id, version), str(signature)):
+            raise StorageError("La firma de la subida no es válida.")
+        return self._asset(public_id, version, resource_type)
+
+    def delete_many(self, public_ids, resource_type):
+        self._call('delete_many')
+        super().delete_many(public_ids, resource_type)
@@ -0,0 +1,142 @@
+"""
+Sincronización incremental del listado de archivos.
+
+Cada alta, edición o borrado de ProfessorFile deja una fila en FileChange. El
+cliente guarda el sync_token de la última respuesta y en la siguiente pide
+solo lo que cambió después: archivos nuevos o editados y lápidas con los IDs
+borrados. El costo depende de la cantidad de cambios, no del tamaño de la
+biblioteca (la consulta recorre la PK de FileChange desde el token).
+
+El token está firmado y expira a los FILES_SYNC_RETENTION_DAYS días, que es lo
+que conserva el registro (manage.py prune_file_changes). Con un token vencido
+el cliente tiene que volver a bajar el listado completo.
+
+Cada cambio guarda el curso del archivo: un alumno solo recibe los de sus
+cursos y los generales. Cuando un archivo cambia de curso se registra además
+un borrado en el curso anterior. El token lleva además un hash de los cursos
+del usuario: si se inscribe o se da de baja, los cambios viejos de ese curso
+no están en el registro que le queda por leer, así que el token deja de
+valer (SyncScopeChanged) y vuelve a bajar el listado completo.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import FileChange, ProfessorFile
+from .permissions import get_course_ids, visible_files_filter
+
+SYNC_TOKEN_SALT = 'tasks.sync.token'
+
+
+def get_retention():
+    return timedelta(days=getattr(settings, 'FILES_SYNC_RETENTION_DAYS', 30))
+
+
+class SyncScopeChanged(Exception):
+    """Los cursos del usuario cambiaron desde que se emitió el token."""
+
+
+def course_scope_hash(user):
+    """Resumen de lo que el usuario puede ver: el staff ve todo, el resto sus cursos."""
+    if user is None or user.is_staff:
+        return '*'
+    course_ids = ','.join(str(course_id) for course_id in sorted(get_course_ids(user)))
+    return hashlib.sha256(course_ids.encode()).hexdigest()[:16]
+
+
+def encode_sync_token(change_id, user=None):
+    return signing.dumps([change_id, course_scope_hash(user)], salt=SYNC_TOKEN_SALT)
+
+
+def decode_sync_token(token, user=None):
+    """
+    Devuelve el último id de cambio visto o lanza signing.BadSignature (o
+    SignatureExpired). Si los cursos de 'user' ya no son los del token lanza
+    SyncScopeChanged.
+    """
+    payload = signing.loads(token, salt=SYNC_TOKEN_SALT, max_age=get_retention())
+    if not isinstance(payload, list) or len(payload) != 2 or not isinstance(payload[0], int):
+        raise signing.BadSignature("Token de sincronización inválido.")
+    change_id, scope = payload
+    if scope != course_scope_hash(user):
+        raise SyncScopeChanged()
+    return change_id
+
+
+def head_change_id():
+    """Id del último cambio: el punto de partida de un cliente que recién bajó el listado."""
+    return FileChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def visible_changes_filter(user):
+    """Q sobre FileChange con lo que el usuario puede ver (None = todo)."""
+    if user is None or user.is_staff:
+        return None
+    return Q(course_id__isnull=True) | Q(course_id__in=get_course_ids(user))
+
+
+def get_changes(since, limit, user=None):
+    """
+    Cambios posteriores a 'since', como (archivos, ids_borrados, último_id, hay_más).
+
+    Las secuencias se reparten al insertar pero se hacen visibles al confirmar,
+    así que un cambio reciente puede quedar detrás de otro todavía en vuelo. Por
+    eso el token no avanza más allá de los cambios de los últimos
+    FILES_SYNC_SETTLE_SECONDS: se vuelven a mandar en la próxima llamada (aplicar
+    un cambio dos veces no tiene efecto) en lugar de arriesgar perder uno.
+
+    Con 'user', solo los cambios de los archivos generales y de sus cursos.
+    """
+    changes = FileChange.objects.filter(id__gt=since)
+    visible = visible_changes_filter(user)
+    if visible is not None:
+        changes = changes.filter(visible)
+    rows = list(changes.order_by('id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    settled_before = timezone.now() - timedelta(seconds=getattr(settings, 'FILES_SYNC_SETTLE_SECONDS', 5))
+    last_id = since
+    for change in rows:
+        if change.changed_at > settled_before:
+            # Lo que queda se repite en la próxima llamada: no hay que pedirla ya
+            has_more = False
+            break
+        last_id = change.id
+
+    # Solo cuenta la última acción de cada archivo
+    latest = {}
+    for change in rows:
+        latest[change.file_id] = change.action
+    upserted = [file_id for file_id, action in latest.items() if action == FileChange.UPSERT]
+    deleted = {file_id for file_id, action in latest.items() if action == FileChange.DELETE}
+
+    files = []
+    if upserted:
+        files = ProfessorFile.objects.select_related('uploaded_by').filter(id__in=upserted)
+        visible = visible_files_filter(user) if user is not None else None
+        if visible is not None:
+            # Se movió a un curso ajeno después de este lote: para él es un borrado
+            files = files.filter(visible)
+        files = list(files.order_by('-uploaded_at', '-id'))
+        # Si se borró después de este lote, ya sabemos que no existe
+        deleted.update(set(upserted) - {file_obj.id for file_obj in files})
+    return files, sorted(deleted), last_id, has_more
+
+
+def prune_changes(batch_size=1000):
+    """
+    Borra los cambios más viejos que la retención (más un margen de una hora
+    para los tokens emitidos justo en el límite). Devuelve cuántos borró.
+    """
+    cutoff = timezone.now() - get_retention() - timedelta(hours=1)
+    total = 0
+    while True:
+        ids = list(FileChange.objects.filter(changed_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += FileChange.objects.filter(id__in=ids).delete()[0]
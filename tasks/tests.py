@@ -1,3 +1,1991 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from contextlib import asynccontextmanager
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import cloudinary
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends.locmem import EmailBackend as LocMemEmailBackend
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import http_date, urlsafe_base64_encode
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import cache as files_cache
+from .models import (
+    Course, CustomUser, Enrollment, FileChange, OutboundEmail, ProfessorFile, UploadSession, build_download_url,
+)
+from .benchmark import SCENARIOS, percentile, run_benchmark
+from .checks import check_shared_caches
+from .events import get_event_broker, replay_events
+from .hashing import HashQueueFull
+from .metrics import registry as metrics_registry
+from .outbox import enqueue_email
+from .permissions import can_access_course, get_course_ids
+from .profiling import list_profile_ids
+from .replicas import ReplicaRouter, end_request as end_routing, start_request as start_routing
+from .search import FTS_TABLE
+from .throttling import TokenBucketThrottle
+from .tokens import bookkeeping
+from .storage import LocalFileStorage, StorageError, get_file_storage, store_upload
+from .uploads import StreamingUploadHandler, iter_chunks
+
+# Los tests no tocan Cloudinary, pero el SDK necesita un cloud_name para armar URLs
+if not cloudinary.config().cloud_name:
+    cloudinary.config(cloud_name='ittac-test')
+
+
+def make_user(email, role='STUDENT', **extra):
+    return CustomUser.objects.create_user(
+        username=email.split('@')[0],
+        email=email,
+        password='Clave-Segura-123',
+        role=role,
+        **extra
+    )
+
+
+def make_file(user, title, **extra):
+    return ProfessorFile.objects.create(
+        uploaded_by=user,
+        title=title,
+        file=f'raw/upload/v1/professor_uploads/{title}.pdf',
+        **extra
+    )
+
+
+# Los tests corren en un solo proceso: el caché locmem se puede usar como si fuera compartido
+@override_settings(CACHE_SINGLE_PROCESS=True)
+class BaseAPITestCase(TestCase):
+    def setUp(self):
+        # El caché vive en memoria del proceso: cada test arranca vacío
+        caches['default'].clear()
+        self.client = APIClient()
+
+
+class LocalStorageMixin:
+    """Usa el almacenamiento en disco (tasks.storage.LocalFileStorage) en un directorio temporal."""
+
+    def setUp(self):
+        super().setUp()
+        self.storage_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_root, ignore_errors=True)
+        storage_settings = override_settings(
+            FILE_STORAGE_BACKEND='tasks.storage.LocalFileStorage',
+            LOCAL_STORAGE_ROOT=self.storage_root,
+            RESUMABLE_UPLOAD_DIR=os.path.join(self.storage_root, 'partial'),
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+
+
+class FileListPaginationTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+        now = timezone.now()
+        cls.files = []
+        for i in range(7):
+            obj = make_file(cls.professor, f'archivo-{i}')
+            cls.files.append(obj)
+        # Dos archivos con el mismo uploaded_at para probar el desempate por id
+        ProfessorFile.objects.filter(pk__in=[cls.files[5].pk, cls.files[6].pk]).update(uploaded_at=now)
+        for i, obj in enumerate(cls.files[:5]):
+            ProfessorFile.objects.filter(pk=obj.pk).update(uploaded_at=now - timedelta(minutes=5 - i))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.student)
+        self.url = reverse('files_manager')
+
+    def walk(self, page_size):
+        ids, cursor = [], None
+        while True:
+            params = {'page_size': page_size}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row['id'] for row in response.data['data'])
+            cursor = response.data['next']
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_file_once_in_order(self):
+        expected = list(
+            ProfessorFile.objects.order_by('-uploaded_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.walk(page_size=2), expected)
+        self.assertEqual(self.walk(page_size=3), expected)
+
+    @override_settings(FILES_PAGE_SIZE=4)
+    def test_default_page_size_comes_from_settings(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['data']), 4)
+        self.assertIsNotNone(response.data['next'])
+
+    @override_settings(FILES_MAX_PAGE_SIZE=3)
+    def test_page_size_is_capped(self):
+        response = self.client.get(self.url, {'page_size': 100})
+        self.assertEqual(len(response.data['data']), 3)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(self.url, {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryBudgetTests(BaseAPITestCase):
+    """
+    Presupuesto de consultas por endpoint. Si alguien mete un N+1 o un COUNT
+    extra, estos tests fallan en CI.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.other_professor = make_user('otra.profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+
+    def seed_files(self, count):
+        for i in range(count):
+            owner = self.professor if i % 2 else self.other_professor
+            make_file(owner, f'doc-{i}')
+
+    def test_file_list_is_constant_in_row_count(self):
+        self.client.force_authenticate(self.student)
+        url = reverse('files_manager')
+
+        # Cursos del alumno (después quedan en caché) + página
+        self.seed_files(3)
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seed_files(30)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data['page_count'], len(response.data['data']))
+
+    def test_cached_file_list_makes_no_queries(self):
+        self.client.force_authenticate(self.student)
+        self.seed_files(5)
+        self.client.get(reverse('files_manager'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('files_manager'))
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_file_list_with_jwt_header(self):
+        self.seed_files(10)
+        login = self.client.post(
+            reverse('token_obtain_pair'),
+            {'email': 'alumno@ittac.com', 'password': 'Clave-Segura-123'},
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+        # Usuario del token + sus cursos + página de archivos
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('files_manager'))
+        self.assertEqual(response.status_code, 200)
+        # Usuario y página ya cacheados
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('files_manager'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_login(self):
+        # SELECT del usuario + INSERT del OutstandingToken (blacklist app)
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                reverse('token_obtain_pair'),
+                {'email': 'profe@ittac.com', 'password': 'Clave-Segura-123'},
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_password_reset_request(self):
+        # SELECT del usuario + INSERT en la bandeja de salida
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('password_reset'), {'email': 'alumno@ittac.com'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_password_reset_request_unknown_email(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('password_reset'), {'email': 'nadie@ittac.com'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_password_reset_confirm(self):
+        payload = {
+            'uid': urlsafe_base64_encode(force_bytes(self.student.pk)),
+            'token': default_token_generator.make_token(self.student),
+            'new_password': 'Otra-Clave-456',
+        }
+        # SELECT del usuario + UPDATE con el nuevo hash
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('password_reset_confirm'), payload)
+        self.assertEqual(response.status_code, 200)
+
+
+class DownloadUrlTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+
+    def test_download_url_is_stored_on_save(self):
+        obj = make_file(self.professor, 'silabo')
+        obj.refresh_from_db()
+        self.assertTrue(obj.download_url.startswith('https://'))
+        self.assertIn('/raw/upload/fl_attachment/', obj.download_url)
+
+    def test_build_download_url_leaves_other_hosts_alone(self):
+        self.assertEqual(build_download_url('http://example.com/upload/a.pdf'), 'https://example.com/upload/a.pdf')
+        self.assertIsNone(build_download_url(''))
+
+    def test_backfill_command_fills_missing_urls(self):
+        objs = [make_file(self.professor, f'viejo-{i}') for i in range(5)]
+        ProfessorFile.objects.update(download_url=None)
+
+        call_command('backfill_download_urls', batch_size=2, stdout=StringIO())
+
+        for obj in objs:
+            obj.refresh_from_db()
+            self.assertEqual(obj.download_url, obj.compute_download_url())
+
+
+class FileListCacheTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+        cls.staff = make_user('staff@ittac.com', is_staff=True)
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('files_manager')
+        self.existing = make_file(self.professor, 'guia')
+
+    def test_delete_invalidates_cached_pages(self):
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+
+        self.client.force_authenticate(self.professor)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"{self.url}?id={self.existing.id}")
+        self.assertEqual(response.status_code, 204)
+
+        self.client.force_authenticate(self.student)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['data'], [])
+
+    def test_new_file_invalidates_cached_pages(self):
+        self.client.force_authenticate(self.student)
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_file(self.professor, 'nuevo')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['page_count'], 2)
+
+    def test_pages_are_cached_separately(self):
+        self.client.force_authenticate(self.student)
+        make_file(self.professor, 'otro')
+        first = self.client.get(self.url, {'page_size': 1})
+        second = self.client.get(self.url, {'page_size': 1, 'cursor': first.data['next']})
+        self.assertNotEqual(first.data['data'], second.data['data'])
+        self.assertEqual(second['X-Cache'], 'MISS')
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.force_authenticate(self.student)
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(self.client.get(reverse('files_cache_stats')).status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        stats = self.client.get(reverse('files_cache_stats')).data
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+class FileListConditionalGetTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+        make_file(cls.professor, 'guia')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.student)
+        self.url = reverse('files_manager')
+
+    def test_if_none_match_returns_304_without_queries(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_after_upload(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            make_file(self.professor, 'nuevo')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_each_page_has_its_own_etag(self):
+        first = self.client.get(self.url)
+        other = self.client.get(self.url, {'page_size': 1})
+        self.assertNotEqual(first['ETag'], other['ETag'])
+
+    @override_settings(CACHE_SINGLE_PROCESS=False)
+    def test_process_local_cache_serves_no_cached_pages(self):
+        first = self.client.get(self.url)
+        self.assertNotIn('ETag', first)
+        # Una subida en otro worker no bumpea este caché: igual se ve en el siguiente GET
+        make_file(self.professor, 'desde otro worker')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['data']), len(first.data['data']) + 1)
+        self.assertIn('tasks.W002', [message.id for message in check_shared_caches(None)])
+
+    def test_only_the_etag_validates(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        # Un cambio en el mismo segundo que la copia del cliente no puede quedar oculto tras un 304
+        since = http_date(time.time() + 60)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_file(self.professor, 'nuevo')
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+
+
+class DirectUploadTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.other_professor = make_user('otra.profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+
+    def request_ticket(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('files_upload_ticket'))
+
+    def upload_to_storage(self, ticket):
+        payload = dict(ticket['fields'], file=SimpleUploadedFile('clase.pdf', b'%PDF-1.4 contenido'))
+        response = self.client.post(ticket['upload_url'], payload, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def complete(self, ticket, stored, **overrides):
+        payload = {
+            'ticket': ticket['ticket'],
+            'title': 'Clase 1',
+            'public_id': stored['public_id'],
+            'version': stored['version'],
+            'signature': stored['signature'],
+            'resource_type': stored['resource_type'],
+        }
+        payload.update(overrides)
+        return self.client.post(reverse('files_upload_complete'), payload)
+
+    def test_full_flow_creates_file(self):
+        ticket = self.request_ticket(self.professor).data
+        stored = self.upload_to_storage(ticket)
+
+        response = self.complete(ticket, stored)
+        self.assertEqual(response.status_code, 201)
+        obj = ProfessorFile.objects.get(pk=response.data['id'])
+        self.assertEqual(obj.uploaded_by, self.professor)
+        self.assertEqual(obj.download_url, stored['secure_url'].replace('http://', 'https://', 1))
+
+    def test_students_cannot_get_tickets(self):
+        self.assertEqual(self.request_ticket(self.student).status_code, 403)
+
+    def test_forged_signature_is_rejected(self):
+        ticket = self.request_ticket(self.professor).data
+        stored = self.upload_to_storage(ticket)
+        response = self.complete(ticket, stored, signature='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProfessorFile.objects.exists())
+
+    def test_ticket_is_bound_to_its_professor(self):
+        ticket = self.request_ticket(self.professor).data
+        stored = self.upload_to_storage(ticket)
+        self.client.force_authenticate(self.other_professor)
+        self.assertEqual(self.complete(ticket, stored).status_code, 400)
+
+    @override_settings(UPLOAD_TICKET_MAX_AGE=-1)
+    def test_expired_ticket_is_rejected(self):
+        ticket = self.request_ticket(self.professor).data
+        response = self.complete(ticket, {'public_id': ticket['fields']['public_id'], 'version': 1,
+                                          'signature': 'x', 'resource_type': 'raw'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ticket', response.data)
+
+
+class StreamingUploadTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+
+    def receive(self, handler, name, data, chunk=4):
+        handler.new_file('file', name, 'application/pdf', len(data), None)
+        for start in range(0, len(data), chunk):
+            handler.receive_data_chunk(data[start:start + chunk], start)
+        return handler.file_complete(len(data))
+
+    @override_settings(FILE_UPLOAD_MEMORY_CAP=10)
+    def test_memory_cap_is_shared_by_the_whole_request(self):
+        handler = StreamingUploadHandler()
+        small = self.receive(handler, 'a.pdf', b'123456')
+        spilled = self.receive(handler, 'b.pdf', b'abcdefgh')
+        self.assertTrue(small.in_memory)
+        self.assertFalse(spilled.in_memory)
+        self.assertEqual(spilled.read(), b'abcdefgh')
+        self.assertEqual(spilled.size, 8)
+
+    def test_iter_chunks_uses_fixed_size_blocks(self):
+        upload = SimpleUploadedFile('a.bin', b'x' * 10)
+        self.assertEqual([len(c) for c in iter_chunks(upload, 4)], [4, 4, 2])
+
+    @override_settings(FILE_UPLOAD_MEMORY_CAP=16, FILE_UPLOAD_CHUNK_SIZE=8, STORAGE_UPLOAD_CHUNK_SIZE=5)
+    def test_post_streams_file_to_storage(self):
+        self.client.force_authenticate(self.professor)
+        content = b'%PDF-1.4 ' + b'0123456789' * 20
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('files_manager'),
+                {'title': 'Video', 'file': SimpleUploadedFile('clase.pdf', content)},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 201)
+
+        obj = ProfessorFile.objects.get(pk=response.data['id'])
+        public_id = obj.file.public_id
+        with open(get_file_storage()._path(public_id), 'rb') as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertTrue(obj.download_url.startswith('https://'))
+
+
+class ResumableUploadTests(LocalStorageMixin, BaseAPITestCase):
+    content = b'%PDF-1.4 ' + b'abcdefghij' * 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.other_professor = make_user('otra.profe@ittac.com', role='PROFESSOR')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.professor)
+
+    def create_session(self):
+        response = self.client.post(
+            reverse('files_upload_sessions'),
+            {'title': 'Video clase', 'filename': 'clase.mp4', 'length': len(self.content)},
+        )
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def patch(self, location, offset, data):
+        return self.client.generic(
+            'PATCH', location, data,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_upload_in_ranges_and_finalize(self):
+        location = self.create_session()
+        self.assertEqual(self.patch(location, 0, self.content[:100])['Upload-Offset'], '100')
+        self.assertEqual(self.patch(location, 100, self.content[100:])['Upload-Offset'], str(len(self.content)))
+
+        response = self.client.post(location + 'finalize/')
+        self.assertEqual(response.status_code, 201)
+        obj = ProfessorFile.objects.get(pk=response.data['id'])
+        with open(get_file_storage()._path(obj.file.public_id), 'rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_resume_after_offset_mismatch(self):
+        location = self.create_session()
+        self.patch(location, 0, self.content[:50])
+
+        # El cliente cree que no llegó nada: el servidor le dice dónde quedó
+        conflict = self.patch(location, 0, self.content)
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual(self.client.head(location)['Upload-Offset'], '50')
+
+        self.patch(location, 50, self.content[50:])
+        self.assertEqual(self.client.post(location + 'finalize/').status_code, 201)
+
+    def test_patch_takes_a_lease_instead_of_a_row_lock(self):
+        location = self.create_session()
+        session = UploadSession.objects.get()
+        # Otro PATCH en curso: no se pisan
+        UploadSession.objects.update(locked_until=timezone.now() + timedelta(seconds=60))
+        self.assertEqual(self.patch(location, 0, self.content).status_code, 409)
+        # Un lease vencido (el cliente se colgó) se puede volver a tomar
+        UploadSession.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        with self.assertNumQueries(3):
+            response = self.patch(location, 0, self.content)
+        self.assertEqual(response.status_code, 204)
+        session.refresh_from_db()
+        self.assertEqual((session.offset, session.locked_until), (len(self.content), None))
+
+    def test_course_is_checked_and_kept_on_the_file(self):
+        math = Course.objects.create(name='Matemática', code='MAT-1')
+        history = Course.objects.create(name='Historia', code='HIS-1')
+        enrollment = Enrollment.objects.create(user=self.professor, course=math)
+        data = {'title': 'Video clase', 'filename': 'clase.mp4', 'length': len(self.content)}
+
+        denied = self.client.post(reverse('files_upload_sessions'), {**data, 'course': history.id})
+        self.assertEqual(denied.status_code, 403)
+
+        response = self.client.post(reverse('files_upload_sessions'), {**data, 'course': math.id})
+        self.assertEqual(response.status_code, 201)
+        location = response['Location']
+        self.patch(location, 0, self.content)
+
+        # Si deja el curso mientras sube, no puede publicar en él
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment.delete()
+        self.client.force_authenticate(CustomUser.objects.get(pk=self.professor.pk))
+        self.assertEqual(self.client.post(location + 'finalize/').status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(user=self.professor, course=math)
+        self.client.force_authenticate(CustomUser.objects.get(pk=self.professor.pk))
+        response = self.client.post(location + 'finalize/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ProfessorFile.objects.get(pk=response.data['id']).course_id, math.id)
+
+    def test_double_finalize_creates_one_file(self):
+        location = self.create_session()
+        self.patch(location, 0, self.content)
+        concurrent = []
+
+        def store_while_another_finalizes(upload):
+            # Segundo finalize mientras el primero todavía está subiendo al almacenamiento
+            concurrent.append(self.client.post(location + 'finalize/'))
+            return store_upload(upload)
+
+        with mock.patch('tasks.views.store_upload', side_effect=store_while_another_finalizes):
+            response = self.client.post(location + 'finalize/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(concurrent[0].status_code, 409)
+        self.assertEqual(self.client.post(location + 'finalize/').status_code, 404)
+        self.assertEqual(ProfessorFile.objects.count(), 1)
+
+    def test_extra_bytes_are_ignored(self):
+        location = self.create_session()
+        response = self.patch(location, 0, self.content + b'sobra')
+        self.assertEqual(response['Upload-Offset'], str(len(self.content)))
+
+    def test_finalize_requires_every_byte(self):
+        location = self.create_session()
+        self.patch(location, 0, self.content[:10])
+        self.assertEqual(self.client.post(location + 'finalize/').status_code, 409)
+
+    def test_sessions_are_private(self):
+        location = self.create_session()
+        self.client.force_authenticate(self.other_professor)
+        self.assertEqual(self.patch(location, 0, self.content).status_code, 404)
+
+    def test_expired_sessions_are_gone_and_purged(self):
+        location = self.create_session()
+        UploadSession.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.client.get(location).status_code, 410)
+
+        self.create_session()
+        UploadSession.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('purge_upload_sessions', stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+
+
+class DeduplicationTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.professor)
+
+    def post_file(self, title, content, name='slides.pdf'):
+        response = self.client.post(
+            reverse('files_manager'),
+            {'title': title, 'file': SimpleUploadedFile(name, content, content_type='application/pdf')},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 201)
+        return ProfessorFile.objects.get(pk=response.data['id'])
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.storage_root) for name in names]
+
+    def test_metadata_is_stored(self):
+        content = b'%PDF-1.4 diapositivas'
+        obj = self.post_file('Sección A', content)
+        self.assertEqual(obj.content_hash, hashlib.sha256(content).hexdigest())
+        self.assertEqual(obj.size, len(content))
+        self.assertEqual(obj.content_type, 'application/pdf')
+        self.assertEqual(obj.resource_type, 'raw')
+
+    def test_identical_upload_reuses_the_stored_asset(self):
+        first = self.post_file('Sección A', b'%PDF-1.4 mismas diapositivas')
+        second = self.post_file('Sección B', b'%PDF-1.4 mismas diapositivas', name='copia.pdf')
+
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(str(first.file), str(second.file))
+        self.assertEqual(first.download_url, second.download_url)
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_different_content_is_uploaded(self):
+        self.post_file('A', b'uno')
+        self.post_file('B', b'dos')
+        self.assertEqual(len(self.stored_files()), 2)
+
+
+class BatchUploadTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.professor)
+        self.url = reverse('files_batch_upload')
+
+    def post_batch(self, files, titles=()):
+        return self.client.post(self.url, {'files': files, 'titles': list(titles)}, format='multipart')
+
+    def test_all_files_are_created(self):
+        files = [SimpleUploadedFile(f'semana-{i}.pdf', f'contenido {i}'.encode()) for i in range(4)]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.post_batch(files, titles=['Lunes', 'Martes'])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 4)
+        # Una invalidación del listado y una publicación de eventos para todo el lote
+        self.assertEqual(len(callbacks), 2)
+        titles = [row['file']['title'] for row in response.data['results']]
+        self.assertEqual(titles, ['Lunes', 'Martes', 'semana-2.pdf', 'semana-3.pdf'])
+
+    def test_invalid_files_are_reported_individually(self):
+        files = [SimpleUploadedFile('ok.pdf', b'bien'), SimpleUploadedFile('vacio.pdf', b'')]
+        response = self.post_batch(files)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error'])
+        self.assertEqual(ProfessorFile.objects.count(), 1)
+
+    def test_storage_failures_are_reported_individually(self):
+        real_upload = LocalFileStorage.upload
+
+        def flaky_upload(storage, fileobj, public_id, chunk_size=None):
+            if fileobj.name == 'falla.pdf':
+                raise StorageError("Timeout del almacenamiento.")
+            return real_upload(storage, fileobj, public_id, chunk_size)
+
+        files = [SimpleUploadedFile('falla.pdf', b'x'), SimpleUploadedFile('bien.pdf', b'y')]
+        with mock.patch.object(LocalFileStorage, 'upload', flaky_upload):
+            response = self.post_batch(files)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['results'][0]['error'], "Timeout del almacenamiento.")
+        self.assertEqual(response.data['results'][1]['status'], 'created')
+
+    def test_duplicates_in_the_same_batch_are_uploaded_once(self):
+        files = [SimpleUploadedFile('a.pdf', b'igual'), SimpleUploadedFile('b.pdf', b'igual')]
+        with mock.patch.object(LocalFileStorage, 'upload', autospec=True, side_effect=LocalFileStorage.upload) as upload:
+            response = self.post_batch(files)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(upload.call_count, 1)
+
+    def test_students_cannot_batch_upload(self):
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.post_batch([SimpleUploadedFile('a.pdf', b'a')]).status_code, 403)
+
+
+class BulkDeleteTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.other_professor = make_user('otra.profe@ittac.com', role='PROFESSOR')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.professor)
+        self.url = reverse('files_manager')
+
+    def upload(self, name, content):
+        response = self.client.post(self.url, {'title': name, 'file': SimpleUploadedFile(name, content)},
+                                    format='multipart')
+        return ProfessorFile.objects.get(pk=response.data['id'])
+
+    def test_bulk_delete_is_three_queries_and_hides_rows(self):
+        mine = [make_file(self.professor, f'mio-{i}') for i in range(5)]
+        ids = ','.join(str(obj.id) for obj in mine)
+        # IDs autorizados, UPDATE y las lápidas de FileChange
+        with self.assertNumQueries(3):
+            response = self.client.delete(f"{self.url}?ids={ids}")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ProfessorFile.objects.exists())
+        self.assertEqual(ProfessorFile.all_objects.filter(deleted_at__isnull=False).count(), 5)
+
+    def test_json_body_and_partial_permission(self):
+        mine = make_file(self.professor, 'mio')
+        theirs = make_file(self.other_professor, 'ajeno')
+        response = self.client.delete(self.url, {'ids': [mine.id, theirs.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['deleted'], [mine.id])
+        self.assertEqual(response.data['not_found'], [theirs.id])
+        self.assertTrue(ProfessorFile.objects.filter(pk=theirs.pk).exists())
+
+    def test_single_id_keeps_old_contract(self):
+        theirs = make_file(self.other_professor, 'ajeno')
+        self.assertEqual(self.client.delete(f"{self.url}?id={theirs.id}").status_code, 404)
+        self.assertEqual(self.client.delete(self.url).status_code, 400)
+
+    def test_blank_ids_are_missing_ids(self):
+        for query in ('?id=', '?ids=,,', '?ids= , '):
+            response = self.client.delete(self.url + query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn("Falta el ID", response.data['error'])
+
+    def test_purge_deletes_assets_in_batches(self):
+        objs = [self.upload(f'f{i}.pdf', f'contenido {i}'.encode()) for i in range(5)]
+        ProfessorFile.objects.filter(pk__in=[obj.pk for obj in objs]).soft_delete()
+
+        with mock.patch.object(LocalFileStorage, 'delete_many', autospec=True,
+                               side_effect=LocalFileStorage.delete_many) as delete_many:
+            call_command('purge_deleted_files', batch_size=2, grace=0, stdout=StringIO())
+
+        self.assertEqual(delete_many.call_count, 3)
+        self.assertFalse(ProfessorFile.all_objects.exists())
+        for obj in objs:
+            self.assertFalse(os.path.exists(get_file_storage()._path(obj.file.public_id)))
+
+    def test_purge_keeps_assets_shared_with_live_files(self):
+        original = self.upload('a.pdf', b'compartido')
+        copy = self.upload('b.pdf', b'compartido')
+        ProfessorFile.objects.filter(pk=copy.pk).soft_delete()
+
+        call_command('purge_deleted_files', grace=0, stdout=StringIO())
+        self.assertFalse(ProfessorFile.all_objects.filter(pk=copy.pk).exists())
+        self.assertTrue(os.path.exists(get_file_storage()._path(original.file.public_id)))
+
+    def test_failed_purge_is_retried_later(self):
+        obj = self.upload('a.pdf', b'uno')
+        ProfessorFile.objects.filter(pk=obj.pk).soft_delete()
+        with mock.patch.object(LocalFileStorage, 'delete_many', side_effect=StorageError("caído")):
+            call_command('purge_deleted_files', grace=0, stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(ProfessorFile.all_objects.filter(pk=obj.pk).exists())
+
+    def test_purge_spares_assets_a_dedup_upload_may_reuse(self):
+        old = self.upload('a.pdf', b'reutilizado')
+        # La subida deduplicada reutiliza el asset; el original se borró hace rato y la copia recién
+        recent = self.upload('b.pdf', b'reutilizado')
+        self.assertEqual(recent.file.public_id, old.file.public_id)
+        ProfessorFile.objects.filter(pk=old.pk).soft_delete()
+        ProfessorFile.all_objects.filter(pk=old.pk).update(deleted_at=timezone.now() - timedelta(hours=1))
+        ProfessorFile.objects.filter(pk=recent.pk).soft_delete()
+
+        call_command('purge_deleted_files', stdout=StringIO())
+        # La fila vieja se va, el asset queda hasta que pase la espera del borrado reciente
+        self.assertFalse(ProfessorFile.all_objects.filter(pk=old.pk).exists())
+        self.assertTrue(ProfessorFile.all_objects.filter(pk=recent.pk).exists())
+        self.assertTrue(os.path.exists(get_file_storage()._path(old.file.public_id)))
+
+
+class FlakyEmailBackend(LocMemEmailBackend):
+    """Backend locmem que falla para los destinatarios @caido.com."""
+    instances = 0
+    # Transacciones abiertas en cada envío (las del TestCase incluidas)
+    atomic_depths = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        FlakyEmailBackend.instances += 1
+
+    def send_messages(self, messages):
+        FlakyEmailBackend.atomic_depths.append(len(connection.atomic_blocks))
+        for message in messages:
+            if any(address.endswith('@caido.com') for address in message.to):
+                raise ConnectionError("SMTP no responde")
+        return super().send_messages(messages)
+
+
+class EmailOutboxTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = make_user('alumno@ittac.com')
+
+    def test_password_reset_enqueues_instead_of_sending(self):
+        response = self.client.post(reverse('password_reset'), {'email': 'alumno@ittac.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.to, ['alumno@ittac.com'])
+
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        html, mimetype = mail.outbox[0].alternatives[0]
+        self.assertEqual(mimetype, 'text/html')
+        self.assertIn('Hola, alumno', html)
+        self.assertIn(queued.context['reset_url'], html)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'SENT')
+
+    @override_settings(EMAIL_BACKEND='tasks.tests.FlakyEmailBackend', EMAIL_OUTBOX_BATCH_SIZE=10)
+    def test_batch_reuses_one_connection(self):
+        for i in range(5):
+            enqueue_email([f'alumno{i}@ittac.com'], 'Hola', 'Texto')
+        FlakyEmailBackend.instances = 0
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(FlakyEmailBackend.instances, 1)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(OutboundEmail.objects.filter(status='SENT').count(), 5)
+
+    @override_settings(EMAIL_BACKEND='tasks.tests.FlakyEmailBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_dead_letter(self):
+        email = enqueue_email(['nadie@caido.com'], 'Hola', 'Texto')
+        call_command('send_outbox', stdout=StringIO())
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('PENDING', 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertIn('SMTP no responde', email.last_error)
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        call_command('send_outbox', stdout=StringIO())
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('DEAD', 2))
+
+    @override_settings(EMAIL_BACKEND='tasks.tests.FlakyEmailBackend')
+    def test_smtp_runs_outside_the_claim_transaction(self):
+        enqueue_email(['alumno@ittac.com'], 'Hola', 'Texto')
+        FlakyEmailBackend.atomic_depths = []
+        depth = len(connection.atomic_blocks)
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(FlakyEmailBackend.atomic_depths, [depth])
+
+    def test_claimed_batch_is_skipped_until_its_lease_expires(self):
+        email = enqueue_email(['alumno@ittac.com'], 'Hola', 'Texto')
+        # Otro worker lo reservó y sigue enviando
+        OutboundEmail.objects.update(status='SENDING', next_attempt_at=timezone.now() + timedelta(minutes=5))
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Ese worker murió: al vencer el lease se vuelve a tomar
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        call_command('send_outbox', stdout=StringIO())
+        email.refresh_from_db()
+        self.assertEqual((len(mail.outbox), email.status), (1, 'SENT'))
+
+
+class CachedJWTAuthenticationTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('profe@ittac.com', role='PROFESSOR')
+
+    def setUp(self):
+        super().setUp()
+        login = self.client.post(
+            reverse('token_obtain_pair'),
+            {'email': 'profe@ittac.com', 'password': 'Clave-Segura-123'},
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+        self.url = reverse('files_upload_ticket')
+
+    def test_role_change_is_seen_on_next_request(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = 'STUDENT'
+            self.user.save()
+        self.assertEqual(self.client.post(self.url).status_code, 403)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.post(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.post(self.url).status_code, 401)
+
+    @override_settings(CACHE_SINGLE_PROCESS=False)
+    def test_process_local_cache_is_not_used_for_users(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        # Como si lo desactivaran desde otro worker: este proceso no se entera de la invalidación
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.post(self.url).status_code, 401)
+        self.assertIn('tasks.W001', [message.id for message in check_shared_caches(None)])
+
+
+@override_settings(JWT_BOOKKEEPING_BATCH_SIZE=1000, JWT_BOOKKEEPING_FLUSH_INTERVAL=3600)
+class TokenRefreshTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('alumno@ittac.com')
+
+    def setUp(self):
+        super().setUp()
+        bookkeeping.flush()
+        login = self.client.post(
+            reverse('token_obtain_pair'),
+            {'email': 'alumno@ittac.com', 'password': 'Clave-Segura-123'},
+        )
+        self.refresh = login.data['refresh']
+        self.url = reverse('token_refresh')
+
+    def tearDown(self):
+        bookkeeping.flush()
+        super().tearDown()
+
+    def test_rotation_query_budget(self):
+        response = self.client.post(self.url, {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 200)
+        # El lote ya escribió la fila del token: un SELECT (¿está en la lista negra?)
+        # y un INSERT en la lista negra. El SAVEPOINT/RELEASE es por la transacción
+        # del test; en un request no hay. El token nuevo va por lotes
+        bookkeeping.flush()
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, {'refresh': response.data['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        # Sin la fila todavía: además un INSERT del OutstandingToken
+        with self.assertNumQueries(7):
+            response = self.client.post(self.url, {'refresh': response.data['refresh']})
+        self.assertEqual(response.status_code, 200)
+
+    def test_reused_refresh_token_is_rejected(self):
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 200)
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 401)
+
+    def test_logged_out_token_is_rejected(self):
+        access = self.client.post(self.url, {'refresh': self.refresh}).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access['access']}")
+        self.assertEqual(self.client.post(reverse('auth_logout'), {'refresh': access['refresh']}).status_code, 200)
+        self.assertEqual(self.client.post(self.url, {'refresh': access['refresh']}).status_code, 401)
+
+    def test_evicted_cache_entry_falls_back_to_database(self):
+        rotated = self.client.post(self.url, {'refresh': self.refresh})
+        self.assertEqual(rotated.status_code, 200)
+        # Otro worker, o la llave desalojada: el caché ya no sabe que se usó
+        caches['default'].clear()
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 401)
+
+    def test_logout_is_seen_by_other_caches(self):
+        access = self.client.post(self.url, {'refresh': self.refresh}).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access['access']}")
+        self.client.post(reverse('auth_logout'), {'refresh': access['refresh']})
+        caches['default'].clear()
+        self.assertEqual(self.client.post(self.url, {'refresh': access['refresh']}).status_code, 401)
+
+    def test_rotation_blacklists_without_waiting_for_flush(self):
+        self.client.post(self.url, {'refresh': self.refresh})
+        jti = RefreshToken(self.refresh, verify=False)['jti']
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=jti).exists())
+
+    def test_flush_writes_rows_in_batch(self):
+        first = self.client.post(self.url, {'refresh': self.refresh}).data['refresh']
+        second = self.client.post(self.url, {'refresh': first}).data['refresh']
+        with self.assertNumQueries(1):
+            self.assertEqual(bookkeeping.flush(), 2)
+
+        blacklisted = set(BlacklistedToken.objects.values_list('token__jti', flat=True))
+        self.assertEqual(blacklisted, {RefreshToken(self.refresh, verify=False)['jti'], RefreshToken(first, verify=False)['jti']})
+        self.assertTrue(OutstandingToken.objects.filter(jti=RefreshToken(second, verify=False)['jti']).exists())
+
+    def test_prune_tokens_deletes_expired_rows(self):
+        self.client.post(self.url, {'refresh': self.refresh})
+        bookkeeping.flush()
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(days=1))
+        fresh = OutstandingToken.objects.create(
+            jti='vigente', token='x', user=self.user, expires_at=timezone.now() + timedelta(days=1),
+        )
+
+        call_command('prune_tokens', chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(list(OutstandingToken.objects.values_list('id', flat=True)), [fresh.id])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class AsyncViewTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+        for index in range(3):
+            make_file(cls.professor, f'Apunte {index}')
+
+    def auth(self, user):
+        return {'Authorization': f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+    async def test_list_matches_sync_view(self):
+        headers = await sync_to_async(self.auth)(self.student)
+        response = await self.async_client.get(reverse('async_files_manager'), {'page_size': 2}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()['data']), 2)
+
+        sync_response = await sync_to_async(self.client.get)(
+            reverse('files_manager'), {'page_size': 2}, HTTP_AUTHORIZATION=headers['Authorization']
+        )
+        self.assertEqual(sync_response['X-Cache'], 'HIT')
+        self.assertEqual(sync_response.json(), response.json())
+
+    async def test_network_cache_is_not_read_on_the_event_loop(self):
+        headers = await sync_to_async(self.auth)(self.student)
+        loop_thread = threading.current_thread()
+        threads = []
+        original = files_cache.get_files_state
+
+        def get_files_state(scopes=()):
+            threads.append(threading.current_thread())
+            return original(scopes)
+
+        # FileBasedCache hace I/O como lo haría Redis: no debe correr en el hilo del event loop
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                  'LOCATION': cache_dir}}
+        with override_settings(CACHES=file_cache), \
+                mock.patch('tasks.async_views.files_cache.get_files_state', side_effect=get_files_state):
+            response = await self.async_client.get(reverse('async_files_manager'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(threads)
+        self.assertNotIn(loop_thread, threads)
+
+    async def test_anonymous_list_is_rejected(self):
+        response = await self.async_client.get(reverse('async_files_manager'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+    async def test_student_cannot_upload(self):
+        headers = await sync_to_async(self.auth)(self.student)
+        response = await self.async_client.post(
+            reverse('async_files_manager'),
+            {'title': 'Tarea', 'file': SimpleUploadedFile('tarea.pdf', b'%PDF-1.4')},
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 403)
+
+    async def test_upload_without_title(self):
+        headers = await sync_to_async(self.auth)(self.professor)
+        response = await self.async_client.post(
+            reverse('async_files_manager'),
+            {'file': SimpleUploadedFile('sin_titulo.pdf', b'%PDF-1.4 sin titulo')},
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['title'], '')
+
+    async def test_upload_and_delete(self):
+        headers = await sync_to_async(self.auth)(self.professor)
+        response = await self.async_client.post(
+            reverse('async_files_manager'),
+            {'title': 'Guía async', 'file': SimpleUploadedFile('guia.pdf', b'%PDF-1.4 guia')},
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        file_id = response.json()['id']
+        self.assertEqual(response.json()['size'], len(b'%PDF-1.4 guia'))
+
+        response = await self.async_client.delete(
+            reverse('async_files_manager'),
+            {'ids': [file_id, 999999]},
+            content_type='application/json',
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['deleted'], [file_id])
+        self.assertFalse(await ProfessorFile.objects.filter(id=file_id).aexists())
+
+    async def test_malformed_bodies_are_rejected(self):
+        cases = [
+            ('async_token_obtain_pair', ['profe@ittac.com']),
+            ('async_token_obtain_pair', {'email': ['profe@ittac.com'], 'password': 'Clave-Segura-123'}),
+            ('async_password_reset', 'profe@ittac.com'),
+            ('async_password_reset', {'email': 123}),
+        ]
+        for url_name, body in cases:
+            response = await self.async_client.post(
+                reverse(url_name), json.dumps(body), content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400, body)
+
+    async def test_login(self):
+        response = await self.async_client.post(
+            reverse('async_token_obtain_pair'),
+            {'email': 'profe@ittac.com', 'password': 'Clave-Segura-123'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['role'], 'PROFESSOR')
+        self.assertIn('refresh', response.json())
+
+        response = await self.async_client.post(
+            reverse('async_token_obtain_pair'),
+            {'email': 'profe@ittac.com', 'password': 'incorrecta'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_password_reset_is_queued(self):
+        response = await self.async_client.post(
+            reverse('async_password_reset'), {'email': 'alumno@ittac.com'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await OutboundEmail.objects.filter(to=['alumno@ittac.com']).acount(), 1)
+
+        response = await self.async_client.post(
+            reverse('async_password_reset'), {'email': 'nadie@ittac.com'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+class LoginThrottleTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('alumno@ittac.com')
+
+    def login(self, email='alumno@ittac.com', password='incorrecta', ip='10.0.0.1'):
+        return self.client.post(
+            reverse('token_obtain_pair'), {'email': email, 'password': password}, REMOTE_ADDR=ip
+        )
+
+    @throttle_rates(login_ip='100/min', login_email='2/min')
+    def test_email_bucket_blocks_guessing_from_many_ips(self):
+        self.assertEqual(self.login(ip='10.0.0.1').status_code, 401)
+        self.assertEqual(self.login(ip='10.0.0.2').status_code, 401)
+        response = self.login(ip='10.0.0.3', password='Clave-Segura-123')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Otro correo tiene su propia cubeta
+        self.assertEqual(self.login(email='otro@ittac.com', ip='10.0.0.3').status_code, 401)
+
+    @throttle_rates(login_ip='3/min', login_email='100/min')
+    def test_ip_bucket_blocks_credential_spray(self):
+        for index in range(3):
+            self.assertEqual(self.login(email=f'victima{index}@ittac.com').status_code, 401)
+        self.assertEqual(self.login(email='victima9@ittac.com').status_code, 429)
+        self.assertEqual(self.login(password='Clave-Segura-123', ip='10.0.0.2').status_code, 200)
+
+    @throttle_rates(login_ip='2/min', login_email='100/min')
+    def test_forged_forwarded_for_does_not_open_new_buckets(self):
+        for index in range(2):
+            self.client.post(
+                reverse('token_obtain_pair'), {'email': f'victima{index}@ittac.com', 'password': 'x'},
+                REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'203.0.113.{index}',
+            )
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'email': 'victima9@ittac.com', 'password': 'x'},
+            REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.9',
+        )
+        self.assertEqual(response.status_code, 429)
+
+    @throttle_rates(login_ip='100/min', login_email='2/min')
+    def test_bucket_refills_over_time(self):
+        with mock.patch.object(TokenBucketThrottle, 'timer', return_value=1000.0):
+            self.login()
+            self.login()
+            self.assertEqual(self.login().status_code, 429)
+        # 2/min: una ficha nueva cada 30 segundos
+        with mock.patch.object(TokenBucketThrottle, 'timer', return_value=1031.0):
+            self.assertEqual(self.login(password='Clave-Segura-123').status_code, 200)
+            self.assertEqual(self.login().status_code, 429)
+
+    @throttle_rates(password_reset_ip='100/min', password_reset_email='1/min')
+    def test_password_reset_is_throttled_per_email(self):
+        url = reverse('password_reset')
+        self.assertEqual(self.client.post(url, {'email': 'alumno@ittac.com'}).status_code, 200)
+        self.assertEqual(self.client.post(url, {'email': 'ALUMNO@ittac.com'}).status_code, 429)
+
+    @throttle_rates(login_ip='1/min', login_email='100/min')
+    async def test_async_login_is_throttled(self):
+        url = reverse('async_token_obtain_pair')
+        body = {'email': 'alumno@ittac.com', 'password': 'Clave-Segura-123'}
+        response = await self.async_client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class HashPoolTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('alumno@ittac.com')
+
+    @override_settings(LOGIN_HASH_WORKERS=1, LOGIN_HASH_MAX_PENDING=1)
+    def test_login_verifies_in_process_pool(self):
+        url = reverse('token_obtain_pair')
+        ok = self.client.post(url, {'email': 'alumno@ittac.com', 'password': 'Clave-Segura-123'})
+        self.assertEqual(ok.status_code, 200)
+        bad = self.client.post(url, {'email': 'alumno@ittac.com', 'password': 'incorrecta'})
+        self.assertEqual(bad.status_code, 401)
+
+    def test_full_queue_returns_429(self):
+        with mock.patch('tasks.hashing.submit', side_effect=HashQueueFull):
+            response = self.client.post(
+                reverse('token_obtain_pair'), {'email': 'alumno@ittac.com', 'password': 'Clave-Segura-123'}
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], CACHE_SINGLE_PROCESS=True)
+class BenchmarkTests(LocalStorageMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+    def test_percentile_nearest_rank(self):
+        samples = [0.5, 0.1, 0.4, 0.2, 0.3]
+        self.assertEqual(percentile(samples, 0.5), 0.3)
+        self.assertEqual(percentile(samples, 0.99), 0.5)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_run_benchmark_covers_every_scenario(self):
+        rates = {scope: None for scope in settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']}
+        with throttle_rates(**rates):
+            report = run_benchmark(users=4, files=5, requests=2, concurrency=1)
+
+        self.assertEqual(len(report['results']), len(SCENARIOS) * 2)
+        for result in report['results']:
+            self.assertEqual(result['errors'], 0, result)
+            self.assertEqual(result['requests'], 2)
+            self.assertIsNotNone(result['p99_ms'])
+        listing = next(r for r in report['results'] if r['app'] == 'wsgi' and r['scenario'] == 'list')
+        # El primero busca al usuario, sus cursos y la página; el segundo sale todo del caché
+        self.assertEqual(listing['queries_per_request'], 1.5)
+
+
+@override_settings(SIMULATED_STORAGE={'CLOUD_NAME': 'ittac-local', 'LATENCY': {}, 'FAILURE_RATE': 0})
+class SimulatedStorageTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+
+    def setUp(self):
+        super().setUp()
+        backend = override_settings(FILE_STORAGE_BACKEND='tasks.storage.SimulatedCloudinaryStorage')
+        backend.enable()
+        self.addCleanup(backend.disable)
+        self.storage = get_file_storage()
+        self.storage.reset_stats()
+        self.client.force_authenticate(self.professor)
+
+    def upload(self, name='guia.pdf', content=b'%PDF-1.4 guia', content_type='application/pdf'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('files_manager'),
+                {'title': 'Guía', 'file': SimpleUploadedFile(name, content, content_type)},
+                format='multipart',
+            )
+
+    def test_urls_have_cloudinary_shape(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        self.assertRegex(
+            response.data['download_url'],
+            r'/ittac-local/raw/upload/fl_attachment/v\d+/professor_uploads/\w+\.pdf$',
+        )
+
+        image = self.upload('foto.png', b'\x89PNG imagen', 'image/png')
+        self.assertEqual(image.data['resource_type'], 'image')
+        self.assertIn('/image/upload/fl_attachment/', image.data['download_url'])
+        self.assertEqual(self.storage.stats()['calls'], {'upload': 2})
+
+    def test_injected_failure_is_reported(self):
+        self.storage.fail_next('upload')
+        response = self.upload()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Fallo simulado', str(response.data['file']))
+        self.assertEqual(self.storage.stats()['failures'], {'upload': 1})
+        self.assertEqual(self.upload().status_code, 201)
+
+    def test_latency_includes_transfer_time(self):
+        config = {'LATENCY': {'upload': 0.2}, 'JITTER': 0, 'BANDWIDTH': 1000}
+        with override_settings(SIMULATED_STORAGE=config), mock.patch('tasks.storage.time.sleep') as sleep:
+            self.upload(content=b'x' * 500)
+        sleep.assert_called_once()
+        self.assertAlmostEqual(sleep.call_args.args[0], 0.7)
+
+
+def parse_server_timing(header):
+    metrics = {}
+    for part in header.split(','):
+        name, *params = [item.strip() for item in part.split(';')]
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+@override_settings(SERVER_TIMING_HEADER=True)
+class ServerTimingTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.staff = make_user('admin@ittac.com', is_staff=True, is_superuser=True)
+        make_file(cls.professor, 'Apunte')
+
+    def setUp(self):
+        super().setUp()
+        metrics_registry.reset()
+
+    def test_list_reports_db_and_serialization(self):
+        self.client.force_authenticate(self.professor)
+        timing = parse_server_timing(self.client.get(reverse('files_manager'))['Server-Timing'])
+        # Cursos del usuario + página
+        self.assertEqual(timing['db']['desc'], '"2 queries"')
+        self.assertGreater(float(timing['serialize']['dur']), 0)
+        self.assertGreaterEqual(float(timing['total']['dur']), float(timing['db']['dur']))
+        self.assertEqual(float(timing['storage']['dur']), 0)
+
+    @override_settings(
+        FILE_STORAGE_BACKEND='tasks.storage.SimulatedCloudinaryStorage',
+        SIMULATED_STORAGE={'LATENCY': {'upload': 0.05}, 'JITTER': 0},
+    )
+    def test_upload_reports_storage_time(self):
+        self.client.force_authenticate(self.professor)
+        response = self.client.post(
+            reverse('files_manager'),
+            {'title': 'Guía', 'file': SimpleUploadedFile('guia.pdf', b'%PDF-1.4 guia')},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertGreaterEqual(float(parse_server_timing(response['Server-Timing'])['storage']['dur']), 50)
+
+    async def test_async_view_counts_queries_in_orm_thread(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.professor).access_token))()
+        response = await self.async_client.get(
+            reverse('async_files_manager'), headers={'Authorization': f"Bearer {token}"}
+        )
+        # Usuario y cursos (no están en caché) y la página
+        self.assertEqual(parse_server_timing(response['Server-Timing'])['db']['desc'], '"3 queries"')
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_is_staff_only_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('files_manager')))
+        self.client.force_authenticate(self.professor)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('files_manager')))
+        self.client.force_authenticate(self.staff)
+        self.assertIn('Server-Timing', self.client.get(reverse('files_manager')))
+
+    def test_metrics_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.client.force_authenticate(self.professor)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_metrics_has_per_route_histograms_including_admin(self):
+        self.client.force_authenticate(self.professor)
+        self.client.get(reverse('files_manager'))
+        self.client.force_authenticate(None)
+        # Anónimo: el admin redirige al login
+        self.client.get(reverse('admin:index'))
+        self.client.force_login(self.staff)
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'tasks_request_duration_seconds_count{route="/tasks/api/files/",method="GET",component="total"} 1', body
+        )
+        self.assertIn('tasks_requests_total{route="/admin/",method="GET",status="302"} 1', body)
+        self.assertIn('tasks_request_db_queries_bucket{route="/tasks/api/files/",method="GET",le="2"} 1', body)
+
+
+class ProfilingTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.staff = make_user('admin@ittac.com', is_staff=True, is_superuser=True)
+        make_file(cls.professor, 'Apunte')
+
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        profiling_settings = override_settings(
+            PROFILING_ENABLED=True, PROFILING_DIR=self.profile_dir, PROFILING_SAMPLE_RATE=0, PROFILING_MAX_ENTRIES=3,
+            # El admin renderiza plantillas con {% static %}: sin manifest en los tests
+            STORAGES=dict(settings.STORAGES, staticfiles={
+                'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+            }),
+        )
+        profiling_settings.enable()
+        self.addCleanup(profiling_settings.disable)
+
+    def bearer(self, user):
+        return {'HTTP_AUTHORIZATION': f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+    def test_staff_header_saves_profile_with_sql(self):
+        response = self.client.get(reverse('files_manager'), HTTP_X_PROFILE='1', **self.bearer(self.staff))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list_profile_ids(), [response['X-Profile-Id']])
+
+        self.client.force_login(self.staff)
+        download = self.client.get(reverse('admin_profile_download', args=[response['X-Profile-Id'], 'json']))
+        report = json.loads(b''.join(download.streaming_content))
+        self.assertEqual(report['route'], '/tasks/api/files/')
+        self.assertEqual(report['trigger'], 'header')
+        self.assertTrue(report['hot_functions'])
+        self.assertTrue(report['call_tree'])
+        self.assertTrue(any('tasks_professorfile' in query['sql'] for query in report['sql']))
+
+    async def test_async_view_is_profiled(self):
+        headers = await sync_to_async(self.bearer)(self.staff)
+        response = await self.async_client.get(
+            reverse('async_files_manager'), headers={'X-Profile': '1', 'Authorization': headers['HTTP_AUTHORIZATION']}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list_profile_ids(), [response['X-Profile-Id']])
+
+    def test_header_is_ignored_for_non_staff(self):
+        response = self.client.get(reverse('files_manager'), HTTP_X_PROFILE='1', **self.bearer(self.professor))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(list_profile_ids(), [])
+
+    def test_sampling_and_ring_buffer(self):
+        with override_settings(PROFILING_SAMPLE_RATE=1.0):
+            client = APIClient()
+            client.force_authenticate(self.professor)
+            ids = [client.get(reverse('files_manager'))['X-Profile-Id'] for _ in range(5)]
+        # Solo quedan los PROFILING_MAX_ENTRIES más nuevos
+        self.assertEqual(list_profile_ids(), sorted(ids)[-3:])
+        self.assertEqual(len(os.listdir(self.profile_dir)), 6)
+
+    def test_admin_pages_are_staff_only(self):
+        with override_settings(PROFILING_SAMPLE_RATE=1.0):
+            profile_id = APIClient().get(reverse('files_manager'))['X-Profile-Id']
+
+        self.client.force_login(self.professor)
+        self.assertEqual(self.client.get(reverse('admin_profiles')).status_code, 302)
+        self.assertEqual(
+            self.client.get(reverse('admin_profile_download', args=[profile_id, 'prof'])).status_code, 302
+        )
+
+        self.client.force_login(self.staff)
+        listing = self.client.get(reverse('admin_profiles'))
+        self.assertContains(listing, profile_id)
+        self.assertEqual(
+            self.client.get(reverse('admin_profile_download', args=[profile_id, 'prof'])).status_code, 200
+        )
+        self.assertEqual(self.client.get('/admin/profiles/..%2Fsettings.prof').status_code, 404)
+
+
+@override_settings(FILES_SYNC_SETTLE_SECONDS=0)
+class FileSyncTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('files_changes')
+        self.client.force_authenticate(self.student)
+
+    def start_token(self):
+        return self.client.get(self.url).data['sync_token']
+
+    def test_returns_only_changes_since_token(self):
+        old = make_file(self.professor, 'Viejo')
+        kept = make_file(self.professor, 'Sigue')
+        token = self.start_token()
+
+        new = make_file(self.professor, 'Nuevo')
+        kept.title = 'Sigue (v2)'
+        kept.save()
+        self.client.force_authenticate(self.professor)
+        self.assertEqual(self.client.delete(f"{reverse('files_manager')}?id={old.id}").status_code, 204)
+
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row['id'] for row in response.data['updated']}, {new.id, kept.id})
+        self.assertEqual(response.data['deleted'], [old.id])
+        self.assertFalse(response.data['has_more'])
+
+        again = self.client.get(self.url, {'since': response.data['sync_token']})
+        self.assertEqual((again.data['updated'], again.data['deleted']), ([], []))
+
+    def test_cost_scales_with_changes_not_library(self):
+        for index in range(30):
+            make_file(self.professor, f'Apunte {index}')
+        token = self.start_token()
+        make_file(self.professor, 'Nuevo')
+        # Cambios y archivos cambiados: los cursos del usuario (de force_authenticate)
+        # ya se leyeron al emitir el token
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'since': token})
+        self.assertEqual(len(response.data['updated']), 1)
+
+    def test_batch_upload_and_purge_keep_feed_consistent(self):
+        token = self.start_token()
+        created = ProfessorFile.objects.bulk_create([
+            ProfessorFile(uploaded_by=self.professor, title='Lote', file='raw/upload/v1/x.pdf')
+        ])
+        FileChange.record([(obj.pk, obj.course_id) for obj in created], FileChange.UPSERT)
+        ProfessorFile.objects.filter(pk=created[0].pk).soft_delete()
+        ProfessorFile.all_objects.filter(pk=created[0].pk).delete()
+
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response.data['updated'], [])
+        self.assertEqual(response.data['deleted'], [created[0].pk])
+
+    def test_has_more_pages_through_changes(self):
+        token = self.start_token()
+        files = [make_file(self.professor, f'Apunte {index}') for index in range(5)]
+        seen = set()
+        with override_settings(FILES_SYNC_MAX_CHANGES=2):
+            while True:
+                data = self.client.get(self.url, {'since': token}).data
+                seen.update(row['id'] for row in data['updated'])
+                token = data['sync_token']
+                if not data['has_more']:
+                    break
+        self.assertEqual(seen, {obj.id for obj in files})
+
+    @override_settings(FILES_SYNC_SETTLE_SECONDS=60)
+    def test_recent_changes_are_repeated_until_settled(self):
+        token = self.start_token()
+        new = make_file(self.professor, 'Nuevo')
+        first = self.client.get(self.url, {'since': token}).data
+        self.assertEqual([row['id'] for row in first['updated']], [new.id])
+        # El token no avanzó: el cambio vuelve a llegar
+        second = self.client.get(self.url, {'since': first['sync_token']}).data
+        self.assertEqual([row['id'] for row in second['updated']], [new.id])
+
+    def test_bad_and_expired_tokens(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'basura'}).status_code, 400)
+        token = self.start_token()
+        with override_settings(FILES_SYNC_RETENTION_DAYS=0):
+            self.assertEqual(self.client.get(self.url, {'since': token}).status_code, 410)
+
+    def test_prune_removes_old_changes(self):
+        make_file(self.professor, 'Viejo')
+        FileChange.objects.update(changed_at=timezone.now() - timedelta(days=60))
+        make_file(self.professor, 'Nuevo')
+        call_command('prune_file_changes', stdout=StringIO())
+        self.assertEqual(FileChange.objects.count(), 1)
+
+
+@override_settings(FILE_EVENTS_HEARTBEAT=0.05, FILES_SYNC_SETTLE_SECONDS=0)
+class FileEventsTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+
+    def commit_file(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_file(self.professor, title)
+
+    def commit_delete(self, file_obj):
+        with self.captureOnCommitCallbacks(execute=True):
+            ProfessorFile.objects.filter(pk=file_obj.pk).soft_delete()
+
+    @asynccontextmanager
+    async def open_stream(self, **headers):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.student).access_token))()
+        response = await self.async_client.get(
+            reverse('async_files_events'), headers={'Authorization': f"Bearer {token}", **headers}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            # El primer chunk (retry) abre la suscripción
+            self.assertTrue((await self.next_chunk(stream)).startswith('retry:'))
+            yield stream
+        finally:
+            # Cierra la suscripción, como cuando el cliente se desconecta
+            await stream.aclose()
+
+    async def next_chunk(self, stream):
+        return (await asyncio.wait_for(anext(stream), timeout=2)).decode()
+
+    async def next_event(self, stream):
+        while True:
+            chunk = await self.next_chunk(stream)
+            if not chunk.startswith(':'):
+                return dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+
+    async def test_pushes_uploads_and_deletes(self):
+        async with self.open_stream() as stream:
+            file_obj = await sync_to_async(self.commit_file)('En vivo')
+            event = await self.next_event(stream)
+            self.assertEqual(event['event'], 'file.upserted')
+            self.assertEqual(json.loads(event['data'])['title'], 'En vivo')
+
+            await sync_to_async(self.commit_delete)(file_obj)
+            event = await self.next_event(stream)
+            self.assertEqual((event['event'], json.loads(event['data'])), ('file.deleted', {'id': file_obj.id}))
+
+    async def test_heartbeat_keeps_idle_connection_alive(self):
+        async with self.open_stream() as stream:
+            self.assertEqual(await self.next_chunk(stream), ': ping\n\n')
+
+    async def test_resume_from_last_event_id(self):
+        first = await sync_to_async(make_file)(self.professor, 'Visto')
+        missed = await sync_to_async(make_file)(self.professor, 'Perdido')
+        last_seen = await FileChange.objects.filter(file_id=first.id).aget()
+
+        async with self.open_stream(**{'Last-Event-ID': str(last_seen.id)}) as stream:
+            event = await self.next_event(stream)
+            self.assertEqual(json.loads(event['data'])['id'], missed.id)
+            self.assertEqual(await self.next_chunk(stream), ': ping\n\n')
+
+    @override_settings(FILE_EVENTS_QUEUE_SIZE=1)
+    async def test_slow_client_is_disconnected(self):
+        async with self.open_stream() as stream:
+            events = [{'id': index, 'event': 'file.deleted', 'data': {'id': index}} for index in range(3)]
+            get_event_broker().publish(events)
+            await asyncio.sleep(0)
+            self.assertEqual((await self.next_event(stream))['id'], '0')
+            with self.assertRaises(StopAsyncIteration):
+                await self.next_chunk(stream)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse('async_files_events'))
+        self.assertEqual(response.status_code, 401)
+
+
+class FileSearchTests(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.other_professor = make_user('otra.profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+        cls.calculus = make_file(
+            cls.professor, 'Cálculo diferencial: guía', content_type='application/pdf', resource_type='raw'
+        )
+        cls.calculus_exam = make_file(
+            cls.other_professor, 'Examen de cálculo', content_type='image/png', resource_type='image'
+        )
+        cls.physics = make_file(cls.professor, 'Física I', content_type='application/pdf', resource_type='raw')
+        ProfessorFile.objects.filter(pk=cls.calculus.pk).update(uploaded_at=timezone.now() - timedelta(days=10))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.student)
+        self.url = reverse('files_manager')
+
+    def ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.data['data']]
+
+    def test_title_search_ignores_accents_and_matches_prefixes(self):
+        self.assertCountEqual(self.ids(q='calculo'), [self.calculus.id, self.calculus_exam.id])
+        self.assertEqual(self.ids(q='fís'), [self.physics.id])
+        self.assertEqual(self.ids(q='química'), [])
+
+    def test_results_are_ranked(self):
+        make_file(self.professor, 'Cálculo: cálculo integral y cálculo vectorial')
+        first = self.ids(q='cálculo')[0]
+        self.assertEqual(ProfessorFile.objects.get(pk=first).title, 'Cálculo: cálculo integral y cálculo vectorial')
+
+    def test_index_follows_title_edits_and_deletes(self):
+        self.physics.title = 'Química orgánica'
+        self.physics.save()
+        ProfessorFile.objects.filter(pk=self.calculus_exam.pk).soft_delete()
+        self.assertEqual(self.ids(q='química'), [self.physics.id])
+        self.assertEqual(self.ids(q='cálculo'), [self.calculus.id])
+
+    def test_filters_combine_with_search_and_cursor_listing(self):
+        self.assertEqual(self.ids(q='cálculo', professor=self.other_professor.id), [self.calculus_exam.id])
+        self.assertEqual(self.ids(type='raw'), [self.physics.id, self.calculus.id])
+        self.assertEqual(self.ids(type='image/'), [self.calculus_exam.id])
+        yesterday = (timezone.now() - timedelta(days=1)).date()
+        self.assertEqual(self.ids(type='application/pdf', uploaded_after=yesterday), [self.physics.id])
+        self.assertEqual(self.ids(uploaded_before=yesterday), [self.calculus.id])
+
+    def test_search_pages_with_cursor(self):
+        for index in range(4):
+            make_file(self.professor, f'Cálculo tema {index}')
+        seen, cursor = [], None
+        while True:
+            params = {'q': 'cálculo', 'page_size': 2, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(self.url, params)
+            seen += [row['id'] for row in response.data['data']]
+            cursor = response.data['next']
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+
+    def test_search_is_cached_per_query(self):
+        self.assertEqual(self.client.get(self.url, {'q': 'cálculo'})['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.url, {'q': 'física'})['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.url, {'q': 'cálculo'})['X-Cache'], 'HIT')
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.client.get(self.url, {'uploaded_after': 'ayer'}).status_code, 400)
+        response = self.client.get(self.url, {'uploaded_after': '2025-03-01', 'uploaded_before': '2025-02-01'})
+        self.assertIn('uploaded_before', response.data)
+        self.assertEqual(self.client.get(self.url, {'q': 'x', 'cursor': 'basura'}).status_code, 404)
+
+    def test_search_query_plan_uses_fts_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?", ['"calculo"*'])
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
+
+
+class CourseTests(LocalStorageMixin, BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+        cls.math = Course.objects.create(name='Matemática', code='MAT-1')
+        cls.history = Course.objects.create(name='Historia', code='HIS-1')
+        Enrollment.objects.create(user=cls.student, course=cls.math)
+        Enrollment.objects.create(user=cls.professor, course=cls.math)
+        cls.general = make_file(cls.professor, 'Reglamento')
+        cls.algebra = make_file(cls.professor, 'Álgebra', course=cls.math)
+        cls.revolution = make_file(cls.professor, 'Revolución', course=cls.history)
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('files_manager')
+        self.client.force_authenticate(self.student)
+
+    def ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {row['id'] for row in response.data['data']}
+
+    def test_students_only_see_their_courses_and_general_files(self):
+        self.assertEqual(self.ids(), {self.general.id, self.algebra.id})
+        self.assertEqual(self.ids(course=self.math.id), {self.algebra.id})
+        self.assertEqual(self.client.get(self.url, {'course': self.history.id}).status_code, 403)
+
+        self.client.force_authenticate(make_user('admin@ittac.com', is_staff=True))
+        self.assertEqual(self.ids(), {self.general.id, self.algebra.id, self.revolution.id})
+
+    def test_upload_requires_enrollment(self):
+        self.client.force_authenticate(self.professor)
+        for course, expected in ((self.history, 403), (self.math, 201)):
+            response = self.client.post(
+                self.url,
+                {'title': 'Guía', 'course': course.id, 'file': SimpleUploadedFile('guia.pdf', b'%PDF-1.4 guia')},
+                format='multipart',
+            )
+            self.assertEqual(response.status_code, expected, response.data)
+        self.assertEqual(response.data['course'], self.math.id)
+
+    def test_changes_in_other_courses_keep_cached_pages(self):
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_file(self.professor, 'Independencia', course=self.history)
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_file(self.professor, 'Geometría', course=self.math)
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+
+    def test_membership_checks_read_courses_once(self):
+        student = CustomUser.objects.get(pk=self.student.pk)
+        with self.assertNumQueries(1):
+            for _ in range(10):
+                self.assertTrue(can_access_course(student, self.math.id))
+                self.assertFalse(can_access_course(student, self.history.id))
+        # Otro request (otro objeto usuario) sale del caché
+        with self.assertNumQueries(0):
+            self.assertEqual(get_course_ids(CustomUser(pk=self.student.pk)), {self.math.id})
+
+    def test_enrollment_invalidates_cached_courses(self):
+        get_course_ids(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(user=self.student, course=self.history)
+        student = CustomUser.objects.get(pk=self.student.pk)
+        self.assertEqual(get_course_ids(student), {self.math.id, self.history.id})
+
+    def test_members_add_and_remove_invalidate_cached_courses(self):
+        def fresh_course_ids():
+            return get_course_ids(CustomUser.objects.get(pk=self.student.pk))
+
+        fresh_course_ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.history.members.add(self.student)
+        self.assertEqual(fresh_course_ids(), {self.math.id, self.history.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.courses.remove(self.history)
+        self.assertEqual(fresh_course_ids(), {self.math.id})
+
+        # delete() en lote, como la cascada al borrar un curso
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.filter(course=self.math).delete()
+        self.assertEqual(fresh_course_ids(), set())
+
+    def test_sync_feed_hides_other_courses_and_reports_moves_as_deletes(self):
+        changes_url = reverse('files_changes')
+        token = self.client.get(changes_url).data['sync_token']
+        make_file(self.professor, 'Independencia', course=self.history)
+        self.algebra.course = self.history
+        self.algebra.save()
+
+        with override_settings(FILES_SYNC_SETTLE_SECONDS=0):
+            response = self.client.get(changes_url, {'since': token})
+        self.assertEqual(response.data['updated'], [])
+        self.assertEqual(response.data['deleted'], [self.algebra.id])
+
+    def test_enrolling_invalidates_the_sync_token(self):
+        changes_url = reverse('files_changes')
+        token = self.client.get(changes_url).data['sync_token']
+        # Material de Historia anterior a la inscripción: no aparece en el registro que falta leer
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(user=self.student, course=self.history)
+        self.client.force_authenticate(CustomUser.objects.get(pk=self.student.pk))
+
+        response = self.client.get(changes_url, {'since': token})
+        self.assertEqual(response.status_code, 410)
+        fresh = self.client.get(changes_url).data['sync_token']
+        self.assertEqual(self.client.get(changes_url, {'since': fresh}).status_code, 200)
+
+    def test_event_replay_skips_other_courses(self):
+        with override_settings(FILES_SYNC_SETTLE_SECONDS=0):
+            events = replay_events(0, 100, self.student)
+        self.assertEqual({event['data']['id'] for event in events}, {self.general.id, self.algebra.id})
+
+
+REPLICA = 'replica_test'
+
+
+@override_settings(READ_REPLICA_ALIAS=REPLICA, READ_REPLICA_LAG_SECONDS=0)
+class ReadReplicaTests(BaseAPITestCase):
+    """
+    'default' y la réplica son dos SQLite distintas: la réplica se arma con una
+    copia (backup de SQLite) del esquema de 'default', y lo que se guarda solo
+    en 'default' hace de cambio que todavía no se replicó.
+    """
+    # '__all__' se resuelve en setUpClass, ya con el alias agregado
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # El alias se agrega solo para esta clase: en settings la réplica es un espejo
+        connections.settings[REPLICA] = connections.configure_settings({
+            'default': connections.settings['default'],
+            REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'file:memorydb_{REPLICA}?mode=memory&cache=shared'},
+        })[REPLICA]
+        connections['default'].ensure_connection()
+        connections[REPLICA].ensure_connection()
+        connections['default'].connection.backup(connections[REPLICA].connection)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = make_user('profe@ittac.com', role='PROFESSOR')
+        cls.student = make_user('alumno@ittac.com')
+        for user in (cls.professor, cls.student):
+            user.save(using=REPLICA)
+        cls.replicated = make_file(cls.professor, 'Replicado')
+        cls.replicated.save(using=REPLICA)
+        cls.lagging = make_file(cls.professor, 'Sin replicar')
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('files_manager')
+
+    def ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {row['id'] for row in response.data['data']}
+
+    def test_safe_reads_go_to_the_replica(self):
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.ids(), {self.replicated.id})
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        self.client.force_authenticate(self.professor)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"{self.url}?id={self.replicated.id}")
+        self.assertEqual(response.status_code, 204)
+        cookie = response.cookies[settings.READ_REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.READ_REPLICA_PIN_SECONDS)
+
+        # Lee lo que acaba de escribir
+        self.assertEqual(self.ids(), {self.lagging.id})
+        # Vencida la cookie vuelve a la réplica (otro tamaño de página: otra llave de caché)
+        del self.client.cookies[settings.READ_REPLICA_PIN_COOKIE]
+        self.assertEqual(self.ids(page_size=10), {self.replicated.id})
+
+    def test_reads_without_writes_set_no_cookie(self):
+        self.client.force_authenticate(self.student)
+        self.assertNotIn(settings.READ_REPLICA_PIN_COOKIE, self.client.get(self.url).cookies)
+
+    @override_settings(READ_REPLICA_LAG_SECONDS=60)
+    def test_recent_changes_are_listed_from_the_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_file(self.professor, 'Recién subido')
+        self.client.force_authenticate(self.student)
+        self.assertIn(self.lagging.id, self.ids())
+
+    def test_router_reads_from_primary_after_a_write(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(ProfessorFile))
+        state, token = start_routing()
+        try:
+            state.alias = REPLICA
+            self.assertEqual(router.db_for_read(ProfessorFile), REPLICA)
+            ProfessorFile.objects.filter(pk=self.lagging.pk).update(title='Editado')
+            self.assertEqual(router.db_for_read(ProfessorFile), 'default')
+        finally:
+            end_routing(token)
+
+    async def test_async_list_reads_from_the_replica(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.student).access_token))()
+        response = await self.async_client.get(
+            reverse('async_files_manager'), headers={'Authorization': f"Bearer {token}"}
+        )
+        self.assertEqual({row['id'] for row in json.loads(response.content)['data']}, {self.replicated.id})
+
+    def test_migrations_only_run_on_the_primary(self):
+        router = ReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'tasks'))
+        self.assertFalse(router.allow_migrate(REPLICA, 'tasks'))
+
+    def test_user_and_course_caches_refill_from_the_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.is_active = False
+            self.student.save()
+        token = str(RefreshToken.for_user(self.student).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        # En la réplica todavía está activo
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+        course = Course.objects.create(name='Matemática', code='MAT-1')
+        Enrollment.objects.create(user=self.professor, course=course)
+        state, token = start_routing()
+        try:
+            state.alias = REPLICA
+            self.assertEqual(get_course_ids(CustomUser(pk=self.professor.pk)), {course.id})
+        finally:
+            end_routing(token)
@@ -0,0 +1,90 @@
+"""
+Throttling de login y reset de contraseña con token bucket.
+
+Cada vista define throttle_scope (p. ej. 'login') y se aplican dos cubetas:
+una por IP ('login_ip') y otra por correo ('login_email'), con las tasas de
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']. Una cubeta de "5/min" permite una
+ráfaga de 5 intentos y se rellena a 5 por minuto, así un usuario que se
+equivoca un par de veces no queda bloqueado un minuto entero.
+
+El estado vive en THROTTLE_CACHE_ALIAS; con varios workers tiene que ser un
+caché compartido o cada proceso tendría su propia cubeta.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket sobre el caché de Django. Guarda (fichas, timestamp) por
+    llave; leer y escribir no es atómico, así que con mucha concurrencia
+    pueden pasar unas pocas solicitudes de más, nunca de menos.
+    """
+    scope_suffix = None
+
+    def __init__(self):
+        self.wait_time = None
+        super().__init__()
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+    def get_rate(self):
+        # Se lee en cada request (y no al importar) para respetar override_settings
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        self.scope = f"{scope}_{self.scope_suffix}"
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        tokens, updated = self.cache.get(self.key, (self.num_requests, now))
+        refill = (now - updated) * self.num_requests / self.duration
+        tokens = min(self.num_requests, tokens + refill)
+        if tokens < 1:
+            self.wait_time = (1 - tokens) * self.duration / self.num_requests
+            return False
+        self.cache.set(self.key, (tokens - 1, now), self.duration)
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    scope_suffix = 'ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class EmailTokenBucketThrottle(TokenBucketThrottle):
+    scope_suffix = 'email'
+
+    def get_cache_key(self, request, view):
+        # Las vistas async no tienen request.data; leen el cuerpo con view.get_data()
+        data = request.data if hasattr(request, 'data') else view.get_data(request)
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not email or not isinstance(email, str):
+            return None
+        # Sin correos en claro en las llaves del caché
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+CREDENTIAL_THROTTLES = [IPTokenBucketThrottle, EmailTokenBucketThrottle]
@@ -0,0 +1,143 @@
+"""
+Refresh de JWT con la lista negra en la BD y un atajo en caché.
+
+Con ROTATE_REFRESH_TOKENS + BLACKLIST_AFTER_ROTATION cada refresh usa su token
+una sola vez:
+
+- El token se "reclama" con cache.add(): si ya estaba reclamado (rotado o
+  deslogueado en este caché) el refresh se rechaza sin ir a la BD.
+- Si el caché no lo conoce (otro worker, o la llave se desalojó) se consulta
+  BlacklistedToken antes de aceptarlo: la BD es la que manda.
+- El token rotado se escribe en la lista negra en el mismo request, con la
+  misma consulta que lo revisa: un SELECT trae su OutstandingToken y si ya
+  está en la lista negra, y un INSERT lo agrega (la unique de BlacklistedToken
+  resuelve dos refresh simultáneos del mismo token). Solo los
+  OutstandingToken de los tokens nuevos, que no revocan nada, se juntan en
+  memoria y se escriben con bulk_create cada JWT_BOOKKEEPING_BATCH_SIZE tokens
+  o cada JWT_BOOKKEEPING_FLUSH_INTERVAL segundos.
+"""
+import atexit
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+def get_token_cache():
+    return caches[getattr(settings, 'JWT_BLACKLIST_CACHE_ALIAS', 'default')]
+
+
+def blacklist_key(jti):
+    return f"jwt:bl:{jti}"
+
+
+def _ttl(exp):
+    return max(int(exp - time.time()), 1)
+
+
+def mark_blacklisted(token):
+    get_token_cache().set(blacklist_key(token[api_settings.JTI_CLAIM]), 1, timeout=_ttl(token['exp']))
+
+
+def claim_refresh_token(token, blacklist=False):
+    """
+    Marca el refresh token como usado. Devuelve False si ya lo estaba o si
+    la BD dice que está en la lista negra. Con 'blacklist' además lo escribe
+    en la lista negra (rotación), aprovechando la misma consulta.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    if not get_token_cache().add(blacklist_key(jti), 1, timeout=_ttl(token['exp'])):
+        return False
+    row = next(iter(OutstandingToken.objects.filter(jti=jti).order_by().values_list('id', 'blacklistedtoken')[:1]), None)
+    if row is not None and row[1] is not None:
+        return False
+    if blacklist:
+        return blacklist_token(token, token_id=row[0] if row else None)
+    return True
+
+
+def outstanding_row(token):
+    return OutstandingToken(
+        jti=token[api_settings.JTI_CLAIM],
+        user_id=token.get(api_settings.USER_ID_CLAIM),
+        token=str(token),
+        created_at=timezone.now(),
+        expires_at=datetime_from_epoch(token['exp']),
+    )
+
+
+def _insert(obj):
+    """INSERT de una fila; False si choca con una unique."""
+    # Fuera de una transacción el INSERT ya es atómico; dentro hace falta un
+    # savepoint para poder seguir después del error
+    using = router.db_for_write(type(obj))
+    try:
+        with transaction.atomic(using=using) if transaction.get_connection(using).in_atomic_block else nullcontext():
+            obj.save(force_insert=True, using=using)
+    except IntegrityError:
+        return False
+    return True
+
+
+def blacklist_token(token, token_id=None):
+    """
+    Escribe el token en la lista negra ya mismo: un INSERT si ya se conoce su
+    OutstandingToken, dos si no. Devuelve False si ya estaba.
+    """
+    if token_id is None:
+        outstanding = outstanding_row(token)
+        if _insert(outstanding):
+            token_id = outstanding.pk
+        else:
+            # Lo acaba de escribir el lote de otro worker
+            token_id = OutstandingToken.objects.filter(jti=outstanding.jti).values_list('id', flat=True).first()
+    return _insert(BlacklistedToken(token_id=token_id))
+
+
+class TokenBookkeeping:
+    """Acumula las filas de OutstandingToken de los tokens nuevos y las inserta por lotes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._outstanding = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, token):
+        row = outstanding_row(token)
+        with self._lock:
+            self._outstanding.setdefault(row.jti, row)
+            batch_size = getattr(settings, 'JWT_BOOKKEEPING_BATCH_SIZE', 200)
+            interval = getattr(settings, 'JWT_BOOKKEEPING_FLUSH_INTERVAL', 5)
+            due = (
+                len(self._outstanding) >= batch_size
+                or time.monotonic() - self._last_flush >= interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            outstanding, self._outstanding = list(self._outstanding.values()), {}
+            self._last_flush = time.monotonic()
+        if not outstanding:
+            return 0
+        # Una consulta por lote; si alguno ya se escribió al ir a la lista negra, se saltea
+        OutstandingToken.objects.bulk_create(outstanding, ignore_conflicts=True)
+        return len(outstanding)
+
+
+bookkeeping = TokenBookkeeping()
+atexit.register(bookkeeping.flush)
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    def verify(self, *args, **kwargs):
+        # Firma, exp, jti y tipo como siempre; la lista negra la resuelve claim_refresh_token()
+        Token.verify(self, *args, **kwargs)
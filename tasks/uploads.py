@@ -0,0 +1,109 @@
+"""
+Manejo de subidas grandes con memoria acotada.
+
+StreamingUploadHandler recibe el cuerpo multipart por pedazos y lo guarda en un
+SpooledTemporaryFile: mientras el request no pase FILE_UPLOAD_MEMORY_CAP bytes
+se queda en memoria, a partir de ahí se vuelca a un archivo temporal. Así varios
+profesores subiendo videos a la vez no hacen crecer la memoria del worker.
+
+De paso calcula el SHA-256 de cada archivo mientras llega, para deduplicar sin
+volver a leerlo.
+"""
+import hashlib
+import mimetypes
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+def get_memory_cap():
+    return getattr(settings, 'FILE_UPLOAD_MEMORY_CAP', 2621440)
+
+
+def get_storage_chunk_size():
+    return getattr(settings, 'STORAGE_UPLOAD_CHUNK_SIZE', 6 * 1024 * 1024)
+
+
+class SpooledUploadedFile(UploadedFile):
+    """Archivo subido respaldado por un SpooledTemporaryFile."""
+
+    def __init__(self, name, content_type, size, charset, max_size, content_type_extra=None):
+        if max_size > 0:
+            file = tempfile.SpooledTemporaryFile(max_size=max_size, dir=settings.FILE_UPLOAD_TEMP_DIR)
+        else:
+            # Sin presupuesto de memoria: directo a disco
+            file = tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR)
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+
+    @property
+    def in_memory(self):
+        return not getattr(self.file, '_rolled', True)
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """
+    Handler de subida con tope de memoria por request (no por archivo): el
+    presupuesto se reparte entre todos los archivos del mismo multipart.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.chunk_size = getattr(settings, 'FILE_UPLOAD_CHUNK_SIZE', self.chunk_size)
+        self.memory_budget = get_memory_cap()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = SpooledUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            max_size=self.memory_budget, content_type_extra=self.content_type_extra,
+        )
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.write(raw_data)
+        self.hasher.update(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hasher.hexdigest()
+        if self.file.in_memory:
+            self.memory_budget -= file_size
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+def iter_chunks(fileobj, chunk_size=None):
+    """Lee un archivo en bloques de tamaño fijo, sin cargarlo entero."""
+    chunk_size = chunk_size or get_storage_chunk_size()
+    if hasattr(fileobj, 'seek'):
+        fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def file_digest(fileobj):
+    """SHA-256 del archivo; si el handler ya lo calculó al recibirlo, no se relee."""
+    digest = getattr(fileobj, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in iter_chunks(fileobj):
+        hasher.update(chunk)
+    fileobj.seek(0)
+    return hasher.hexdigest()
+
+
+def guess_content_type(fileobj):
+    content_type = getattr(fileobj, 'content_type', None)
+    if content_type:
+        return content_type
+    return mimetypes.guess_type(getattr(fileobj, 'name', '') or '')[0] or 'application/octet-stream'
@@ -10,6 +10,10 @@ from rest_framework_simplejwt.views import (
 )
 
 from .views import LoginView, FileManagementView , LogoutView , PasswordResetRequestView ,PasswordResetConfirmView
+from .views import FileCacheStatsView, UploadTicketView, UploadCompleteView, LocalStorageUploadView
+from .views import UploadSessionCreateView, UploadSessionView, UploadSessionFinalizeView
+from .views import FileBatchUploadView, FileChangesView, RefreshView
+from .async_views import AsyncFileEventsView, AsyncFileManagementView, AsyncLoginView, AsyncPasswordResetRequestView
 # from .views import create_admin_temporal
 #from .views import RegisterView
 
@@ -24,15 +28,34 @@ urlpatterns = [
     # 2. Login (Authentication) - Returns access and refresh tokens
     path('auth/login/', LoginView.as_view(), name='token_obtain_pair'),
     # 3. Token Refresh - Get a new access token using a valid refresh token
-    path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/refresh/', RefreshView.as_view(), name='token_refresh'),
     
     path('auth/logout/', LogoutView.as_view(), name='auth_logout'),
     
     
     # 4. Redirect t the place where the teachers uppload archives 
     path('api/files/', FileManagementView.as_view(), name='files_manager'),
+    path('api/files/batch/', FileBatchUploadView.as_view(), name='files_batch_upload'),
+    # Sincronización incremental: solo lo que cambió desde el sync_token
+    path('api/files/changes/', FileChangesView.as_view(), name='files_changes'),
+    path('api/files/cache-stats/', FileCacheStatsView.as_view(), name='files_cache_stats'),
+    # Subida directa: ticket firmado -> el cliente sube al almacenamiento -> confirmación
+    path('api/files/upload-ticket/', UploadTicketView.as_view(), name='files_upload_ticket'),
+    path('api/files/upload-complete/', UploadCompleteView.as_view(), name='files_upload_complete'),
+    path('api/files/local-upload/', LocalStorageUploadView.as_view(), name='files_local_upload'),
+    # Subidas reanudables: crear sesión -> PATCH por rangos -> finalizar
+    path('api/files/uploads/', UploadSessionCreateView.as_view(), name='files_upload_sessions'),
+    path('api/files/uploads/<uuid:session_id>/', UploadSessionView.as_view(), name='files_upload_session'),
+    path('api/files/uploads/<uuid:session_id>/finalize/', UploadSessionFinalizeView.as_view(), name='files_upload_finalize'),
     # path('api/files/download/<int:file_id>/', FileDownloadView.as_view(), name='file_download'),
    path('auth/password-reset/', PasswordResetRequestView.as_view(), name='password_reset'),
    path('auth/password-reset-confirm/', PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
+
+    # Versiones async de los mismos endpoints, para servir con ASGI (uvicorn)
+    path('async/auth/login/', AsyncLoginView.as_view(), name='async_token_obtain_pair'),
+    path('async/auth/password-reset/', AsyncPasswordResetRequestView.as_view(), name='async_password_reset'),
+    path('async/api/files/', AsyncFileManagementView.as_view(), name='async_files_manager'),
+    # Altas y bajas en vivo (Server-Sent Events) en lugar de consultar el listado cada tanto
+    path('async/api/files/events/', AsyncFileEventsView.as_view(), name='async_files_events'),
    
 ]
\ No newline at end of file
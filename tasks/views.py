@@ -1,15 +1,45 @@
 from django.shortcuts import render, HttpResponse, redirect
-from rest_framework import status, permissions
+from rest_framework import status, permissions, serializers
 from rest_framework.views import APIView
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.permissions import BasePermission
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 # Importaciones de tu app
-from .models import CustomUser, ProfessorFile 
+from .models import CustomUser, FileChange, ProfessorFile, UploadSession
 from .serializers import CustomTokenObtainPairSerializer, ProfessorFileSerializer, PasswordResetRequestSerializer, PasswordResetConfirmSerializer
-from .permissions import IsStudentOrProfessor, IsStudent
+from .serializers import UploadCompleteSerializer, UploadSessionSerializer, CachedTokenRefreshSerializer, FileSearchSerializer
+from .serializers import validate_course_choice
+from .permissions import IsStudentOrProfessor, IsStudent, IsProfessor, IsCourseMember
+from .permissions import can_access_course, listing_scopes, visible_files_filter
+from .storage import StorageError, get_file_storage, new_public_id, sign_upload_ticket, store_upload
+from .storage import find_stored_files, upload_new_file
+from .uploads import file_digest, iter_chunks
+from .pagination import FileCursorPagination, FileSearchPagination
+from .replicas import avoid_replica_lag
+from .search import apply_filters
+from . import cache as files_cache
+from .outbox import enqueue_email
+from .throttling import CREDENTIAL_THROTTLES
+from .metrics import registry as metrics_registry, track
+from .authentication import CachedJWTAuthentication
+from .sync import SyncScopeChanged, decode_sync_token, encode_sync_token, get_changes, head_change_id
+
+import contextvars
+import os
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core import signing
+from django.core.files import File
+from django.http import UnreadablePostError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.urls import reverse
 
 # Para el reset de password
 from django.contrib.auth.tokens import default_token_generator
@@ -18,6 +48,7 @@ from django.utils.encoding import force_bytes, force_str
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from django.utils.cache import get_conditional_response
 from django.conf import settings
 from django.core.mail import send_mail, EmailMultiAlternatives # Añade send_mail
 
@@ -30,6 +61,15 @@ class LoginView(TokenObtainPairView):
     Endpoint de Login. Devuelve Access Token, Refresh Token y Datos del Usuario.
     """
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = CREDENTIAL_THROTTLES
+    throttle_scope = 'login'
+
+class RefreshView(TokenRefreshView):
+    """
+    Refresh de tokens. La lista negra se consulta en caché y los registros de
+    OutstandingToken/BlacklistedToken se escriben por lotes.
+    """
+    serializer_class = CachedTokenRefreshSerializer
 
 def index(request):
     return HttpResponse("Backend Ittac Running")
@@ -50,50 +90,514 @@ class IsProfessorOrReadOnly(BasePermission):
 # 3. FILE MANAGEMENT VIEW
 # ==========================================
 
+def add_list_validators(response, etag):
+    # Sin Last-Modified: la hora del último cambio del caché (en segundos) no
+    # sirve de validador, un cambio en el mismo segundo daría un 304 viejo.
+    # Sin ETag cuando el caché es del proceso (files_cache.get_files_state)
+    if etag:
+        response['ETag'] = etag
+    # Datos de usuarios autenticados: el navegador puede guardarlos pero debe revalidar
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def parse_file_ids(query_params, data):
+    """
+    IDs a borrar: acepta ?id=1, ?id=1&id=2, ?ids=1,2,3 o un JSON {"ids": [1, 2, 3]}.
+    Lanza ValueError con el mensaje para el cliente.
+    """
+    raw_ids = query_params.getlist('id')
+    for value in query_params.getlist('ids'):
+        raw_ids.extend(value.split(','))
+    if isinstance(data, dict) and isinstance(data.get('ids'), list):
+        raw_ids.extend(data['ids'])
+    # '?id=' o '?ids=,,' no traen ningún ID: es el mismo error que no mandar nada
+    raw_ids = [value for value in raw_ids if str(value).strip()]
+    if not raw_ids:
+        raise ValueError("Falta el ID (?id=1)")
+    try:
+        return {int(value) for value in raw_ids}
+    except (TypeError, ValueError):
+        raise ValueError("Los IDs deben ser números.")
+
+
 class FileManagementView(APIView):
-    permission_classes = [IsProfessorOrReadOnly]
-    parser_classes = [MultiPartParser, FormParser]
+    # Cada usuario ve los archivos generales y los de sus cursos (?course= para uno solo)
+    permission_classes = [IsProfessorOrReadOnly, IsCourseMember]
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
 
     def get(self, request):
-        # Traemos todos los archivos ordenados por fecha
-        files = ProfessorFile.objects.all().order_by('-uploaded_at') 
-        
+        search = FileSearchSerializer(data=request.query_params)
+        if not search.is_valid():
+            return Response(search.errors, status=status.HTTP_400_BAD_REQUEST)
+        filters = search.validated_data
+        # Con ?q= se ordena por relevancia; si no, por fecha con cursor (keyset)
+        paginator = FileSearchPagination(filters['q']) if filters['q'] else FileCursorPagination()
+
+        cursor = request.query_params.get(paginator.cursor_query_param)
+        page_size = paginator.get_page_size(request)
+        # Caché por curso: una subida en otro curso no invalida estas páginas
+        version, last_modified = files_cache.get_files_state(listing_scopes(request.user, filters.get('course')))
+        # Recién cambiado: la réplica puede no tenerlo y la página quedaría cacheada así
+        avoid_replica_lag(last_modified)
+
+        # Si el cliente ya tiene esta versión de la página, 304 sin serializar nada
+        etag = files_cache.page_etag(version, cursor, page_size, filters)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return self.add_validators(not_modified, etag)
+
+        # Si la página ya está en caché (y nadie subió/borró nada) no tocamos la BD
+        cache_key, payload = files_cache.get_cached_page(version, cursor, page_size, filters)
+        if payload is not None:
+            response = Response(payload, status=status.HTTP_200_OK)
+            response['X-Cache'] = 'HIT'
+            return self.add_validators(response, etag)
+
+        # Traemos los archivos por páginas (cursor), del más nuevo al más viejo.
+        # select_related evita un SELECT extra por fila para uploaded_by.email
+        files = apply_filters(ProfessorFile.objects.select_related('uploaded_by'), filters)
+        visible = visible_files_filter(request.user)
+        if visible is not None and not filters.get('course'):
+            files = files.filter(visible)
+        page = paginator.paginate_queryset(files, request, view=self)
+
         # El serializer hará todo el trabajo sucio con el download_url
-        serializer = ProfessorFileSerializer(files, many=True)
-        
-        return Response({
+        serializer = ProfessorFileSerializer(page, many=True)
+        with track('serialize'):
+            data = serializer.data
+
+        payload = {
             "message": "Lista de archivos cargada correctamente",
-            "count": files.count(),
-            "data": serializer.data
-        }, status=status.HTTP_200_OK)
+            # Filas de esta página ('count' era el total: un COUNT(*) recorría toda la tabla)
+            "page_count": len(page),
+            "next": paginator.get_next_cursor(),
+            "data": data
+        }
+        files_cache.set_cached_page(cache_key, payload)
+
+        response = Response(payload, status=status.HTTP_200_OK)
+        response['X-Cache'] = 'MISS'
+        return self.add_validators(response, etag)
+
+    def add_validators(self, response, etag):
+        return add_list_validators(response, etag)
 
     def post(self, request):
         # Se mantiene igual: Solo profesores pueden subir
-        serializer = ProfessorFileSerializer(data=request.data)
+        serializer = ProfessorFileSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save(uploaded_by=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request):
-        # Se mantiene igual: Solo el dueño puede borrar su archivo
-        file_id = request.query_params.get('id') 
-        if not file_id:
-            return Response({"error": "Falta el ID (?id=1)"}, status=status.HTTP_400_BAD_REQUEST)
-
         try:
-            # Aquí mantenemos el filtro 'uploaded_by=request.user' por seguridad:
-            # Aunque todos vean todo, no queremos que un Profe borre archivos de otro.
-            file_obj = ProfessorFile.objects.get(id=file_id, uploaded_by=request.user)
-            file_obj.delete()
-            return Response({"message": "Archivo eliminado correctamente."}, status=status.HTTP_204_NO_CONTENT)
-            
-        except ProfessorFile.DoesNotExist:
+            file_ids = parse_file_ids(request.query_params, request.data)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Aquí mantenemos el filtro 'uploaded_by=request.user' por seguridad:
+        # Aunque todos vean todo, no queremos que un Profe borre archivos de otro.
+        # Una sola consulta autoriza todos los IDs, un solo UPDATE los borra (lógicamente)
+        # y un INSERT deja las lápidas para la sincronización incremental;
+        # el asset remoto lo elimina el worker purge_deleted_files, fuera del request.
+        owned = ProfessorFile.objects.filter(id__in=file_ids, uploaded_by=request.user)
+        deleted = set(owned.soft_delete())
+        if not deleted:
             return Response(
-                {"error": "Archivo no encontrado o no tienes permiso para borrarlo."}, 
+                {"error": "Archivo no encontrado o no tienes permiso para borrarlo."},
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        not_found = sorted(file_ids - deleted)
+        if not_found:
+            return Response({
+                "message": "Algunos archivos no se pudieron eliminar.",
+                "deleted": sorted(deleted),
+                "not_found": not_found
+            }, status=status.HTTP_200_OK)
+        return Response({"message": "Archivo eliminado correctamente."}, status=status.HTTP_204_NO_CONTENT)
+
+# ==========================================
+# 4. SUBIDA DIRECTA AL ALMACENAMIENTO
+# ==========================================
+# El archivo no pasa por el worker: el profesor pide un ticket firmado, sube
+# directo a Cloudinary (o al backend configurado) y luego confirma la subida.
+
+class UploadTicketView(APIView):
+    permission_classes = [IsProfessor]
+
+    def post(self, request):
+        public_id = new_public_id()
+        upload = get_file_storage().upload_ticket(public_id)
+        return Response({
+            "ticket": sign_upload_ticket(request.user.id, public_id),
+            "expires_in": settings.UPLOAD_TICKET_MAX_AGE,
+            **upload
+        }, status=status.HTTP_201_CREATED)
+
+
+class UploadCompleteView(APIView):
+    permission_classes = [IsProfessor]
+
+    def post(self, request):
+        serializer = UploadCompleteSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            file_obj = serializer.save()
+            return Response(ProfessorFileSerializer(file_obj).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class LocalStorageUploadView(APIView):
+    """
+    Hace de "proveedor" cuando FILE_STORAGE_BACKEND es el almacenamiento local.
+    La autorización es la firma del ticket, igual que en Cloudinary.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        storage = get_file_storage()
+        if not hasattr(storage, 'accept_upload'):
+            return Response({"error": "No disponible con este almacenamiento."}, status=status.HTTP_404_NOT_FOUND)
+        if 'file' not in request.FILES:
+            return Response({"error": "Falta el archivo."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = storage.accept_upload(request.data, request.FILES['file'])
+        except StorageError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class FileBatchUploadView(APIView):
+    """
+    Sube muchos archivos en un solo multipart (campo 'files', y opcionalmente
+    'titles' en el mismo orden; 'course' para todo el lote). Se validan todos
+    primero, los nuevos se mandan al almacenamiento en paralelo y las filas se
+    insertan con un solo bulk_create. La respuesta trae el resultado de cada archivo.
+    """
+    permission_classes = [IsProfessor]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        uploads = request.FILES.getlist('files')
+        titles = request.data.getlist('titles')
+        max_files = settings.BATCH_UPLOAD_MAX_FILES
+        if not uploads:
+            return Response({"error": "No se enviaron archivos (campo 'files')."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(uploads) > max_files:
+            return Response({"error": f"Máximo {max_files} archivos por envío."}, status=status.HTTP_400_BAD_REQUEST)
+        course_field = serializers.IntegerField(allow_null=True, min_value=1)
+        try:
+            course_id = validate_course_choice(request.user, course_field.run_validation(request.data.get('course') or None))
+        except serializers.ValidationError as exc:
+            return Response({"course": exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 1. Validamos todo antes de mandar un solo byte al almacenamiento
+        results = [None] * len(uploads)
+        pending = []
+        for index, upload in enumerate(uploads):
+            title = titles[index] if index < len(titles) and titles[index] else upload.name
+            if upload.size == 0:
+                results[index] = {"name": upload.name, "status": "error", "error": "El archivo está vacío."}
+            elif len(title) > 255:
+                results[index] = {"name": upload.name, "status": "error", "error": "El título es demasiado largo."}
+            else:
+                pending.append((index, upload, title, file_digest(upload)))
+
+        # 2. Lo que ya está guardado (o repetido dentro del mismo envío) no se vuelve a subir
+        stored = find_stored_files(digest for _, _, _, digest in pending)
+        to_upload = {}
+        for _, upload, _, digest in pending:
+            if digest not in stored:
+                to_upload.setdefault(digest, upload)
+
+        failures = {}
+        if to_upload:
+            workers = min(settings.BATCH_UPLOAD_WORKERS, len(to_upload))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    # copy_context(): el tiempo de cada subida cuenta para Server-Timing
+                    digest: pool.submit(contextvars.copy_context().run, upload_new_file, upload, digest)
+                    for digest, upload in to_upload.items()
+                }
+            for digest, future in futures.items():
+                try:
+                    stored[digest] = future.result()
+                except StorageError as exc:
+                    failures[digest] = str(exc)
+
+        # 3. Una sola inserción para todas las filas
+        rows = []
+        for index, upload, title, digest in pending:
+            if digest in stored:
+                rows.append((index, ProfessorFile(uploaded_by=request.user, title=title, course_id=course_id, **stored[digest])))
+            else:
+                results[index] = {"name": upload.name, "status": "error", "error": failures[digest]}
+
+        if rows:
+            created = ProfessorFile.objects.bulk_create([obj for _, obj in rows])
+            # bulk_create no pasa por save(): invalidamos el listado y anotamos los cambios a mano
+            FileChange.record([(obj.pk, course_id) for obj in created], FileChange.UPSERT)
+            files_cache.bump_files_version_on_commit([files_cache.course_scope(course_id)])
+            for (index, _), obj in zip(rows, created):
+                results[index] = {
+                    "name": uploads[index].name,
+                    "status": "created",
+                    "file": ProfessorFileSerializer(obj).data,
+                }
+
+        if not rows:
+            status_code = status.HTTP_400_BAD_REQUEST
+        elif len(rows) < len(uploads):
+            status_code = status.HTTP_207_MULTI_STATUS
+        else:
+            status_code = status.HTTP_201_CREATED
+        return Response({
+            "created": len(rows),
+            "failed": len(uploads) - len(rows),
+            "results": results
+        }, status=status_code)
+
+
+# ==========================================
+# 5. SUBIDAS REANUDABLES (estilo tus)
+# ==========================================
+# 1) POST uploads/ crea la sesión con el tamaño total.
+# 2) PATCH uploads/<id>/ con Upload-Offset agrega bytes; si se corta la conexión
+#    el cliente pregunta el offset (HEAD/GET) y manda solo lo que falta.
+# 3) POST uploads/<id>/finalize/ envía el archivo al almacenamiento.
+
+class UploadSessionMixin:
+    def get_session(self, request, session_id):
+        try:
+            session = UploadSession.objects.get(id=session_id, uploaded_by=request.user)
+        except UploadSession.DoesNotExist:
+            return None, Response({"error": "Sesión de subida no encontrada."}, status=status.HTTP_404_NOT_FOUND)
+        if session.is_expired:
+            session.discard()
+            return None, Response({"error": "La sesión de subida expiró."}, status=status.HTTP_410_GONE)
+        return session, None
+
+    def offset_response(self, session, status_code=status.HTTP_200_OK, data=None):
+        response = Response(data, status=status_code)
+        response['Upload-Offset'] = str(session.offset)
+        response['Upload-Length'] = str(session.length)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class UploadSessionCreateView(APIView):
+    permission_classes = [IsProfessor, IsCourseMember]
+
+    def post(self, request):
+        data = request.data.copy()
+        if 'length' not in data and 'HTTP_UPLOAD_LENGTH' in request.META:
+            data['length'] = request.META['HTTP_UPLOAD_LENGTH']
+        serializer = UploadSessionSerializer(data=data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        session = serializer.save(uploaded_by=request.user)
+        os.makedirs(str(settings.RESUMABLE_UPLOAD_DIR), exist_ok=True)
+        open(session.part_path, 'wb').close()
+
+        response = Response(serializer.data, status=status.HTTP_201_CREATED)
+        response['Location'] = reverse('files_upload_session', args=[session.id])
+        response['Upload-Offset'] = '0'
+        return response
+
+
+class UploadSessionView(UploadSessionMixin, APIView):
+    permission_classes = [IsProfessor]
+
+    def get(self, request, session_id):
+        session, error = self.get_session(request, session_id)
+        if error:
+            return error
+        return self.offset_response(session, data=UploadSessionSerializer(session).data)
+
+    def head(self, request, session_id):
+        session, error = self.get_session(request, session_id)
+        if error:
+            return error
+        return self.offset_response(session)
+
+    def patch(self, request, session_id):
+        try:
+            client_offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+        except (KeyError, ValueError):
+            return Response({"error": "Falta el header Upload-Offset."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Tomamos la sesión con un UPDATE condicional (un lease) en vez de
+        # select_for_update: leer el cuerpo puede tardar lo que tarde el
+        # cliente y no queremos una transacción abierta todo ese tiempo
+        now = timezone.now()
+        lease = now + timedelta(seconds=settings.RESUMABLE_UPLOAD_LEASE_SECONDS)
+        sessions = UploadSession.objects.filter(id=session_id, uploaded_by=request.user)
+        claimed = sessions.filter(offset=client_offset, expires_at__gt=now).filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lte=now)
+        ).update(locked_until=lease)
+        session = sessions.first()
+        if session is None:
+            return Response({"error": "Sesión de subida no encontrada."}, status=status.HTTP_404_NOT_FOUND)
+        if not claimed:
+            if session.is_expired:
+                return Response({"error": "La sesión de subida expiró."}, status=status.HTTP_410_GONE)
+            if client_offset != session.offset:
+                return self.offset_response(
+                    session, status.HTTP_409_CONFLICT, {"error": "El offset no coincide con el del servidor."}
+                )
+            return self.offset_response(
+                session, status.HTTP_409_CONFLICT, {"error": "Hay otra subida en curso para esta sesión."}
+            )
+
+        remaining = session.length - client_offset
+        received = 0
+        # Leemos el cuerpo crudo por bloques, sin pasar por los parsers de DRF
+        with open(session.part_path, 'r+b') as part:
+            part.seek(client_offset)
+            try:
+                for chunk in iter_chunks(request.stream or BytesIO(), settings.FILE_UPLOAD_CHUNK_SIZE):
+                    chunk = chunk[:remaining - received]
+                    part.write(chunk)
+                    received += len(chunk)
+                    if received == remaining:
+                        break
+                    # Renovamos el lease si va por la mitad, con otro UPDATE corto
+                    if timezone.now() >= lease - timedelta(seconds=settings.RESUMABLE_UPLOAD_LEASE_SECONDS / 2):
+                        renewed = timezone.now() + timedelta(seconds=settings.RESUMABLE_UPLOAD_LEASE_SECONDS)
+                        if not sessions.filter(locked_until=lease).update(locked_until=renewed):
+                            break
+                        lease = renewed
+            except UnreadablePostError:
+                # Se cortó la conexión: guardamos lo que sí llegó y el cliente reanuda
+                pass
+            part.truncate(client_offset + received)
+
+        # Solo avanza si nadie nos quitó el lease ni movió el offset
+        advanced = sessions.filter(offset=client_offset, locked_until=lease).update(
+            offset=client_offset + received, locked_until=None
+        )
+        if advanced:
+            session.offset = client_offset + received
+        else:
+            session.refresh_from_db(fields=['offset'])
+            return self.offset_response(
+                session, status.HTTP_409_CONFLICT, {"error": "Se perdió la sesión de subida; consulta el offset."}
+            )
+        return self.offset_response(session, status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionFinalizeView(UploadSessionMixin, APIView):
+    permission_classes = [IsProfessor]
+
+    def post(self, request, session_id):
+        session, error = self.get_session(request, session_id)
+        if error:
+            return error
+        if not session.is_complete:
+            return self.offset_response(
+                session, status.HTTP_409_CONFLICT, {"error": "Todavía faltan bytes por subir."}
+            )
+
+        # La inscripción se revisa de nuevo: pudo cambiar mientras se subían los bytes
+        if not can_access_course(request.user, session.course_id):
+            return Response({"error": IsCourseMember.message}, status=status.HTTP_403_FORBIDDEN)
+
+        # Mismo lease que el PATCH: dos finalize a la vez no suben ni crean el archivo dos veces
+        now = timezone.now()
+        lease = now + timedelta(seconds=settings.RESUMABLE_UPLOAD_LEASE_SECONDS)
+        claimed = UploadSession.objects.filter(pk=session.pk, offset=session.length).filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lte=now)
+        ).update(locked_until=lease)
+        if not claimed:
+            return self.offset_response(
+                session, status.HTTP_409_CONFLICT, {"error": "Hay otra subida en curso para esta sesión."}
+            )
+
+        try:
+            with File(open(session.part_path, 'rb'), name=session.filename) as part:
+                stored = store_upload(part)
+        except StorageError as exc:
+            UploadSession.objects.filter(pk=session.pk, locked_until=lease).update(locked_until=None)
+            return Response({"error": str(exc)}, status=status.HTTP_502_BAD_GATEWAY)
+
+        with transaction.atomic():
+            # Si el lease venció mientras subíamos, otro finalize se quedó con la sesión
+            deleted, _ = UploadSession.objects.filter(pk=session.pk, locked_until=lease).delete()
+            if not deleted:
+                return Response(
+                    {"error": "Se perdió la sesión de subida; consulta el offset."}, status=status.HTTP_409_CONFLICT
+                )
+            file_obj = ProfessorFile.objects.create(
+                uploaded_by=request.user, title=session.title, course_id=session.course_id, **stored
+            )
+        if os.path.exists(session.part_path):
+            os.remove(session.part_path)
+        return Response(ProfessorFileSerializer(file_obj).data, status=status.HTTP_201_CREATED)
+
+
+class MetricsView(APIView):
+    """Histogramas por ruta en formato Prometheus. Solo staff (JWT o sesión del admin)."""
+    authentication_classes = [CachedJWTAuthentication, SessionAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class FileChangesView(APIView):
+    """
+    Sincronización incremental (tasks/sync.py). Sin token devuelve solo el
+    token actual: el cliente lo pide antes de bajar el listado completo y
+    desde ahí pregunta con ?since=<token> por los cambios.
+    """
+    permission_classes = [IsProfessorOrReadOnly]
+
+    def get(self, request):
+        token = request.query_params.get('since')
+        if not token:
+            return Response({"sync_token": encode_sync_token(head_change_id(), request.user)}, status=status.HTTP_200_OK)
+        try:
+            since = decode_sync_token(token, request.user)
+        except signing.SignatureExpired:
+            return Response(
+                {"error": "El token de sincronización venció; vuelve a cargar el listado completo."},
+                status=status.HTTP_410_GONE
+            )
+        except SyncScopeChanged:
+            # Se inscribió o se dio de baja: los cambios viejos de ese curso no están por delante del token
+            return Response(
+                {"error": "Tus cursos cambiaron; vuelve a cargar el listado completo."},
+                status=status.HTTP_410_GONE
+            )
+        except signing.BadSignature:
+            return Response({"error": "Token de sincronización inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+        limit = getattr(settings, 'FILES_SYNC_MAX_CHANGES', 500)
+        files, deleted, last_id, has_more = get_changes(since, limit, request.user)
+        with track('serialize'):
+            data = ProfessorFileSerializer(files, many=True).data
+        return Response({
+            "updated": data,
+            "deleted": deleted,
+            "sync_token": encode_sync_token(last_id, request.user),
+            "has_more": has_more,
+        }, status=status.HTTP_200_OK)
+
+
+class FileCacheStatsView(APIView):
+    """
+    Contadores de hits/misses del caché del listado. Solo para staff.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(files_cache.get_stats(), status=status.HTTP_200_OK)
+
 # class FileDownloadView(APIView):
 #     # Al usar tu permiso personalizado que revisa is_authenticated,
 #     # el token es obligatorio aquí.
@@ -128,26 +632,39 @@ class FileManagementView(APIView):
         
         
 
+def password_reset_email(user):
+    """Asunto, cuerpo y plantilla del correo de recuperación (sin destinatario)."""
+    token = default_token_generator.make_token(user)
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+
+    # Asegúrate que esta URL coincida con tu frontend o endpoint
+    reset_url = f"https://ittac.onrender.com/tasks/auth/password-reset-confirm/{uid}/{token}/"
+
+    return {
+        'subject': "Recuperación de Contraseña - Ittac",
+        'body': f"Hola {user.username}, usa este enlace para restablecer tu contraseña: {reset_url}",
+        'template': 'emails/password_reset_email.html',
+        'context': {'user': {'username': user.username}, 'reset_url': reset_url},
+        'from_email': settings.EMAIL_HOST_USER,
+    }
+
 class PasswordResetRequestView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = CREDENTIAL_THROTTLES
+    throttle_scope = 'password_reset'
 
     def post(self, request):
         serializer = PasswordResetRequestSerializer(data=request.data)
         if serializer.is_valid():
             email = serializer.validated_data['email']
             try:
-                user = CustomUser.objects.get(email=email)
-                token = default_token_generator.make_token(user)
-                uid = urlsafe_base64_encode(force_bytes(user.pk))
-                
-                # Asegúrate que esta URL coincida con tu frontend o endpoint
-                reset_url = f"https://ittac.onrender.com/tasks/auth/password-reset-confirm/{uid}/{token}/"
-
-                subject = "Recuperación de Contraseña - Ittac"
-                message = f"Hola {user.username}, usa este enlace para restablecer tu contraseña: {reset_url}"
-                from_email = settings.EMAIL_HOST_USER
-                
-                send_mail(subject, message, from_email, [email], fail_silently=False)
+                # El serializer ya cargó al usuario al validar el email
+                user = serializer.user
+                if user is None:
+                    raise CustomUser.DoesNotExist
+                # No esperamos al SMTP: el correo queda en la bandeja de salida y
+                # lo envía el worker (manage.py send_outbox --loop)
+                enqueue_email([email], **password_reset_email(user))
 
                 return Response({"message": "Correo enviado."}, status=status.HTTP_200_OK)
             except CustomUser.DoesNotExist:
@@ -182,6 +699,7 @@ class PasswordResetConfirmView(APIView):
     
 
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from .tokens import mark_blacklisted
 
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -193,7 +711,10 @@ class LogoutView(APIView):
                 return Response({"error": "Se requiere el refresh token"}, status=status.HTTP_400_BAD_REQUEST)
             
             token = RefreshToken(refresh_token)
-            token.blacklist()  # Esto lo mete a la lista negra
+            # La BD es la fuente de verdad (la ven todos los workers); el caché
+            # solo le ahorra la consulta a los refresh de este mismo caché
+            token.blacklist()
+            mark_blacklisted(token)
 
             return Response({"message": "Logout exitoso. El refresh token ha sido invalidado."}, status=status.HTTP_200_OK)
         except TokenError: